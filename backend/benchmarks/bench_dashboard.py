@@ -0,0 +1,106 @@
+"""
+仪表盘接口基准测试
+在合成的播放记录库上对比 /api/dashboard 与七个单独统计接口的总耗时
+
+七个接口为 /overview、/trend、/users、/clients、/devices、/playback-methods、/hourly，
+与前端仪表盘加载时的请求一致。默认关闭汇总库，直接比较对原表的查询。
+
+用法:
+    python benchmarks/bench_dashboard.py [--rows 5000000] [--days 365] [--index]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from synthetic_db import generate
+
+SEPARATE_ENDPOINTS = ["/overview", "/trend", "/users", "/clients", "/devices", "/playback-methods", "/hourly"]
+
+
+async def bench(app, query: str, repeat: int) -> None:
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def separate():
+            # 前端并发请求七个接口
+            responses = await asyncio.gather(*(client.get(f"/api{path}?{query}") for path in SEPARATE_ENDPOINTS))
+            for resp in responses:
+                resp.raise_for_status()
+
+        async def dashboard():
+            resp = await client.get(f"/api/dashboard?{query}")
+            resp.raise_for_status()
+
+        for label, func in (("七个单独接口", separate), ("/api/dashboard", dashboard)):
+            await func()  # 预热连接池和页缓存
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                await func()
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            print(f"  {label:<16} median={timings[len(timings) // 2]:9.1f} ms  min={timings[0]:9.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="仪表盘单次聚合接口基准测试")
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--days", type=int, default=365, help="查询最近 N 天")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--index", action="store_true", help="在 DateCreated 上建索引")
+    parser.add_argument("--rollup", action="store_true", help="启用汇总库（默认关闭，直接查询原表）")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        playback_path = os.path.join(tmp, "playback_reporting.db")
+        users_path = os.path.join(tmp, "users.db")
+        # 必须在导入应用模块之前设置
+        os.environ["PLAYBACK_DB"] = playback_path
+        os.environ["USERS_DB"] = users_path
+        os.environ["ROLLUP_ENABLED"] = "true" if args.rollup else "false"
+        os.environ["ROLLUP_DIR"] = os.path.join(tmp, "rollup")
+        os.environ["RESPONSE_CACHE_ENABLED"] = "false"
+
+        start = time.perf_counter()
+        generate(playback_path, users_path, args.rows)
+        print(f"生成 {args.rows} 行测试数据 ({time.perf_counter() - start:.1f}s)")
+        if args.index:
+            from tools.playback_index import create_indexes
+            create_indexes(playback_path)
+            print("已创建 DateCreated 索引")
+
+        from fastapi import FastAPI
+        from database import close_db_pools
+        from routers.stats import router as stats_router
+        from services.rollup import rollup_service
+
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+        app = FastAPI()
+        app.include_router(stats_router)
+
+        async def run():
+            if args.rollup:
+                await rollup_service.aggregate(None, ["date"], {"days": args.days})
+                await asyncio.sleep(0)
+                store = rollup_service._get_store(None)
+                await store.refresh()
+            print(f"\n最近 {args.days} 天，汇总库{'开启' if args.rollup else '关闭'}:")
+            await bench(app, f"days={args.days}", args.repeat)
+            await rollup_service.stop()
+            await close_db_pools()
+
+        asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+日期筛选基准测试
+对比 local_date(DateCreated) 表达式与 UTC 范围条件在有/无索引时的查询计划和耗时
+
+用法:
+    python benchmarks/bench_date_filter.py [--rows 500000] [--days 30]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from database import local_date, date_range_conditions
+from tools.playback_index import create_indexes
+
+
+def build_database(path: str, rows: int) -> None:
+    """生成只包含 PlaybackActivity 的测试库"""
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE PlaybackActivity (
+            DateCreated DATETIME NOT NULL,
+            UserId TEXT, ItemId TEXT, ItemType TEXT, ItemName TEXT,
+            PlaybackMethod TEXT, ClientName TEXT, DeviceName TEXT,
+            PlayDuration INT, PauseDuration INT, RemoteAddress TEXT
+        )
+    """)
+    end = datetime(2025, 1, 1)
+    span = 365 * 2 * 86400
+    rng = random.Random(42)
+
+    def gen():
+        for _ in range(rows):
+            ts = end - timedelta(seconds=rng.randrange(span))
+            yield (
+                ts.strftime("%Y-%m-%d %H:%M:%S.0000000"),
+                f"user{rng.randrange(20)}", str(rng.randrange(5000)), "Movie", "Item",
+                "DirectPlay", "Emby Web", "Chrome", rng.randrange(60, 7200), 0, "",
+            )
+
+    conn.executemany("INSERT INTO PlaybackActivity VALUES (?,?,?,?,?,?,?,?,?,?,?)", gen())
+    conn.commit()
+    conn.close()
+
+
+def run(conn: sqlite3.Connection, label: str, sql: str, params: list, repeat: int) -> None:
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        count = conn.execute(sql, params).fetchone()[0]
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    print(f"  {label:<14} rows={count:<8} median={timings[len(timings) // 2]:8.2f} ms")
+    for row in plan:
+        print(f"      plan: {row[-1]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="日期筛选查询计划基准测试")
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--days", type=int, default=30, help="查询最近 N 天")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    end_date = "2024-12-31"
+    start_date = (datetime(2024, 12, 31) - timedelta(days=args.days)).strftime("%Y-%m-%d")
+
+    date_col = local_date("DateCreated")
+    legacy_sql = f"SELECT COUNT(*) FROM PlaybackActivity WHERE {date_col} >= date(?) AND {date_col} <= date(?)"
+    legacy_params = [start_date, end_date]
+    conditions, range_params = date_range_conditions(start_date, end_date)
+    range_sql = f"SELECT COUNT(*) FROM PlaybackActivity WHERE {' AND '.join(conditions)}"
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "playback_reporting.db")
+        start = time.perf_counter()
+        build_database(db_path, args.rows)
+        print(f"生成 {args.rows} 行测试数据 ({time.perf_counter() - start:.1f}s)，范围 {start_date} ~ {end_date}")
+
+        for indexed in (False, True):
+            if indexed:
+                create_indexes(db_path)
+            print(f"\n{'有' if indexed else '无'} DateCreated 索引:")
+            conn = sqlite3.connect(db_path)
+            try:
+                run(conn, "local_date()", legacy_sql, legacy_params, args.repeat)
+                run(conn, "UTC 范围", range_sql, range_params, args.repeat)
+            finally:
+                conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Emby 网络路径压力测试
+在模拟 Emby 上注入延迟和错误，测量依赖 Emby 的代码路径：EmbyService 批量 / 单个项目信息、
+正在播放、封面生成服务的媒体库和海报获取，以及收藏汇总接口。
+
+每个场景报告 p50 / p95 耗时、失败次数（抛出异常或返回空结果）和模拟 Emby 收到的请求数。
+--profile 会对整个运行做 cProfile 并打印累计耗时最高的函数。
+
+用法:
+    python benchmarks/bench_emby_paths.py [--latency-ms 20] [--jitter-ms 10] [--error-rate 0.05]
+        [--items 5000] [--users 20] [--repeat 20] [--concurrency 8] [--profile]
+"""
+import argparse
+import asyncio
+import cProfile
+import logging
+import os
+import pstats
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from stub_emby import StubEmby
+from synthetic_db import generate
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(p * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def run_scenario(name: str, func, repeat: int, concurrency: int, stub: StubEmby) -> None:
+    """并发执行 func 共 repeat 次，func 返回假值视为失败"""
+    semaphore = asyncio.Semaphore(concurrency)
+    timings = []
+    failures = 0
+
+    async def one(i: int):
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                ok = await func(i)
+            except Exception:
+                ok = False
+            timings.append((time.perf_counter() - start) * 1000)
+            if not ok:
+                failures += 1
+
+    stub.reset_stats()
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(repeat)))
+    elapsed = time.perf_counter() - start
+    timings.sort()
+    requests = sum(stub.requests.values())
+    print(
+        f"  {name:<22} p50={percentile(timings, 0.5):8.1f} ms  p95={percentile(timings, 0.95):8.1f} ms  "
+        f"失败={failures:3d}/{repeat}  Emby 请求={requests:5d}（注入错误 {sum(stub.errors.values())}）  "
+        f"总耗时={elapsed:6.2f}s"
+    )
+
+
+async def main_async(args, stub: StubEmby):
+    import httpx
+    from fastapi import FastAPI
+
+    from database import close_db_pools
+    from routers.media import router as media_router
+    from services.cover_generator import CoverGeneratorService
+    from services.emby import EmbyService
+    from services.http_client import http_client_pool
+
+    item_ids = [item_id for item_id, info in stub.items.items() if info["Type"] in ("Movie", "Episode")]
+    batch = args.batch
+
+    emby = EmbyService()
+    cover = CoverGeneratorService()
+    app = FastAPI()
+    app.include_router(media_router)
+    transport = httpx.ASGITransport(app=app)
+
+    async def items_batch(i: int):
+        # 每次取不同的一批 ID 并清空内存缓存，测量冷缓存下的批量获取
+        emby.clear_item_cache()
+        ids = [item_ids[(i * batch + j) % len(item_ids)] for j in range(batch)]
+        result = await emby.get_items_info(ids)
+        return all(item_id in result for item_id in ids)
+
+    async def item_single(i: int):
+        emby.clear_item_cache()
+        return bool(await emby.get_item_info(item_ids[i % len(item_ids)]))
+
+    async def now_playing(i: int):
+        return bool(await emby.get_now_playing())
+
+    async def library_list(i: int):
+        return bool(await cover.get_library_list())
+
+    async def cover_posters(i: int):
+        posters = await cover._fetch_posters("lib-movies", 9)
+        return len(posters) == 9
+
+    async def favorites(i: int):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            resp = await client.get("/api/favorites?days=30")
+            return resp.status_code == 200
+
+    scenarios = [
+        (f"项目信息批量（{batch} 个）", items_batch),
+        ("项目信息单个", item_single),
+        ("正在播放", now_playing),
+        ("媒体库列表", library_list),
+        ("封面海报（9 张）", cover_posters),
+        (f"收藏汇总（{len(stub.users)} 用户）", favorites),
+    ]
+    selected = {name.strip() for name in args.only.split(",") if name.strip()}
+
+    print(f"\n延迟 {args.latency_ms}±{args.jitter_ms} ms，错误率 {args.error_rate}，"
+          f"{args.repeat} 次，并发 {args.concurrency}:")
+    try:
+        for index, (name, func) in enumerate(scenarios, 1):
+            if selected and str(index) not in selected:
+                continue
+            await run_scenario(name, func, args.repeat, args.concurrency, stub)
+    finally:
+        await emby.close()
+        await cover.emby_service.close()
+        await http_client_pool.close()
+        await close_db_pools()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Emby 网络路径压力测试")
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--jitter-ms", type=float, default=10)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--items", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=20, help="收藏汇总遍历的用户数")
+    parser.add_argument("--batch", type=int, default=100, help="批量获取项目信息的数量")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--only", default="", help="只运行指定序号的场景，逗号分隔（1~6）")
+    parser.add_argument("--profile", action="store_true", help="用 cProfile 分析并打印热点函数")
+    args = parser.parse_args()
+
+    stub = StubEmby(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate, seed=0)
+    stub.generate_users(args.users)
+    stub.generate_items(args.items)
+    stub.generate_sessions(5)
+    base_url = stub.start()
+
+    tmp = tempfile.TemporaryDirectory()
+    # 收藏汇总接口会查询播放记录库，生成一个小库
+    playback_path = os.path.join(tmp.name, "playback_reporting.db")
+    users_path = os.path.join(tmp.name, "users.db")
+    generate(playback_path, users_path, 10000)
+    # 必须在导入应用模块之前设置
+    os.environ.update({
+        "PLAYBACK_DB": playback_path,
+        "USERS_DB": users_path,
+        "EMBY_URL": base_url,
+        "EMBY_API_KEY": "bench",
+        "ITEM_CACHE_PERSIST": "false",
+        "IMAGE_CACHE_DIR": os.path.join(tmp.name, "image_cache"),
+    })
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    try:
+        asyncio.run(main_async(args, stub))
+    finally:
+        if profiler:
+            profiler.disable()
+            print()
+            pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+        stub.stop()
+        tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""
+统计接口端到端基准测试
+在合成的播放记录库和模拟 Emby 上，通过 ASGI 直接调用应用（包含认证中间件）的
+各统计 / 媒体接口，报告每个接口的 p50 / p95 延迟、每次请求执行的 SQL 语句数、
+向 Emby 发出的请求数和进程峰值内存。
+
+默认关闭汇总库和响应缓存，测量的是直接查询原表的开销；用 --rollup / --response-cache
+分别开启。--json 可把结果保存下来，与优化后的结果对比。
+
+用法:
+    python benchmarks/bench_endpoints.py [--rows 100000] [--data-dir /tmp/bench-data]
+        [--repeat 20] [--days 30] [--rollup] [--response-cache] [--index]
+        [--only overview,dashboard] [--json result.json]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from stub_emby import StubEmby
+from synthetic_db import generate
+
+# (名称, 路径, 查询参数)；{days} 和 {item_id} 在运行时替换
+ENDPOINTS = [
+    ("overview", "/api/overview", "days={days}"),
+    ("trend", "/api/trend", "days={days}"),
+    ("users", "/api/users", "days={days}"),
+    ("clients", "/api/clients", "days={days}"),
+    ("devices", "/api/devices", "days={days}"),
+    ("playback-methods", "/api/playback-methods", "days={days}"),
+    ("hourly", "/api/hourly", "days={days}"),
+    ("dashboard", "/api/dashboard", "days={days}"),
+    ("recent", "/api/recent", "limit=50"),
+    ("recent-search", "/api/recent", "limit=50&search=Star"),
+    ("filter-options", "/api/filter-options", ""),
+    ("now-playing", "/api/now-playing", ""),
+    ("top-content", "/api/top-content", "days={days}&limit=20"),
+    ("top-shows", "/api/top-shows", "days={days}&limit=20"),
+    ("favorites", "/api/favorites", "days={days}"),
+    ("poster", "/api/poster/{item_id}", "maxHeight=300"),
+    ("backdrop", "/api/backdrop/{item_id}", "maxWidth=780"),
+]
+
+
+class QueryCounter:
+    """统计连接池连接上执行的 SQL 语句数（不含 PRAGMA）"""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, statement: str):
+        if not statement.lstrip().upper().startswith("PRAGMA"):
+            with self._lock:
+                self.count += 1
+
+    def install(self):
+        from database import SQLitePool
+
+        original_open = SQLitePool._open
+        counter = self
+
+        async def _open(pool):
+            db = await original_open(pool)
+            await db.set_trace_callback(counter)
+            return db
+
+        SQLitePool._open = _open
+
+
+def peak_rss_mb() -> float:
+    # Linux 上 ru_maxrss 的单位为 KB
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(p * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def bench(app, stub: StubEmby, counter: QueryCounter, endpoints, args, item_id: str) -> list[dict]:
+    import httpx
+
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", cookies={"session_id": "bench"}) as client:
+        for name, path, query in endpoints:
+            url = path.format(item_id=item_id)
+            query = query.format(days=args.days)
+            if query:
+                url = f"{url}?{query}"
+
+            for _ in range(args.warmup):
+                resp = await client.get(url)
+                resp.raise_for_status()
+
+            queries_before = counter.count
+            emby_before = sum(stub.requests.values())
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                resp = await client.get(url)
+                timings.append((time.perf_counter() - start) * 1000)
+                resp.raise_for_status()
+            timings.sort()
+
+            result = {
+                "endpoint": name,
+                "url": url,
+                "p50_ms": round(percentile(timings, 0.5), 2),
+                "p95_ms": round(percentile(timings, 0.95), 2),
+                "queries_per_request": round((counter.count - queries_before) / args.repeat, 2),
+                "emby_requests_per_request": round((sum(stub.requests.values()) - emby_before) / args.repeat, 2),
+                "peak_rss_mb": round(peak_rss_mb(), 1),
+            }
+            results.append(result)
+            print(
+                f"  {name:<18} p50={result['p50_ms']:9.2f} ms  p95={result['p95_ms']:9.2f} ms  "
+                f"SQL={result['queries_per_request']:6.1f}  Emby={result['emby_requests_per_request']:5.1f}  "
+                f"峰值内存={result['peak_rss_mb']:7.1f} MB"
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="统计接口端到端基准测试")
+    parser.add_argument("--rows", type=int, default=100_000, help="播放记录条数（1 万 ~ 1000 万）")
+    parser.add_argument("--data-dir", default=None, help="数据库目录，已存在时直接复用（默认使用临时目录）")
+    parser.add_argument("--days", type=int, default=30, help="统计接口的 days 参数")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--index", action="store_true", help="在 DateCreated 上建索引")
+    parser.add_argument("--rollup", action="store_true", help="启用汇总库")
+    parser.add_argument("--response-cache", action="store_true", help="启用响应缓存")
+    parser.add_argument("--only", default="", help="只测试指定接口，逗号分隔")
+    parser.add_argument("--json", default=None, help="把结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    tmp = tempfile.TemporaryDirectory()
+    data_dir = args.data_dir or tmp.name
+    playback_path = os.path.join(data_dir, "playback_reporting.db")
+    users_path = os.path.join(data_dir, "users.db")
+
+    if os.path.exists(playback_path) and os.path.exists(users_path):
+        print(f"复用已有数据库 {playback_path}")
+    else:
+        start = time.perf_counter()
+        generate(playback_path, users_path, args.rows)
+        print(f"生成 {args.rows} 行测试数据 ({time.perf_counter() - start:.1f}s)")
+    if args.index:
+        from tools.playback_index import create_indexes
+        create_indexes(playback_path)
+
+    stub = StubEmby()
+    stub.load_items_from_playback_db(playback_path)
+    base_url = stub.start()
+
+    conn = sqlite3.connect(playback_path)
+    rows = conn.execute("SELECT COUNT(*) FROM PlaybackActivity").fetchone()[0]
+    item_id = conn.execute(
+        "SELECT ItemId FROM PlaybackActivity WHERE ItemType = 'Movie' ORDER BY rowid DESC LIMIT 1"
+    ).fetchone()[0]
+    conn.close()
+    stub.generate_sessions(3)
+
+    # 必须在导入应用模块之前设置
+    os.environ.update({
+        "PLAYBACK_DB": playback_path,
+        "USERS_DB": users_path,
+        "AUTH_DB": os.path.join(tmp.name, "authentication.db"),
+        "EMBY_URL": base_url,
+        "EMBY_API_KEY": "bench",
+        "ROLLUP_ENABLED": "true" if args.rollup else "false",
+        "ROLLUP_DIR": os.path.join(tmp.name, "rollup"),
+        "SEARCH_INDEX_DIR": os.path.join(tmp.name, "search_index"),
+        "RESPONSE_CACHE_ENABLED": "true" if args.response_cache else "false",
+        "ITEM_CACHE_PERSIST": "false",
+        "IMAGE_CACHE_DIR": os.path.join(tmp.name, "image_cache"),
+    })
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    counter = QueryCounter()
+    counter.install()
+
+    import main as app_main
+    from routers.auth import sessions
+    from services.rollup import rollup_service
+
+    sessions["bench"] = {"username": "bench", "expires": time.time() + 86400}
+    selected = {name.strip() for name in args.only.split(",") if name.strip()}
+    endpoints = [e for e in ENDPOINTS if not selected or e[0] in selected]
+
+    async def run():
+        try:
+            if args.rollup:
+                await rollup_service.aggregate(None, ["date"], {"days": args.days})
+                await asyncio.sleep(0)
+                await rollup_service._get_store(None).refresh()
+            print(f"\n启动后峰值内存 {peak_rss_mb():.1f} MB；汇总库{'开启' if args.rollup else '关闭'}，"
+                  f"响应缓存{'开启' if args.response_cache else '关闭'}，每个接口 {args.repeat} 次:")
+            return await bench(app_main.app, stub, counter, endpoints, args, item_id)
+        finally:
+            await app_main.shutdown_event()
+
+    results = asyncio.run(run())
+    stub.stop()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "rows": rows,
+                "days": args.days,
+                "rollup": args.rollup,
+                "response_cache": args.response_cache,
+                "results": results,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.json}")
+    tmp.cleanup()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+HTTP 客户端基准测试
+在本地启动一个模拟 Emby 服务器，对比每次请求新建 AsyncClient 与共享长连接客户端的延迟
+
+用法:
+    python benchmarks/bench_http_client.py [--requests 500] [--concurrency 8] [--latency-ms 0]
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent))
+
+from services.http_client import HttpClientPool, H2_AVAILABLE
+from stub_emby import StubEmby
+
+
+async def run(label: str, fetch, total: int, concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+    timings = []
+
+    async def one(i: int):
+        async with semaphore:
+            start = time.perf_counter()
+            resp = await fetch(f"/emby/Users/u1/Items/{i}")
+            resp.raise_for_status()
+            timings.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - start
+    timings.sort()
+    p50 = timings[len(timings) // 2]
+    p95 = timings[int(len(timings) * 0.95)]
+    print(f"  {label:<18} p50={p50:7.2f} ms  p95={p95:7.2f} ms  总耗时={elapsed:6.2f}s  {total / elapsed:8.1f} req/s")
+
+
+async def main_async(args):
+    stub = StubEmby(latency_ms=args.latency_ms)
+    base_url = stub.start()
+    pool = HttpClientPool()
+
+    async def per_call(path: str):
+        async with httpx.AsyncClient() as client:
+            return await client.get(f"{base_url}{path}")
+
+    async def shared(path: str):
+        return await pool.get(base_url).get(f"{base_url}{path}")
+
+    print(f"模拟 Emby: {base_url}，{args.requests} 次请求，并发 {args.concurrency}，"
+          f"服务端延迟 {args.latency_ms} ms，HTTP/2 可用: {H2_AVAILABLE}")
+    try:
+        # 预热，避免首次导入和路由编译影响结果
+        await run("预热", shared, 20, 1)
+        for concurrency in sorted({1, args.concurrency}):
+            print(f"\n并发 {concurrency}:")
+            await run("每次新建客户端", per_call, args.requests, concurrency)
+            await run("共享客户端", shared, args.requests, concurrency)
+    finally:
+        await pool.close()
+        stub.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Emby HTTP 客户端复用基准测试")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=0, help="模拟 Emby 的处理延迟")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
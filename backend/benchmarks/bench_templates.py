@@ -0,0 +1,74 @@
+"""
+通知模板渲染基准测试
+使用默认通知模板，对比每次渲染都新建 jinja2.Template 与共享沙箱环境缓存编译结果的吞吐量
+
+用法:
+    python benchmarks/bench_templates.py [--renders 2000]
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+from jinja2 import Template
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from config_storage import DEFAULT_CONFIG
+from services.notification import NotificationTemplateService, TemplateCache
+
+# 典型的入库 / 播放事件上下文
+CONTEXTS = {
+    "playback": {
+        "event": "playback.start", "action": "开始播放", "user_name": "alice", "now_time": "2024-01-01 20:00:00",
+        "ip_address": "192.168.1.10", "client": "Emby Web", "device_name": "Chrome",
+        "media_type": "剧集", "item_name": "示例剧集 S1E2 - 第二集", "item_year": 2023,
+        "overview": "剧情简介" * 20, "rating": 8.5, "progress": 42.0,
+    },
+    "library": {
+        "event": "library.new", "action": "新入库", "user_name": "", "now_time": "2024-01-01 20:00:00",
+        "media_type": "电影", "item_name": "示例电影", "item_year": 2023, "size": "12.34 GB",
+        "overview": "剧情简介" * 20, "rating": 7.9, "tmdb_id": "12345",
+    },
+}
+
+
+def run(label: str, render, total: int) -> None:
+    names = list(CONTEXTS)
+    start = time.perf_counter()
+    for i in range(total):
+        name = names[i % len(names)]
+        render(name, CONTEXTS[name])
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<16} 总耗时={elapsed:6.3f}s  平均={elapsed / total * 1e6:8.1f} µs  {total / elapsed:9.1f} 次/秒")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="通知模板渲染基准测试")
+    parser.add_argument("--renders", type=int, default=2000, help="渲染次数")
+    args = parser.parse_args()
+
+    templates = DEFAULT_CONFIG["templates"]
+
+    def per_render(name: str, context: dict):
+        template = templates[name]
+        Template(template["title"]).render(context)
+        Template(template["text"]).render(context)
+
+    service = NotificationTemplateService(templates)
+
+    print(f"默认模板，{args.renders} 次渲染（标题 + 正文）:")
+    run("每次新建模板", per_render, args.renders)
+    run("缓存编译结果", service.render, args.renders)
+
+    # 验证两种方式的输出一致
+    cache = TemplateCache()
+    for name, context in CONTEXTS.items():
+        for part in ("title", "text"):
+            expected = Template(templates[name][part]).render(context)
+            assert cache.get(templates[name][part]).render(context) == expected, f"{name}.{part} 输出不一致"
+    print("两种方式的渲染结果一致")
+
+
+if __name__ == "__main__":
+    main()
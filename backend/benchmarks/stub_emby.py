@@ -0,0 +1,426 @@
+"""
+模拟 Emby 服务器
+实现后端用到的 Emby API 子集（用户、项目信息、媒体库、图片、会话、登录），用于基准测试、
+压力测试和本地调试，不需要真实的 Emby 服务器。
+
+- 项目可以从播放记录库加载（剧集按 "剧名 - s01e02" 归入同一剧集）、从 JSON 文件加载
+  或按数量生成；都未加载时按 ID 即时生成
+- 可注入延迟（固定值 + 随机抖动）和错误率，支持按接口单独设置
+- 每个接口的请求数和注入的错误数记录在 StubEmby.requests / StubEmby.errors 中
+- 接口同时注册在 /emby 前缀和根路径下（封面生成服务不带 /emby 前缀）
+
+作为 fixture 使用:
+    with StubEmby(latency_ms=50, error_rate=0.05) as stub:
+        os.environ["EMBY_URL"] = stub.base_url
+        ...
+
+    # pytest 中: from benchmarks.stub_emby import stub_emby
+
+作为独立进程运行:
+    python benchmarks/stub_emby.py --port 8096 --items 5000 --latency-ms 50 --error-rate 0.02
+    # 运行中调整: curl -X POST localhost:8096/__stub/config -d '{"latency_ms": 200}'
+    # 请求统计:   curl localhost:8096/__stub/stats
+"""
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import random
+import socket
+import sqlite3
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, asdict, fields
+from typing import Optional
+
+import uvicorn
+from fastapi import APIRouter, FastAPI, HTTPException, Request
+from fastapi.responses import Response
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+ADMIN_USER_ID = "0f1e2d3c4b5a69788796a5b4c3d2e1f0"
+
+LIBRARIES = [
+    {"Id": "lib-movies", "Name": "电影", "CollectionType": "movies", "types": {"Movie"}},
+    {"Id": "lib-tvshows", "Name": "电视剧", "CollectionType": "tvshows", "types": {"Series", "Episode"}},
+    {"Id": "lib-music", "Name": "音乐", "CollectionType": "music", "types": {"Audio"}},
+]
+
+TICKS_PER_SECOND = 10_000_000
+
+
+def _tag(*parts: str) -> str:
+    return hashlib.md5(":".join(parts).encode()).hexdigest()
+
+
+def _placeholder_image(width: int = 400, height: int = 600) -> bytes:
+    """生成占位海报（JPEG），没有 Pillow 时返回最小的 JPEG 头"""
+    if not PIL_AVAILABLE:
+        return b"\xff\xd8\xff\xe0" + b"\x00" * 1024 + b"\xff\xd9"
+    image = Image.new("RGB", (width, height), (40, 60, 90))
+    buf = io.BytesIO()
+    image.save(buf, format="JPEG", quality=85)
+    return buf.getvalue()
+
+
+@dataclass
+class Fault:
+    """故障注入参数"""
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 500
+
+
+class StubEmby:
+    """模拟 Emby 服务器"""
+
+    def __init__(
+        self,
+        users: Optional[list[dict]] = None,
+        latency_ms: float = 0,
+        jitter_ms: float = 0,
+        error_rate: float = 0,
+        error_status: int = 500,
+        seed: Optional[int] = None,
+    ):
+        self.users = users or [{"Id": ADMIN_USER_ID, "Name": "admin", "Policy": {"IsAdministrator": True}}]
+        self.items: dict[str, dict] = {}
+        self.sessions: list[dict] = []
+        self.image = _placeholder_image()
+        # 默认故障参数，routes 中按接口名覆盖（接口名见 requests 的键）
+        self.fault = Fault(latency_ms, jitter_ms, error_rate, error_status)
+        self.routes: dict[str, Fault] = {}
+        self.requests: Counter = Counter()
+        self.errors: Counter = Counter()
+        self._rng = random.Random(seed)
+        self.app = self._create_app()
+        self._server: Optional[uvicorn.Server] = None
+        self.base_url = ""
+
+    # ==================== 故障注入 ====================
+
+    def configure(self, route: Optional[str] = None, **options):
+        """修改故障参数，route 为 None 时修改默认值"""
+        if route is None:
+            fault = self.fault
+        else:
+            fault = self.routes.setdefault(route, Fault(**asdict(self.fault)))
+        types = {f.name: f.type for f in fields(Fault)}
+        for name, value in options.items():
+            if name not in types:
+                raise ValueError(f"未知参数: {name}")
+            setattr(fault, name, types[name](value))
+
+    async def _simulate(self, route: str):
+        """记录请求并按配置注入延迟和错误"""
+        self.requests[route] += 1
+        fault = self.routes.get(route, self.fault)
+        delay = fault.latency_ms + (self._rng.uniform(0, fault.jitter_ms) if fault.jitter_ms else 0)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        if fault.error_rate and self._rng.random() < fault.error_rate:
+            self.errors[route] += 1
+            raise HTTPException(status_code=fault.error_status, detail="injected error")
+
+    def stats(self) -> dict:
+        return {
+            "requests": dict(self.requests),
+            "errors": dict(self.errors),
+            "items": len(self.items),
+            "sessions": len(self.sessions),
+            "fault": asdict(self.fault),
+            "routes": {name: asdict(fault) for name, fault in self.routes.items()},
+        }
+
+    def reset_stats(self):
+        self.requests.clear()
+        self.errors.clear()
+
+    # ==================== 数据 ====================
+
+    @staticmethod
+    def make_item(item_id: str, item_type: str, name: str) -> dict:
+        return {
+            "Id": item_id,
+            "Name": name,
+            "Type": item_type,
+            "Overview": f"{name} overview",
+            "DateCreated": "2024-01-01T00:00:00.0000000Z",
+            "DateModified": "2024-01-01T00:00:00.0000000Z",
+            "ImageTags": {"Primary": _tag(item_id, "Primary")},
+            "BackdropImageTags": [_tag(item_id, "Backdrop")] if item_type != "Audio" else [],
+            "ProviderIds": {"Tmdb": str(int(_tag(item_id)[:6], 16))},
+            "RunTimeTicks": (5400 if item_type == "Movie" else 2400) * TICKS_PER_SECOND,
+        }
+
+    def _add_episode(self, item_id: str, name: str, series_name: str):
+        series_id = f"s{_tag(series_name)[:12]}"
+        if series_id not in self.items:
+            self.items[series_id] = self.make_item(series_id, "Series", series_name)
+        info = self.make_item(item_id, "Episode", name)
+        info.update(SeriesId=series_id, SeriesName=series_name, SeriesPrimaryImageTag=_tag(series_id, "Primary"))
+        self.items[item_id] = info
+
+    def load_items_from_playback_db(self, path: str):
+        """从播放记录库生成项目信息，剧集按剧名生成所属剧集"""
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            rows = conn.execute(
+                "SELECT ItemId, MAX(ItemType), MAX(ItemName) FROM PlaybackActivity GROUP BY ItemId"
+            ).fetchall()
+        finally:
+            conn.close()
+
+        for item_id, item_type, item_name in rows:
+            item_id, item_name = str(item_id), item_name or ""
+            if item_type == "Episode" and " - " in item_name:
+                self._add_episode(item_id, item_name, item_name.split(" - ")[0])
+            else:
+                self.items[item_id] = self.make_item(item_id, item_type or "Movie", item_name)
+
+    def load_items_from_json(self, path: str):
+        """从 JSON 文件加载项目（Emby 项目对象的列表，或 {"Items": [...]}）"""
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        for info in data.get("Items", []) if isinstance(data, dict) else data:
+            self.items[str(info["Id"])] = info
+
+    def generate_items(self, count: int, seed: int = 42):
+        """生成指定数量的项目（约 40% 电影、55% 剧集、5% 音乐）"""
+        rng = random.Random(seed)
+        for i in range(count):
+            item_id = str(200000 + i)
+            kind = rng.random()
+            if kind < 0.4:
+                self.items[item_id] = self.make_item(item_id, "Movie", f"Movie {i}")
+            elif kind < 0.95:
+                series = rng.randrange(max(1, count // 30))
+                self._add_episode(item_id, f"Series {series} - s01e{i % 24 + 1:02d} - Episode {i}", f"Series {series}")
+            else:
+                self.items[item_id] = self.make_item(item_id, "Audio", f"Track {i}")
+
+    def generate_sessions(self, count: int, seed: int = 42):
+        """生成正在播放的会话"""
+        rng = random.Random(seed)
+        playable = [info for info in self.items.values() if info["Type"] in ("Movie", "Episode", "Audio")]
+        self.sessions = []
+        for i in range(count):
+            user = self.users[i % len(self.users)]
+            item = rng.choice(playable) if playable else self.make_item(str(i), "Movie", f"Item {i}")
+            runtime = item.get("RunTimeTicks") or 3600 * TICKS_PER_SECOND
+            self.sessions.append({
+                "Id": f"session{i}",
+                "UserId": user["Id"],
+                "UserName": user["Name"],
+                "Client": rng.choice(["Emby Web", "Infuse", "Emby for Android"]),
+                "DeviceName": f"Device {i}",
+                "RemoteEndPoint": f"192.168.1.{10 + i}",
+                "NowPlayingItem": item,
+                "PlayState": {
+                    "PositionTicks": int(runtime * rng.random()),
+                    "IsPaused": rng.random() < 0.2,
+                    "PlayMethod": rng.choice(["DirectPlay", "DirectStream", "Transcode"]),
+                },
+            })
+
+    def generate_users(self, count: int):
+        """生成用户（第一个为管理员）"""
+        self.users = [
+            {"Id": _tag("user", str(i)), "Name": f"user{i:03d}", "Policy": {"IsAdministrator": i == 0}}
+            for i in range(count)
+        ]
+
+    def get_item(self, item_id: str) -> Optional[dict]:
+        if self.items:
+            return self.items.get(item_id)
+        # 未加载项目时按 ID 生成，便于脱离播放记录库单独使用
+        return self.make_item(item_id, "Movie", f"Item {item_id}")
+
+    # ==================== 接口 ====================
+
+    def _create_app(self) -> FastAPI:
+        app = FastAPI()
+        api = APIRouter()
+
+        @api.get("/Users")
+        async def users():
+            await self._simulate("users")
+            return self.users
+
+        @api.get("/Users/{user_id}")
+        async def user(user_id: str):
+            await self._simulate("user")
+            for u in self.users:
+                if u["Id"] == user_id:
+                    return u
+            raise HTTPException(status_code=404)
+
+        @api.get("/Users/{user_id}/Items")
+        async def items(user_id: str, request: Request):
+            await self._simulate("items")
+            params = request.query_params
+            if params.get("Ids"):
+                found = [info for info in (self.get_item(i) for i in params["Ids"].split(",") if i) if info]
+                return {"Items": found, "TotalRecordCount": len(found)}
+
+            found = list(self.items.values())
+            if params.get("Filters") == "IsFavorite":
+                # 每个用户固定收藏约 1% 的项目
+                found = [info for info in found if int(_tag(user_id, info["Id"])[:8], 16) % 100 == 0]
+            if params.get("ParentId"):
+                library = next((lib for lib in LIBRARIES if lib["Id"] == params["ParentId"]), None)
+                types = library["types"] if library else set()
+                found = [info for info in found if info["Type"] in types]
+            if params.get("IncludeItemTypes"):
+                types = set(params["IncludeItemTypes"].split(","))
+                found = [info for info in found if info["Type"] in types]
+            total = len(found)
+            start = int(params.get("StartIndex", 0))
+            limit = int(params.get("Limit", total))
+            return {"Items": found[start:start + limit], "TotalRecordCount": total}
+
+        @api.get("/Users/{user_id}/Items/{item_id}")
+        async def item(user_id: str, item_id: str):
+            await self._simulate("item")
+            info = self.get_item(item_id)
+            if info is None:
+                raise HTTPException(status_code=404)
+            return info
+
+        @api.get("/Library/MediaFolders")
+        async def media_folders():
+            await self._simulate("media_folders")
+            folders = [{k: v for k, v in lib.items() if k != "types"} for lib in LIBRARIES]
+            return {"Items": folders, "TotalRecordCount": len(folders)}
+
+        @api.get("/Items/{item_id}/Images/{image_type}")
+        async def image(item_id: str, image_type: str):
+            await self._simulate("image")
+            return Response(self.image, media_type="image/jpeg")
+
+        @api.post("/Items/{item_id}/Images/{image_type}")
+        async def upload_image(item_id: str, image_type: str):
+            await self._simulate("upload_image")
+            return Response(status_code=204)
+
+        @api.get("/Sessions")
+        async def sessions():
+            await self._simulate("sessions")
+            return self.sessions
+
+        @api.post("/Users/AuthenticateByName")
+        async def authenticate():
+            await self._simulate("authenticate")
+            return {"User": self.users[0], "AccessToken": "stub-token"}
+
+        app.include_router(api, prefix="/emby")
+        app.include_router(api)
+
+        @app.get("/__stub/stats")
+        async def get_stats():
+            return self.stats()
+
+        @app.post("/__stub/config")
+        async def set_config(request: Request):
+            """修改故障参数，body 可带 route 指定接口"""
+            options = await request.json()
+            try:
+                self.configure(options.pop("route", None), **options)
+            except (ValueError, TypeError) as e:
+                raise HTTPException(status_code=400, detail=str(e))
+            return self.stats()
+
+        @app.post("/__stub/reset")
+        async def reset():
+            self.reset_stats()
+            return {"success": True}
+
+        return app
+
+    # ==================== 运行 ====================
+
+    def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """在后台线程启动服务器，返回 base_url"""
+        if not port:
+            with socket.socket() as sock:
+                sock.bind((host, 0))
+                port = sock.getsockname()[1]
+        self._server = uvicorn.Server(uvicorn.Config(self.app, host=host, port=port, log_level="error"))
+        threading.Thread(target=self._server.run, daemon=True).start()
+        while not self._server.started:
+            time.sleep(0.05)
+        self.base_url = f"http://{host}:{port}"
+        return self.base_url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.should_exit = True
+            self._server = None
+
+    def __enter__(self) -> "StubEmby":
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+try:
+    import pytest
+
+    @pytest.fixture
+    def stub_emby():
+        """启动一个模拟 Emby（已生成 500 个项目和 3 个会话），测试结束后关闭"""
+        stub = StubEmby(seed=0)
+        stub.generate_items(500)
+        stub.generate_sessions(3)
+        with stub:
+            yield stub
+except ImportError:
+    pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模拟 Emby 服务器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8096)
+    parser.add_argument("--playback-db", default=None, help="从播放记录库加载项目")
+    parser.add_argument("--items-json", default=None, help="从 JSON 文件加载项目")
+    parser.add_argument("--items", type=int, default=1000, help="未指定数据来源时生成的项目数")
+    parser.add_argument("--users", type=int, default=1)
+    parser.add_argument("--sessions", type=int, default=3)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument("--error-rate", type=float, default=0)
+    parser.add_argument("--error-status", type=int, default=500)
+    args = parser.parse_args()
+
+    stub = StubEmby(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate, error_status=args.error_status,
+    )
+    if args.users > 1:
+        stub.generate_users(args.users)
+    if args.playback_db:
+        stub.load_items_from_playback_db(args.playback_db)
+    elif args.items_json:
+        stub.load_items_from_json(args.items_json)
+    else:
+        stub.generate_items(args.items)
+    stub.generate_sessions(args.sessions)
+
+    print(f"模拟 Emby: http://{args.host}:{args.port}，{len(stub.items)} 个项目，{len(stub.users)} 个用户，"
+          f"延迟 {args.latency_ms}±{args.jitter_ms} ms，错误率 {args.error_rate}")
+    uvicorn.run(stub.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+合成 Playback Reporting 数据库生成器
+生成结构与 Emby 一致的 playback_reporting.db（PlaybackActivity）和 users.db
+（LocalUsersv2，guid 为 .NET GUID 字节序的二进制），用于基准测试和本地调试。
+
+数据分布尽量接近真实服务器：
+- 内容热度呈长尾分布，剧集名称为 "剧名 - s01e02 - 标题" 格式
+- 每个用户固定使用 1~3 台设备，每台设备对应一个客户端
+- 播放时间集中在晚间（本地时间），记录按时间递增写入（与 rowid 顺序一致）
+- 少量记录属于已删除的用户，少量播放时长很短
+
+用法:
+    python benchmarks/synthetic_db.py --rows 1000000 --out /tmp/emby-data [--index]
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+CLIENTS = [
+    ("Emby Web", ["Chrome", "Firefox", "Edge", "Safari"]),
+    ("Emby for Android", ["Pixel 8", "Galaxy S23", "Xiaomi 14", "OnePlus 12"]),
+    ("Emby for iOS", ["iPhone", "iPad"]),
+    ("Emby for Android TV", ["Shield TV", "Mi Box", "Chromecast"]),
+    ("Infuse", ["Apple TV", "iPhone", "Mac"]),
+    ("Kodi", ["LibreELEC", "Kodi PC"]),
+    ("Emby Theater", ["Living Room PC"]),
+    ("Fileball", ["iPad", "Apple TV"]),
+    ("VidHub", ["Mac", "iPhone"]),
+]
+
+PLAYBACK_METHODS = ["DirectPlay", "DirectStream", "Transcode"]
+PLAYBACK_METHOD_WEIGHTS = [60, 15, 25]
+
+# 本地时间各小时的播放权重（晚间高峰）
+HOUR_WEIGHTS = [4, 2, 1, 1, 1, 1, 1, 2, 3, 4, 5, 6, 8, 7, 6, 6, 7, 9, 12, 16, 20, 22, 18, 10]
+
+WORDS = [
+    "Star", "Night", "River", "Shadow", "Golden", "Silent", "Last", "Lost", "City", "Ocean",
+    "Fire", "Winter", "Dream", "Iron", "Secret", "Wild", "Blue", "Empire", "Garden", "Storm",
+]
+
+
+def _title(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words))
+
+
+def build_catalog(rng: random.Random, items: int) -> list[tuple[str, str, str, int]]:
+    """生成媒体库：[(ItemId, ItemType, ItemName, 片长秒数)]，列表顺序即热度排名"""
+    catalog = []
+    item_id = 100000
+    # 约 35% 电影、60% 剧集、5% 音乐
+    movies = max(1, int(items * 0.35))
+    audio = max(1, int(items * 0.05))
+    episodes = max(1, items - movies - audio)
+
+    for _ in range(movies):
+        item_id += 1
+        catalog.append((str(item_id), "Movie", f"{_title(rng, 2)} ({rng.randint(1980, 2025)})", rng.randint(5400, 9000)))
+
+    series_count = max(1, episodes // 24)
+    remaining = episodes
+    for s in range(series_count):
+        series_name = f"{_title(rng, 2)} {s}"
+        count = remaining if s == series_count - 1 else min(remaining, rng.randint(8, 40))
+        remaining -= count
+        for e in range(count):
+            item_id += 1
+            season, episode = divmod(e, 12)
+            catalog.append((
+                str(item_id), "Episode",
+                f"{series_name} - s{season + 1:02d}e{episode + 1:02d} - {_title(rng, 2)}",
+                rng.randint(1200, 3600),
+            ))
+        if remaining <= 0:
+            break
+
+    for _ in range(audio):
+        item_id += 1
+        catalog.append((str(item_id), "Audio", f"{_title(rng, 3)}", rng.randint(150, 360)))
+
+    rng.shuffle(catalog)
+    return catalog
+
+
+def generate(
+    playback_path: str,
+    users_path: str,
+    rows: int,
+    users: int = 50,
+    items: int = 20000,
+    days: int = 730,
+    seed: int = 42,
+    end: Optional[datetime] = None,
+    tz_offset: int = 8,
+) -> dict:
+    """生成播放记录库和用户库，已存在的文件会被覆盖
+
+    Args:
+        playback_path: playback_reporting.db 路径
+        users_path: users.db 路径
+        rows: 播放记录条数
+        users: 用户数（另有约 5% 的记录属于已删除用户）
+        items: 媒体项目数
+        days: 记录覆盖的天数（截止到 end）
+        seed: 随机种子，相同参数生成相同数据
+        end: 记录截止时间（UTC），默认当前时间
+        tz_offset: 生成晚间高峰时使用的时区偏移（小时）
+
+    Returns:
+        生成结果摘要（用户 ID 列表、项目数等）
+    """
+    rng = random.Random(seed)
+    end = end or datetime.utcnow()
+
+    for path in (playback_path, users_path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    user_ids = [uuid.UUID(int=rng.getrandbits(128), version=4) for _ in range(users)]
+    conn = sqlite3.connect(users_path)
+    conn.execute("CREATE TABLE LocalUsersv2 (Id INTEGER PRIMARY KEY, guid GUID NOT NULL, data BLOB NOT NULL, InternalId INTEGER)")
+    conn.executemany(
+        "INSERT INTO LocalUsersv2 (guid, data, InternalId) VALUES (?, ?, ?)",
+        [
+            # .NET 的 Guid.ToByteArray() 前三段为小端序，对应 uuid.bytes_le
+            (u.bytes_le, json.dumps({"Name": f"user{i:03d}", "Policy": {"IsAdministrator": i == 0}}).encode(), i + 1)
+            for i, u in enumerate(user_ids)
+        ]
+    )
+    conn.commit()
+    conn.close()
+
+    catalog = build_catalog(rng, items)
+    # 长尾热度：排名第 k 的内容权重约为 1/k
+    item_weights = [1.0 / (k + 1) for k in range(len(catalog))]
+
+    user_devices = {}
+    for u in user_ids:
+        pairs = []
+        for _ in range(rng.randint(1, 3)):
+            client, devices = rng.choice(CLIENTS)
+            pairs.append((client, rng.choice(devices)))
+        user_devices[u.hex] = pairs
+    # 已删除用户的记录仍保留在播放记录中
+    deleted = [uuid.UUID(int=rng.getrandbits(128), version=4).hex for _ in range(max(1, users // 20))]
+    for user in deleted:
+        user_devices[user] = [("Emby Web", "Chrome")]
+    user_hex = list(user_devices)
+    # 用户活跃度也不均匀，已删除用户的权重较低
+    user_weights = [1.0 / (k + 1) ** 0.5 for k in range(users)] + [0.05] * len(deleted)
+
+    conn = sqlite3.connect(playback_path)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("""
+        CREATE TABLE PlaybackActivity (
+            DateCreated DATETIME NOT NULL,
+            UserId TEXT, ItemId TEXT, ItemType TEXT, ItemName TEXT,
+            PlaybackMethod TEXT, ClientName TEXT, DeviceName TEXT,
+            PlayDuration INT, PauseDuration INT, RemoteAddress TEXT
+        )
+    """)
+
+    def gen():
+        # 按天生成并在天内排序，时间与 Playback Reporting 按插入顺序递增的 rowid 一致
+        per_day = rows / max(days, 1)
+        start_day = (end - timedelta(days=days)).replace(hour=0, minute=0, second=0, microsecond=0)
+        for d in range(days):
+            n = int((d + 1) * per_day) - int(d * per_day)
+            if n <= 0:
+                continue
+            # HOUR_WEIGHTS 为本地时间，写入的 DateCreated 为 UTC
+            offsets = sorted(
+                (hour - tz_offset) * 3_600_000_000 + rng.randrange(3_600_000_000)
+                for hour in rng.choices(range(24), weights=HOUR_WEIGHTS, k=n)
+            )
+            picks = rng.choices(range(len(catalog)), weights=item_weights, k=n)
+            who = rng.choices(user_hex, weights=user_weights, k=n)
+            methods = rng.choices(PLAYBACK_METHODS, weights=PLAYBACK_METHOD_WEIGHTS, k=n)
+            day = start_day + timedelta(days=d)
+            for j in range(n):
+                ts = day + timedelta(microseconds=offsets[j])
+                item_id, item_type, item_name, runtime = catalog[picks[j]]
+                client, device = rng.choice(user_devices[who[j]])
+                # 约 10% 的播放很快就停止
+                duration = rng.randrange(5, 120) if rng.random() < 0.1 else int(runtime * rng.uniform(0.3, 1.0))
+                yield (
+                    ts.strftime("%Y-%m-%d %H:%M:%S.%f") + "0",
+                    who[j], item_id, item_type, item_name,
+                    methods[j], client, device,
+                    duration, rng.randrange(0, 300), f"192.168.{rng.randrange(1, 5)}.{rng.randrange(2, 250)}",
+                )
+
+    conn.executemany("INSERT INTO PlaybackActivity VALUES (?,?,?,?,?,?,?,?,?,?,?)", gen())
+    conn.commit()
+    conn.close()
+
+    return {
+        "rows": rows,
+        "users": [u.hex for u in user_ids],
+        "deleted_users": deleted,
+        "items": len(catalog),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成合成 Playback Reporting 数据库")
+    parser.add_argument("--rows", type=int, default=100_000, help="播放记录条数（1 万 ~ 1000 万）")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--items", type=int, default=20000)
+    parser.add_argument("--days", type=int, default=730, help="记录覆盖的天数")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=".", help="输出目录")
+    parser.add_argument("--index", action="store_true", help="生成后创建 DateCreated 索引")
+    args = parser.parse_args()
+
+    playback_path = os.path.join(args.out, "playback_reporting.db")
+    users_path = os.path.join(args.out, "users.db")
+    start = time.perf_counter()
+    summary = generate(playback_path, users_path, args.rows, args.users, args.items, args.days, args.seed)
+    print(f"已生成 {summary['rows']} 条播放记录、{len(summary['users'])} 个用户、{summary['items']} 个项目 "
+          f"({time.perf_counter() - start:.1f}s)")
+    print(f"  {playback_path}\n  {users_path}")
+    if args.index:
+        from tools.playback_index import create_indexes
+        create_indexes(playback_path)
+        print("已创建 DateCreated 索引")
+
+
+if __name__ == "__main__":
+    main()
@@ -25,9 +25,118 @@ class Settings:
     # 时区偏移（小时），用于 SQLite 查询时间转换，上海时区为 +8
     TZ_OFFSET: int = int(os.getenv("TZ_OFFSET", "8"))
 
+    # 数据库连接池配置
+    # 每个服务器每个数据库的最大连接数
+    DB_POOL_SIZE: int = int(os.getenv("DB_POOL_SIZE", "4"))
+    # 每个连接的页缓存大小（KB）
+    DB_CACHE_SIZE_KB: int = int(os.getenv("DB_CACHE_SIZE_KB", "8192"))
+    # 每个连接的内存映射大小（字节），0 表示关闭
+    DB_MMAP_SIZE: int = int(os.getenv("DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+    # 每个连接缓存的预编译语句数量
+    DB_STATEMENT_CACHE_SIZE: int = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+
+    # 汇总库配置
+    # 是否启用本地预聚合汇总库（统计接口优先从汇总库查询）
+    ROLLUP_ENABLED: bool = os.getenv("ROLLUP_ENABLED", "true").lower() == "true"
+    ROLLUP_DIR: str = os.getenv("ROLLUP_DIR", "/config/rollup")
+    # 增量更新间隔（秒）
+    ROLLUP_REFRESH_INTERVAL: int = int(os.getenv("ROLLUP_REFRESH_INTERVAL", "300"))
+    # 记录沉淀时间（小时），更新的记录不写入汇总库而是在查询时实时合并
+    ROLLUP_SETTLE_HOURS: int = int(os.getenv("ROLLUP_SETTLE_HOURS", "6"))
+
+    # 搜索索引配置
+    # 是否为播放记录的内容名称维护 FTS5 全文索引（最近播放搜索优先使用索引）
+    SEARCH_INDEX_ENABLED: bool = os.getenv("SEARCH_INDEX_ENABLED", "true").lower() == "true"
+    SEARCH_INDEX_DIR: str = os.getenv("SEARCH_INDEX_DIR", "/config/search_index")
+    # 增量更新间隔（秒）
+    SEARCH_INDEX_REFRESH_INTERVAL: int = int(os.getenv("SEARCH_INDEX_REFRESH_INTERVAL", "60"))
+    # 匹配记录数超过此值时不使用索引（匹配多的关键词按时间顺序逐行匹配很快就能取满一页）
+    SEARCH_INDEX_MAX_MATCHES: int = int(os.getenv("SEARCH_INDEX_MAX_MATCHES", "5000"))
+
+    # Emby 批量请求配置
+    # 每次批量获取项目信息的数量
+    EMBY_BATCH_SIZE: int = int(os.getenv("EMBY_BATCH_SIZE", "50"))
+    # 批量请求的最大并发数
+    EMBY_BATCH_CONCURRENCY: int = int(os.getenv("EMBY_BATCH_CONCURRENCY", "4"))
+
+    # Emby HTTP 客户端配置（每个服务器共享一个长连接客户端）
+    EMBY_HTTP_MAX_CONNECTIONS: int = int(os.getenv("EMBY_HTTP_MAX_CONNECTIONS", "20"))
+    EMBY_HTTP_MAX_KEEPALIVE: int = int(os.getenv("EMBY_HTTP_MAX_KEEPALIVE", "10"))
+    # 空闲连接保活时间（秒）
+    EMBY_HTTP_KEEPALIVE_EXPIRY: float = float(os.getenv("EMBY_HTTP_KEEPALIVE_EXPIRY", "60"))
+    # 请求超时和连接超时（秒）
+    EMBY_HTTP_TIMEOUT: float = float(os.getenv("EMBY_HTTP_TIMEOUT", "15"))
+    EMBY_HTTP_CONNECT_TIMEOUT: float = float(os.getenv("EMBY_HTTP_CONNECT_TIMEOUT", "5"))
+    # 是否启用 HTTP/2（依赖 h2，随 httpx[http2] 安装；仅对 HTTPS 生效）
+    EMBY_HTTP2: bool = os.getenv("EMBY_HTTP2", "true").lower() == "true"
+
+    # 通知发送配置
+    # 同时进行的通知请求数（进程内所有通知共享，包括所有渠道和接收者）
+    NOTIFY_CONCURRENCY: int = int(os.getenv("NOTIFY_CONCURRENCY", "4"))
+    # 单个渠道发送的总超时（秒），包括该渠道所有接收者
+    NOTIFY_CHANNEL_TIMEOUT: float = float(os.getenv("NOTIFY_CHANNEL_TIMEOUT", "60"))
+
     # 缓存配置
-    ITEM_CACHE_MAX_SIZE: int = 500
-    ITEM_CACHE_EVICT_COUNT: int = 100
+    # 项目信息缓存的最大条目数和最大字节数
+    ITEM_CACHE_MAX_SIZE: int = int(os.getenv("ITEM_CACHE_MAX_SIZE", "500"))
+    ITEM_CACHE_MAX_BYTES: int = int(os.getenv("ITEM_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+    # 项目信息缓存有效期（秒）
+    ITEM_CACHE_TTL: int = int(os.getenv("ITEM_CACHE_TTL", "3600"))
+    # 不存在的项目（已删除等）的缓存有效期（秒），0 表示不缓存
+    ITEM_CACHE_NEGATIVE_TTL: int = int(os.getenv("ITEM_CACHE_NEGATIVE_TTL", "300"))
+    # 项目信息磁盘缓存（重启后预热内存缓存）
+    ITEM_CACHE_PERSIST: bool = os.getenv("ITEM_CACHE_PERSIST", "true").lower() == "true"
+    ITEM_CACHE_DB: str = os.getenv("ITEM_CACHE_DB", "/config/item_cache.db")
+    # 磁盘条目最长保留时间（秒），超过 ITEM_CACHE_TTL 的条目仍会返回但在后台重新获取
+    ITEM_CACHE_DISK_TTL: int = int(os.getenv("ITEM_CACHE_DISK_TTL", str(7 * 86400)))
+    ITEM_CACHE_DISK_MAX_ENTRIES: int = int(os.getenv("ITEM_CACHE_DISK_MAX_ENTRIES", "20000"))
+
+    # 海报 / 背景图磁盘缓存
+    IMAGE_CACHE_ENABLED: bool = os.getenv("IMAGE_CACHE_ENABLED", "true").lower() == "true"
+    IMAGE_CACHE_DIR: str = os.getenv("IMAGE_CACHE_DIR", "/config/image_cache")
+    IMAGE_CACHE_MAX_BYTES: int = int(os.getenv("IMAGE_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+    # 浏览器缓存时间（秒）
+    IMAGE_CACHE_MAX_AGE: int = int(os.getenv("IMAGE_CACHE_MAX_AGE", "86400"))
+    # 转码格式：留空保持原格式，可选 webp / avif（avif 需要 pillow-avif-plugin，缺失时退回 webp）
+    IMAGE_CACHE_TRANSCODE: str = os.getenv("IMAGE_CACHE_TRANSCODE", "")
+    IMAGE_CACHE_QUALITY: int = int(os.getenv("IMAGE_CACHE_QUALITY", "80"))
+
+    # 统计接口响应缓存（播放记录库有变化时自动失效）
+    RESPONSE_CACHE_ENABLED: bool = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+    RESPONSE_CACHE_MAX_SIZE: int = int(os.getenv("RESPONSE_CACHE_MAX_SIZE", "256"))
+    # 响应最长有效期（秒），超过后即使数据库未变化也重新计算（排行等接口包含 Emby 数据）
+    RESPONSE_CACHE_TTL: int = int(os.getenv("RESPONSE_CACHE_TTL", "300"))
+    # 超过有效期（数据库未变化）后仍可返回旧响应的时间（秒），同时在后台重新计算，0 表示总是同步计算
+    RESPONSE_CACHE_STALE: int = int(os.getenv("RESPONSE_CACHE_STALE", "60"))
+
+    # 多服务器汇总视图（server_id=all）配置
+    # 单个服务器的查询超时（秒），超时的服务器不计入结果
+    AGGREGATE_SERVER_TIMEOUT: float = float(os.getenv("AGGREGATE_SERVER_TIMEOUT", "10"))
+    # 计算响应缓存数据版本时单个服务器的超时（秒），超时的服务器在版本中记为不可用
+    AGGREGATE_VERSION_TIMEOUT: float = float(os.getenv("AGGREGATE_VERSION_TIMEOUT", "1"))
+
+    # 播放记录导出：每页读取的行数（键集分页，内存占用与导出总行数无关）
+    EXPORT_PAGE_SIZE: int = int(os.getenv("EXPORT_PAGE_SIZE", "5000"))
+
+    # Webhook 队列：收到的事件先持久化再由后台 worker 发送通知
+    WEBHOOK_QUEUE_DB: str = os.getenv("WEBHOOK_QUEUE_DB", "/config/webhook_queue.db")
+    WEBHOOK_WORKERS: int = int(os.getenv("WEBHOOK_WORKERS", "2"))
+    # 最大处理次数，超过后移入死信表
+    WEBHOOK_MAX_ATTEMPTS: int = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5"))
+    # 重试间隔（秒）：从 BASE 开始每次翻倍，最多 MAX
+    WEBHOOK_RETRY_BASE: float = float(os.getenv("WEBHOOK_RETRY_BASE", "5"))
+    WEBHOOK_RETRY_MAX: float = float(os.getenv("WEBHOOK_RETRY_MAX", "600"))
+    # 单个事件的处理超时（秒）和领取后的租约时间（秒，进程中途退出时租约到期后重新处理）
+    WEBHOOK_PROCESS_TIMEOUT: float = float(os.getenv("WEBHOOK_PROCESS_TIMEOUT", "300"))
+    WEBHOOK_LEASE_SECONDS: float = float(os.getenv("WEBHOOK_LEASE_SECONDS", "330"))
+    # 空闲时检查到期重试的间隔（秒），新事件入队会立即唤醒 worker
+    WEBHOOK_POLL_INTERVAL: float = float(os.getenv("WEBHOOK_POLL_INTERVAL", "5"))
+    # 已处理事件的去重记录保留时间（小时）
+    WEBHOOK_DEDUP_HOURS: float = float(os.getenv("WEBHOOK_DEDUP_HOURS", "24"))
+    # 同一剧集的 library.new 事件合并为一条汇总通知：从第一集入库起等待的时间（秒，0 表示不合并）
+    # 和单条汇总的最多集数（达到后立即发送）
+    LIBRARY_DIGEST_WINDOW: float = float(os.getenv("LIBRARY_DIGEST_WINDOW", "60"))
+    LIBRARY_DIGEST_MAX_BATCH: int = int(os.getenv("LIBRARY_DIGEST_MAX_BATCH", "50"))
 
     # ============= Webhook 通知配置 =============
     
@@ -51,6 +160,15 @@ class Settings:
     # TMDB配置
     TMDB_API_KEY: str = os.getenv("TMDB_API_KEY", "")
     TMDB_IMAGE_BASE_URL: str = os.getenv("TMDB_IMAGE_BASE_URL", "https://image.tmdb.org/t/p/original")
+    # TMDB 查询缓存：剧名/年份 -> TMDB ID、TMDB ID -> 图片路径，保存在 /config 下重启后保留
+    TMDB_CACHE_DB: str = os.getenv("TMDB_CACHE_DB", "/config/tmdb_cache.db")
+    TMDB_CACHE_MAX_SIZE: int = int(os.getenv("TMDB_CACHE_MAX_SIZE", "2000"))
+    # 缓存有效期（秒）和未找到结果的缓存有效期（秒）
+    TMDB_CACHE_TTL: int = int(os.getenv("TMDB_CACHE_TTL", str(7 * 86400)))
+    TMDB_CACHE_NEGATIVE_TTL: int = int(os.getenv("TMDB_CACHE_NEGATIVE_TTL", "86400"))
+    # 被限流（HTTP 429）时的重试次数，以及响应没有 Retry-After 时的等待时间（秒，之后每次翻倍）
+    TMDB_MAX_RETRIES: int = int(os.getenv("TMDB_MAX_RETRIES", "3"))
+    TMDB_RETRY_AFTER: float = float(os.getenv("TMDB_RETRY_AFTER", "2"))
     
     # 通知模板配置
     NOTIFICATION_TEMPLATES: dict = {
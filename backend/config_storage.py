@@ -1,7 +1,10 @@
 """配置存储管理"""
+import copy
 import json
 import os
-from typing import Dict, Any
+import tempfile
+import threading
+from typing import Dict, Any, Callable, Optional, Tuple
 import logging
 import uuid
 from datetime import datetime
@@ -82,7 +85,7 @@ DEFAULT_CONFIG = {
         },
         "library": {
             "title": "{% if media_type == '电影' %}🎬{% elif media_type == '剧集' %}📺{% else %}🆕{% endif %} 新入库 {{ media_type }}：{{ item_name }}",
-            "text": "{% if media_type == '电影' %}🎬 类型：电影{% elif media_type == '剧集' %}📺 类型：剧集{% else %}🆕 类型：{{ media_type }}{% endif %}\n{% if rating %}⭐ 评分：{{ rating }}/10\n{% endif %}{% if item_year %}📅 年份：{{ item_year }}\n{% endif %}{% if size %}💾 大小：{{ size }}\n{% endif %}🕒 时间：{{ now_time }}\n{% if overview %}📝 简介：{{ overview }}{% endif %}"
+            "text": "{% if media_type == '电影' %}🎬 类型：电影{% elif media_type == '剧集' %}📺 类型：剧集{% else %}🆕 类型：{{ media_type }}{% endif %}\n{% if rating %}⭐ 评分：{{ rating }}/10\n{% endif %}{% if item_year %}📅 年份：{{ item_year }}\n{% endif %}{% if episode_count %}🎞️ 集数：{{ episode_count }}\n{% endif %}{% if size %}💾 大小：{{ size }}\n{% endif %}🕒 时间：{{ now_time }}\n{% if overview %}📝 简介：{{ overview }}{% endif %}"
         },
         "login": {
             "title": "{% if action == '登录成功' %}🔑 登录成功 ✅{% elif action == '登录失败' %}🔓 登录失败 ❌{% else %}🚪 用户登录通知{% endif %}",
@@ -97,10 +100,17 @@ DEFAULT_CONFIG = {
 
 
 class ConfigStorage:
-    """配置文件存储管理"""
+    """配置文件存储管理
+
+    配置在内存中保留一份快照，只有文件的 mtime 或大小变化时才重新解析；
+    读取接口返回快照的深拷贝，调用方修改返回值不会影响快照。
+    """
     
     def __init__(self, config_file: str = CONFIG_FILE):
         self.config_file = config_file
+        self._lock = threading.RLock()
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._file_stat: Optional[Tuple[int, int]] = None
         self._ensure_config_exists()
         self._ensure_default_server()
     
@@ -115,93 +125,136 @@ class ConfigStorage:
     
     def _ensure_default_server(self):
         """确保至少有一个默认服务器配置"""
-        config = self.load_config()
-        servers = config.get("servers", {})
-        
-        # 如果没有任何服务器，创建默认服务器
-        if not servers:
-            from config import settings
-            default_server_id = str(uuid.uuid4())
-            servers[default_server_id] = {
-                "name": "默认服务器",
-                "emby_url": settings.EMBY_URL,
-                "playback_db": settings.PLAYBACK_DB,
-                "users_db": settings.USERS_DB,
-                "auth_db": settings.AUTH_DB,
-                "emby_api_key": settings.EMBY_API_KEY,
-                "is_default": True,
-                "created_at": datetime.now().isoformat()
-            }
-            config["servers"] = servers
-            self.save_config(config)
-            logger.info(f"创建默认服务器配置: {default_server_id}")
+        def add_default_server(servers: Dict[str, Any]) -> Dict[str, Any]:
+            # 如果没有任何服务器，创建默认服务器
+            if not servers:
+                from config import settings
+                default_server_id = str(uuid.uuid4())
+                servers[default_server_id] = {
+                    "name": "默认服务器",
+                    "emby_url": settings.EMBY_URL,
+                    "playback_db": settings.PLAYBACK_DB,
+                    "users_db": settings.USERS_DB,
+                    "auth_db": settings.AUTH_DB,
+                    "emby_api_key": settings.EMBY_API_KEY,
+                    "is_default": True,
+                    "created_at": datetime.now().isoformat()
+                }
+                logger.info(f"创建默认服务器配置: {default_server_id}")
+            return servers
+
+        if not self._current().get("servers"):
+            self.modify_section("servers", add_default_server)
     
-    def load_config(self) -> Dict[str, Any]:
-        """加载配置"""
+    def _stat(self) -> Optional[Tuple[int, int]]:
         try:
-            with open(self.config_file, 'r', encoding='utf-8') as f:
-                config = json.load(f)
-            logger.info("配置加载成功")
-            return config
-        except Exception as e:
-            logger.error(f"加载配置失败: {str(e)}")
-            return DEFAULT_CONFIG.copy()
+            st = os.stat(self.config_file)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def _current(self) -> Dict[str, Any]:
+        """返回内存快照（文件变化时重新加载），调用方不得修改返回值"""
+        with self._lock:
+            file_stat = self._stat()
+            if self._snapshot is not None and file_stat == self._file_stat:
+                return self._snapshot
+            try:
+                with open(self.config_file, 'r', encoding='utf-8') as f:
+                    self._snapshot = json.load(f)
+                self._file_stat = file_stat
+                logger.info("配置加载成功")
+            except Exception as e:
+                logger.error(f"加载配置失败: {str(e)}")
+                # 文件损坏或被外部程序写了一半时保留上一次成功加载的快照
+                if self._snapshot is None:
+                    return copy.deepcopy(DEFAULT_CONFIG)
+            return self._snapshot
+
+    def load_config(self) -> Dict[str, Any]:
+        """加载配置（返回副本）"""
+        return copy.deepcopy(self._current())
     
     def save_config(self, config: Dict[str, Any]):
-        """保存配置"""
-        try:
-            with open(self.config_file, 'w', encoding='utf-8') as f:
-                json.dump(config, f, ensure_ascii=False, indent=2)
-            logger.info("配置保存成功")
-        except Exception as e:
-            logger.error(f"保存配置失败: {str(e)}")
-            raise
+        """保存配置（写临时文件后原子替换）"""
+        with self._lock:
+            directory = os.path.dirname(self.config_file) or "."
+            data = json.dumps(config, ensure_ascii=False, indent=2)
+            try:
+                fd, tmp_path = tempfile.mkstemp(prefix=".webhook_config.", suffix=".tmp", dir=directory)
+                try:
+                    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                        f.write(data)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    try:
+                        os.replace(tmp_path, self.config_file)
+                    except OSError:
+                        # 配置文件以单文件方式挂载进容器时无法替换，退回直接写入
+                        with open(self.config_file, 'w', encoding='utf-8') as f:
+                            f.write(data)
+                finally:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                self._snapshot = copy.deepcopy(config)
+                self._file_stat = self._stat()
+                logger.info("配置保存成功")
+            except Exception as e:
+                logger.error(f"保存配置失败: {str(e)}")
+                raise
     
     def get_telegram_config(self) -> Dict[str, Any]:
         """获取Telegram配置"""
-        config = self.load_config()
-        return config.get("telegram", DEFAULT_CONFIG["telegram"])
+        return self._get_copy("telegram", DEFAULT_CONFIG["telegram"])
     
     def get_wecom_config(self) -> Dict[str, Any]:
         """获取企业微信配置"""
-        config = self.load_config()
-        return config.get("wecom", DEFAULT_CONFIG["wecom"])
+        return self._get_copy("wecom", DEFAULT_CONFIG["wecom"])
     
     def get_discord_config(self) -> Dict[str, Any]:
         """获取Discord配置"""
-        config = self.load_config()
-        return config.get("discord", DEFAULT_CONFIG["discord"])
+        return self._get_copy("discord", DEFAULT_CONFIG["discord"])
     
     def get_tmdb_config(self) -> Dict[str, Any]:
         """获取TMDB配置"""
-        config = self.load_config()
-        return config.get("tmdb", DEFAULT_CONFIG["tmdb"])
+        return self._get_copy("tmdb", DEFAULT_CONFIG["tmdb"])
     
     def get_report_config(self) -> Dict[str, Any]:
         """获取报告推送配置"""
-        config = self.load_config()
-        return config.get("report", DEFAULT_CONFIG["report"])
+        return self._get_copy("report", DEFAULT_CONFIG["report"])
     
     def get_cover_config(self) -> Dict[str, Any]:
         """获取封面生成配置"""
-        config = self.load_config()
-        return config.get("cover", DEFAULT_CONFIG["cover"])
+        return self._get_copy("cover", DEFAULT_CONFIG["cover"])
     
     def get_templates(self) -> Dict[str, Any]:
         """获取通知模板"""
-        config = self.load_config()
-        return config.get("templates", DEFAULT_CONFIG["templates"])
+        return self._get_copy("templates", DEFAULT_CONFIG["templates"])
     
+    def _get_copy(self, key: str, default=None) -> Any:
+        return copy.deepcopy(self._current().get(key, default))
+
     def get(self, key: str, default=None) -> Any:
         """获取配置项"""
-        config = self.load_config()
-        return config.get(key, default)
+        return self._get_copy(key, default)
     
     def update_section(self, section: str, data: Dict[str, Any]):
         """更新配置的某个部分"""
-        config = self.load_config()
-        config[section] = data
-        self.save_config(config)
+        with self._lock:
+            config = self.load_config()
+            config[section] = data
+            self.save_config(config)
+
+    def modify_section(self, section: str, updater: Callable[[Any], Any]) -> Any:
+        """在锁内读取、修改并保存配置的某个部分，避免并发修改互相覆盖
+
+        updater 接收当前值的副本，返回新值；返回新值。
+        """
+        with self._lock:
+            config = self.load_config()
+            config[section] = updater(config.get(section, copy.deepcopy(DEFAULT_CONFIG.get(section, {}))))
+            self.save_config(config)
+            return config[section]
 
 
 # 全局配置存储实例
@@ -2,7 +2,13 @@
 数据库工具模块
 提供数据库连接和 SQL 辅助函数
 """
+import asyncio
+import os
+import sqlite3
 import aiosqlite
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from urllib.parse import quote
 from config import settings
 from typing import Optional
 from config_storage import config_storage
@@ -15,11 +21,12 @@ def get_server_config(server_id: Optional[str] = None) -> dict:
         server_id: 服务器ID，如果为None则返回默认配置（使用环境变量）
         
     Returns:
-        包含数据库路径和其他配置的字典
+        包含数据库路径和其他配置的字典（server_id 为实际生效的服务器ID，默认配置为 None）
     """
     if server_id is None:
         # 使用环境变量的默认配置
         return {
+            'server_id': None,
             'playback_db': settings.PLAYBACK_DB,
             'users_db': settings.USERS_DB,
             'auth_db': settings.AUTH_DB,
@@ -32,6 +39,7 @@ def get_server_config(server_id: Optional[str] = None) -> dict:
     if server_id not in servers:
         # 如果指定的服务器不存在，回退到默认配置
         return {
+            'server_id': None,
             'playback_db': settings.PLAYBACK_DB,
             'users_db': settings.USERS_DB,
             'auth_db': settings.AUTH_DB,
@@ -42,6 +50,7 @@ def get_server_config(server_id: Optional[str] = None) -> dict:
     server = servers[server_id]
     # 如果服务器配置中没有指定数据库路径，使用默认路径
     return {
+        'server_id': server_id,
         'playback_db': server.get('playback_db') or settings.PLAYBACK_DB,
         'users_db': server.get('users_db') or settings.USERS_DB,
         'auth_db': server.get('auth_db') or settings.AUTH_DB,
@@ -50,22 +59,130 @@ def get_server_config(server_id: Optional[str] = None) -> dict:
     }
 
 
-def get_playback_db(server_id: Optional[str] = None):
-    """获取播放记录数据库连接"""
+class SQLitePool:
+    """只读 SQLite 连接池
+
+    连接以 mode=ro URI 打开并设置 query_only，复用连接的同时也复用了
+    sqlite3 模块的预编译语句缓存（cached_statements）。数据库文件被替换
+    （inode 变化）时丢弃空闲连接重新打开。
+    """
+
+    def __init__(self, path: str, max_size: int):
+        self.path = path
+        self.max_size = max_size
+        self._idle: list[aiosqlite.Connection] = []
+        self._semaphore = asyncio.Semaphore(max_size)
+        self._file_id = self._stat_file()
+        self._closed = False
+
+    def _stat_file(self) -> Optional[tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+            return st.st_dev, st.st_ino
+        except OSError:
+            return None
+
+    async def _open(self) -> aiosqlite.Connection:
+        """打开一个新连接并应用只读和缓存相关的 PRAGMA"""
+        uri = f"file:{quote(self.path)}?mode=ro"
+        db = None
+        try:
+            db = await aiosqlite.connect(uri, uri=True, cached_statements=settings.DB_STATEMENT_CACHE_SIZE)
+            # SQLite 在第一次查询时才真正打开文件，先读一次 schema 确认连接可用
+            await db.execute("PRAGMA schema_version")
+        except sqlite3.OperationalError:
+            # WAL 库在缺少 -shm 且目录不可写时无法以 mode=ro 打开，回退为普通连接
+            if db is not None:
+                await db.close()
+            db = await aiosqlite.connect(self.path, cached_statements=settings.DB_STATEMENT_CACHE_SIZE)
+        await db.execute("PRAGMA query_only = ON")
+        await db.execute(f"PRAGMA cache_size = -{settings.DB_CACHE_SIZE_KB}")
+        await db.execute(f"PRAGMA mmap_size = {settings.DB_MMAP_SIZE}")
+        return db
+
+    async def _discard_idle(self):
+        idle, self._idle = self._idle, []
+        for db in idle:
+            try:
+                await db.close()
+            except Exception:
+                pass
+
+    @asynccontextmanager
+    async def connection(self):
+        """借出一个连接，退出时归还；出现异常的连接直接关闭不再复用"""
+        async with self._semaphore:
+            file_id = self._stat_file()
+            if file_id != self._file_id:
+                self._file_id = file_id
+                await self._discard_idle()
+
+            db = self._idle.pop() if self._idle else await self._open()
+            reusable = False
+            try:
+                yield db
+                reusable = True
+            finally:
+                if reusable and not self._closed:
+                    self._idle.append(db)
+                else:
+                    await db.close()
+
+    async def close(self):
+        """关闭连接池（正在使用的连接在归还时关闭）"""
+        self._closed = True
+        await self._discard_idle()
+
+
+# 连接池注册表，键为 (get_server_config 解析出的 server_id, 数据库类型)
+_pools: dict[tuple[Optional[str], str], SQLitePool] = {}
+
+
+async def _get_pool(server_id: Optional[str], kind: str) -> SQLitePool:
     config = get_server_config(server_id)
-    return aiosqlite.connect(config['playback_db'])
+    key = (config['server_id'], kind)
+    path = config[f'{kind}_db']
+
+    pool = _pools.get(key)
+    if pool is not None and pool.path != path:
+        # 服务器的数据库路径被修改，淘汰旧连接池
+        del _pools[key]
+        await pool.close()
+        pool = None
+    if pool is None:
+        pool = SQLitePool(path, settings.DB_POOL_SIZE)
+        _pools[key] = pool
+    return pool
+
+
+@asynccontextmanager
+async def _pooled_connection(server_id: Optional[str], kind: str):
+    pool = await _get_pool(server_id, kind)
+    async with pool.connection() as db:
+        yield db
+
+
+def get_playback_db(server_id: Optional[str] = None):
+    """获取播放记录数据库连接（只读连接池）"""
+    return _pooled_connection(server_id, 'playback')
 
 
 def get_users_db(server_id: Optional[str] = None):
-    """获取用户数据库连接"""
-    config = get_server_config(server_id)
-    return aiosqlite.connect(config['users_db'])
+    """获取用户数据库连接（只读连接池）"""
+    return _pooled_connection(server_id, 'users')
 
 
 def get_auth_db(server_id: Optional[str] = None):
-    """获取认证数据库连接"""
-    config = get_server_config(server_id)
-    return aiosqlite.connect(config['auth_db'])
+    """获取认证数据库连接（只读连接池）"""
+    return _pooled_connection(server_id, 'auth')
+
+
+async def close_db_pools():
+    """关闭所有数据库连接池（应用关闭时调用）"""
+    pools = list(_pools.values())
+    _pools.clear()
+    for pool in pools:
+        await pool.close()
 
 
 def get_count_expr() -> str:
@@ -100,6 +217,79 @@ def local_date(column: str) -> str:
         return f"date({column}, '{offset} hours')"
 
 
+def local_date_to_utc(date_str: str, offset: Optional[int] = None) -> Optional[str]:
+    """将本地日期（YYYY-MM-DD）的零点转换为 UTC 时间字符串
+
+    返回格式与 DateCreated 列一致（YYYY-MM-DD HH:MM:SS），可直接做字符串比较；
+    日期格式无法解析时返回 None
+    """
+    if offset is None:
+        offset = settings.TZ_OFFSET
+    try:
+        local_midnight = datetime.strptime(date_str.strip(), "%Y-%m-%d")
+    except (ValueError, AttributeError):
+        return None
+    return (local_midnight - timedelta(hours=offset)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def date_range_conditions(
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    column: str = "DateCreated",
+    offset: Optional[int] = None,
+) -> tuple[list[str], list]:
+    """构建日期范围筛选条件（可走索引）
+
+    将本地日期边界换算成 UTC 时间后直接与原始列比较，避免对每一行调用
+    date(column, '+N hours') 导致全表扫描：
+        local_date(col) >= start  <=>  col >= UTC(start 00:00)
+        local_date(col) <= end    <=>  col <  UTC(end + 1 天 00:00)
+
+    Args:
+        start_date: 开始日期（本地，含）
+        end_date: 结束日期（本地，含）
+        column: 时间列名
+        offset: 时区偏移小时数，默认使用 settings.TZ_OFFSET；传 0 表示按 UTC 日期
+
+    Returns:
+        (条件列表, 参数列表)
+    """
+    if offset is None:
+        offset = settings.TZ_OFFSET
+    conditions = []
+    params = []
+
+    if start_date:
+        utc_start = local_date_to_utc(start_date, offset)
+        if utc_start:
+            conditions.append(f"{column} >= ?")
+            params.append(utc_start)
+        else:
+            # 无法解析的日期保持原有语义（交给 SQLite 的 date() 处理）
+            conditions.append(f"{_shift_date(column, offset)} >= date(?)")
+            params.append(start_date)
+
+    if end_date:
+        utc_end = local_date_to_utc(end_date, offset)
+        if utc_end:
+            next_day = datetime.strptime(utc_end, "%Y-%m-%d %H:%M:%S") + timedelta(days=1)
+            conditions.append(f"{column} < ?")
+            params.append(next_day.strftime("%Y-%m-%d %H:%M:%S"))
+        else:
+            conditions.append(f"{_shift_date(column, offset)} <= date(?)")
+            params.append(end_date)
+
+    return conditions, params
+
+
+def _shift_date(column: str, offset: int) -> str:
+    """按指定偏移生成 date() 表达式（仅用于无法换算边界时的回退）"""
+    if offset == 0:
+        return f"date({column})"
+    sign = "+" if offset > 0 else ""
+    return f"date({column}, '{sign}{offset} hours')"
+
+
 def convert_guid_bytes_to_standard(guid_bytes: bytes) -> str:
     """将 SQLite 中的 GUID 字节转换为标准格式（小写无连字符）
     SQLite 存储的是 .NET GUID 的字节格式，前三部分需要反转字节序
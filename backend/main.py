@@ -11,8 +11,21 @@ from fastapi.responses import FileResponse, JSONResponse
 from routers import stats_router, media_router, auth_router, webhook_router, config_router
 from routers.report import router as report_router
 from routers.cover import router as cover_router
+from routers.cache import router as cache_router
+from routers.export import router as export_router
 from routers.auth import get_current_session
 from services.scheduler import report_scheduler
+from services.rollup import rollup_service
+from services.search_index import search_index_service
+from services.webhook_queue import webhook_queue
+from routers.webhook import deliver_webhook_event
+from services.http_client import http_client_pool
+from services.emby import emby_service
+from services.server_registry import server_registry
+from services.item_store import close_item_stores
+from services.image_cache import image_cache_service
+from services.tmdb import tmdb_cache
+from database import close_db_pools
 
 # 创建应用实例
 app = FastAPI(title="New Emby Stats")
@@ -26,11 +39,25 @@ async def startup_event():
     print("✓ 已检查并创建字体目录: /config/fonts")
     
     report_scheduler.start()
+    rollup_service.start()
+    search_index_service.start()
+    webhook_queue.start(deliver_webhook_event)
+    emby_service.start_cache_warmup()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """应用关闭时执行"""
     report_scheduler.stop()
+    await rollup_service.stop()
+    await search_index_service.stop()
+    await webhook_queue.stop()
+    await emby_service.close()
+    await server_registry.close()
+    await close_db_pools()
+    await http_client_pool.close()
+    close_item_stores()
+    image_cache_service.close()
+    tmdb_cache.close()
 
 # CORS 中间件配置
 app.add_middleware(
@@ -94,6 +121,8 @@ app.include_router(webhook_router)
 app.include_router(config_router)
 app.include_router(report_router)
 app.include_router(cover_router)
+app.include_router(cache_router)
+app.include_router(export_router)
 
 # 静态文件服务
 frontend_path = "/app/frontend"
@@ -0,0 +1,36 @@
+"""缓存状态路由"""
+from fastapi import APIRouter
+
+from services.emby import emby_service
+from services.image_cache import image_cache_service
+from services.response_cache import response_cache
+from services.server_registry import server_registry
+from services.users import user_service
+
+router = APIRouter(prefix="/api/cache", tags=["cache"])
+
+
+@router.get("/stats")
+async def get_cache_stats():
+    """获取各级缓存的命中率等统计信息"""
+    return {
+        "item_info": emby_service.get_cache_stats(),
+        "servers": server_registry.stats(),
+        "images": image_cache_service.stats(),
+        "responses": response_cache.stats(),
+        "users": user_service.stats(),
+    }
+
+
+@router.post("/item-info/clear")
+async def clear_item_info_cache():
+    """清空项目信息缓存"""
+    emby_service.clear_item_cache()
+    return {"success": True}
+
+
+@router.post("/responses/clear")
+async def clear_response_cache():
+    """清空统计接口响应缓存"""
+    response_cache.invalidate()
+    return {"success": True}
@@ -4,6 +4,8 @@ from pydantic import BaseModel
 from typing import Dict, Any, List, Optional
 from config_storage import config_storage
 from services.scheduler import report_scheduler
+from services.server_registry import server_registry
+from services.notification import template_cache
 from version import get_version_info
 import os
 import uuid
@@ -218,6 +220,7 @@ async def save_notification_templates(templates: NotificationTemplates):
     """保存通知模板配置"""
     try:
         config_storage.update_section("templates", templates.templates)
+        template_cache.invalidate()
         return {"status": "success", "message": "模板已保存并立即生效"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -267,22 +270,22 @@ async def get_servers():
 async def create_server(server: ServerConfig):
     """创建新服务器配置"""
     try:
-        servers = config_storage.get("servers", {})
-        
-        # 如果设置为默认服务器，取消其他服务器的默认状态
-        if server.is_default:
-            for s in servers.values():
-                s["is_default"] = False
-        
         # 生成唯一ID
         server_id = str(uuid.uuid4())
-        
-        # 保存服务器配置
-        server_data = server.dict()
-        server_data["created_at"] = datetime.now().isoformat()
-        servers[server_id] = server_data
-        
-        config_storage.update_section("servers", servers)
+
+        def add_server(servers: Dict[str, Any]) -> Dict[str, Any]:
+            # 如果设置为默认服务器，取消其他服务器的默认状态
+            if server.is_default:
+                for s in servers.values():
+                    s["is_default"] = False
+
+            # 保存服务器配置
+            server_data = server.dict()
+            server_data["created_at"] = datetime.now().isoformat()
+            servers[server_id] = server_data
+            return servers
+
+        config_storage.modify_section("servers", add_server)
         
         return {"server_id": server_id, "status": "success"}
     except Exception as e:
@@ -293,21 +296,22 @@ async def create_server(server: ServerConfig):
 async def update_server(server_id: str, server: ServerUpdate):
     """更新服务器配置"""
     try:
-        servers = config_storage.get("servers", {})
-        
-        if server_id not in servers:
-            raise HTTPException(status_code=404, detail="服务器不存在")
-        
-        # 如果设置为默认服务器，取消其他服务器的默认状态
-        if server.is_default:
-            for s in servers.values():
-                s["is_default"] = False
-        
-        # 更新服务器配置（只更新提供的字段）
-        update_data = server.dict(exclude_unset=True)
-        servers[server_id].update(update_data)
-        
-        config_storage.update_section("servers", servers)
+        def apply_update(servers: Dict[str, Any]) -> Dict[str, Any]:
+            if server_id not in servers:
+                raise HTTPException(status_code=404, detail="服务器不存在")
+
+            # 如果设置为默认服务器，取消其他服务器的默认状态
+            if server.is_default:
+                for s in servers.values():
+                    s["is_default"] = False
+
+            # 更新服务器配置（只更新提供的字段）
+            update_data = server.dict(exclude_unset=True)
+            servers[server_id].update(update_data)
+            return servers
+
+        config_storage.modify_section("servers", apply_update)
+        await server_registry.evict(server_id)
         
         return {"status": "success"}
     except HTTPException:
@@ -320,20 +324,21 @@ async def update_server(server_id: str, server: ServerUpdate):
 async def delete_server(server_id: str):
     """删除服务器配置"""
     try:
-        servers = config_storage.get("servers", {})
-        
-        if server_id not in servers:
-            raise HTTPException(status_code=404, detail="服务器不存在")
-        
-        # 删除服务器
-        del servers[server_id]
-        
-        # 如果没有默认服务器了，设置第一个为默认
-        if servers and not any(s.get("is_default") for s in servers.values()):
-            first_server = next(iter(servers.values()))
-            first_server["is_default"] = True
-        
-        config_storage.update_section("servers", servers)
+        def remove_server(servers: Dict[str, Any]) -> Dict[str, Any]:
+            if server_id not in servers:
+                raise HTTPException(status_code=404, detail="服务器不存在")
+
+            # 删除服务器
+            del servers[server_id]
+
+            # 如果没有默认服务器了，设置第一个为默认
+            if servers and not any(s.get("is_default") for s in servers.values()):
+                first_server = next(iter(servers.values()))
+                first_server["is_default"] = True
+            return servers
+
+        config_storage.modify_section("servers", remove_server)
+        await server_registry.evict(server_id)
         
         return {"status": "success"}
     except HTTPException:
@@ -8,7 +8,7 @@ from pydantic import BaseModel
 import logging
 import urllib.parse
 
-from services.cover_generator import cover_service
+from services.server_registry import get_cover_service, get_emby_service
 
 logger = logging.getLogger(__name__)
 
@@ -44,17 +44,17 @@ class GenerateCoverRequest(BaseModel):
 
 
 @router.get("/test-image/{library_id}")
-async def test_library_image(library_id: str):
+async def test_library_image(library_id: str, server_id: Optional[str] = Query(default=None)):
     """测试媒体库封面的实际格式"""
     try:
-        from services.emby import emby_service
         import httpx
         
+        emby_service = get_emby_service(server_id)
         api_key = await emby_service.get_api_key()
         if not api_key:
             raise HTTPException(status_code=500, detail="无法获取API密钥")
         
-        url = f"{emby_service.settings.EMBY_URL}/emby/Items/{library_id}/Images/Primary"
+        url = f"{emby_service.emby_url}/emby/Items/{library_id}/Images/Primary"
         
         async with httpx.AsyncClient() as client:
             response = await client.get(
@@ -97,9 +97,10 @@ async def test_library_image(library_id: str):
 
 
 @router.get("/libraries")
-async def get_libraries():
+async def get_libraries(server_id: Optional[str] = Query(default=None)):
     """获取媒体库列表"""
     try:
+        cover_service = get_cover_service(server_id)
         libraries = await cover_service.get_library_list()
         return {
             "success": True,
@@ -111,9 +112,10 @@ async def get_libraries():
 
 
 @router.post("/generate")
-async def generate_cover(request: GenerateCoverRequest):
+async def generate_cover(request: GenerateCoverRequest, server_id: Optional[str] = Query(default=None)):
     """生成封面"""
     try:
+        cover_service = get_cover_service(server_id)
         logger.info(f"收到封面生成请求: {request.library_name}, 风格: {request.style}, 动画: {request.is_animated}")
         logger.info(f"完整请求数据: {request.dict()}")
         logger.info(f"标题信息: title='{request.title}', subtitle='{request.subtitle}'")
@@ -218,10 +220,12 @@ async def generate_cover(request: GenerateCoverRequest):
 @router.get("/preview/{library_id}")
 async def preview_library(
     library_id: str,
-    limit: int = Query(default=9, ge=1, le=50)
+    limit: int = Query(default=9, ge=1, le=50),
+    server_id: Optional[str] = Query(default=None),
 ):
     """预览媒体库项目（用于前端显示）"""
     try:
+        cover_service = get_cover_service(server_id)
         items = await cover_service.get_library_items(library_id, limit=limit)
         
         # 只返回必要信息
@@ -246,10 +250,12 @@ async def preview_library(
 @router.post("/upload/{library_id}")
 async def upload_cover_to_emby(
     library_id: str,
-    request: GenerateCoverRequest
+    request: GenerateCoverRequest,
+    server_id: Optional[str] = Query(default=None),
 ):
     """生成并上传封面到 Emby"""
     try:
+        cover_service = get_cover_service(server_id)
         logger.info(f"开始生成并上传封面: {request.library_name}")
         
         # 生成封面
@@ -326,9 +332,7 @@ async def upload_cover_to_emby(
             logger.info(f"上传静态封面，格式: {content_type}")
         
         # 上传到 Emby
-        from services.emby import emby_service
-        
-        success = await emby_service.upload_library_image(
+        success = await cover_service.emby_service.upload_library_image(
             library_id=library_id,
             image_data=image_data,
             image_type="Primary",
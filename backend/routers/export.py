@@ -0,0 +1,78 @@
+"""
+播放记录导出 API 路由
+"""
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+
+from routers.stats import build_filter_conditions
+from services.export import (
+    EXPORT_FORMATS,
+    PYARROW_AVAILABLE,
+    export_columns,
+    iter_playback_pages,
+    stream_csv,
+    stream_ndjson,
+    stream_parquet,
+)
+from services.multi_server import is_all_servers
+from services.search_index import search_index_service
+
+router = APIRouter(prefix="/api/export", tags=["export"])
+
+
+@router.get("/playback")
+async def export_playback(
+    format: str = Query(default="ndjson", description="导出格式 ndjson / csv / parquet"),
+    days: Optional[int] = Query(default=None, ge=1, description="最近天数，不传且无日期范围时导出全部"),
+    start_date: Optional[str] = Query(default=None, description="开始日期 YYYY-MM-DD"),
+    end_date: Optional[str] = Query(default=None, description="结束日期 YYYY-MM-DD"),
+    users: Optional[str] = Query(default=None, description="用户ID列表，逗号分隔"),
+    clients: Optional[str] = Query(default=None, description="客户端列表，逗号分隔"),
+    devices: Optional[str] = Query(default=None, description="设备列表，逗号分隔"),
+    item_types: Optional[str] = Query(default=None, description="媒体类型列表，逗号分隔"),
+    playback_methods: Optional[str] = Query(default=None, description="播放方式列表，逗号分隔"),
+    search: Optional[str] = Query(default=None, description="搜索关键词，匹配内容名称"),
+    enrich: bool = Query(default=False, description="追加用户名和名称映射后的客户端 / 设备名"),
+    limit: Optional[int] = Query(default=None, ge=1, description="最多导出的行数"),
+    server_id: Optional[str] = Query(default=None, description="服务器ID"),
+):
+    """按筛选条件流式导出播放记录（按时间升序）"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"不支持的导出格式: {format}")
+    if format == "parquet" and not PYARROW_AVAILABLE:
+        raise HTTPException(status_code=400, detail="导出 Parquet 需要安装 pyarrow")
+    if is_all_servers(server_id):
+        raise HTTPException(status_code=400, detail="导出不支持全部服务器汇总，请指定服务器")
+
+    where_clause, params = build_filter_conditions(
+        days=days,
+        start_date=start_date,
+        end_date=end_date,
+        users=[u.strip() for u in users.split(",")] if users else None,
+        clients=[c.strip() for c in clients.split(",")] if clients else None,
+        devices=[d.strip() for d in devices.split(",")] if devices else None,
+        item_types=[t.strip() for t in item_types.split(",")] if item_types else None,
+        playback_methods=[m.strip() for m in playback_methods.split(",")] if playback_methods else None,
+        search=search,
+        search_matches=await search_index_service.match(server_id, search),
+    )
+
+    pages = iter_playback_pages(server_id, where_clause, params, enrich=enrich, limit=limit)
+    columns = export_columns(enrich)
+    if format == "ndjson":
+        body = stream_ndjson(pages)
+    elif format == "csv":
+        body = stream_csv(pages, columns)
+    else:
+        body = stream_parquet(pages, columns)
+
+    media_type, extension = EXPORT_FORMATS[format]
+    filename = f"playback_{datetime.now().strftime('%Y%m%d')}.{extension}"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -2,16 +2,29 @@
 媒体相关路由模块
 处理内容排行和海报等 API 端点
 """
-from fastapi import APIRouter, Query, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Query, HTTPException, Request
+from fastapi.responses import Response
 from datetime import datetime, timedelta
 from collections import defaultdict
-from typing import Optional, List
+from typing import Awaitable, Callable, Optional, List
+import asyncio
 import httpx
 import logging
 
-from database import get_playback_db, get_count_expr, local_date
-from services.emby import emby_service
+from database import get_playback_db, get_count_expr, date_range_conditions
+from config import settings
+from services.server_registry import get_emby_service
+from services.image_cache import CachedImage, image_cache_service, etag_matches
+from services.response_cache import cached_call, cached_response
+from services.multi_server import (
+    ALL_SERVERS,
+    fan_out,
+    is_all_servers,
+    is_partial,
+    namespaced_item_id,
+    split_item_ids,
+    split_user_filter,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -29,23 +42,9 @@ def build_filter_conditions(
     playback_methods: Optional[List[str]] = None,
 ) -> tuple[str, list]:
     """构建通用的筛选条件"""
-    conditions = []
-    params = []
-    date_col = local_date("DateCreated")
-
-    if start_date and end_date:
-        conditions.append(f"{date_col} >= date(?) AND {date_col} <= date(?)")
-        params.extend([start_date, end_date])
-    elif start_date:
-        conditions.append(f"{date_col} >= date(?)")
-        params.append(start_date)
-    elif end_date:
-        conditions.append(f"{date_col} <= date(?)")
-        params.append(end_date)
-    elif days:
-        since_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
-        conditions.append(f"{date_col} >= date(?)")
-        params.append(since_date)
+    if not (start_date or end_date) and days:
+        start_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+    conditions, params = date_range_conditions(start_date, end_date)
 
     if users and len(users) > 0:
         placeholders = ",".join(["?" for _ in users])
@@ -77,6 +76,7 @@ def build_filter_conditions(
 
 
 @router.get("/top-content")
+@cached_response
 async def get_top_content(
     days: int = Query(default=30, ge=1, le=365),
     limit: int = Query(default=10, ge=1, le=50),
@@ -87,28 +87,34 @@ async def get_top_content(
     clients: Optional[str] = Query(default=None),
     devices: Optional[str] = Query(default=None),
     playback_methods: Optional[str] = Query(default=None),
+    lazy: bool = Query(default=False, description="立即返回，不等待 Emby 项目信息（简介通过 /api/items/enrich 补全）"),
     server_id: Optional[str] = Query(default=None),
 ):
     """获取热门内容排行（剧集按剧名聚合，电影等按ItemId）"""
-    user_list = [u.strip() for u in users.split(",")] if users else None
-    client_list = [c.strip() for c in clients.split(",")] if clients else None
-    device_list = [d.strip() for d in devices.split(",")] if devices else None
-    method_list = [m.strip() for m in playback_methods.split(",")] if playback_methods else None
-    type_list = [item_type] if item_type else None
-
-    where_clause, params = build_filter_conditions(
+    filters = dict(
         days=days if not (start_date or end_date) else None,
         start_date=start_date,
         end_date=end_date,
-        users=user_list,
-        clients=client_list,
-        devices=device_list,
-        item_types=type_list,
-        playback_methods=method_list,
+        users=[u.strip() for u in users.split(",")] if users else None,
+        clients=[c.strip() for c in clients.split(",")] if clients else None,
+        devices=[d.strip() for d in devices.split(",")] if devices else None,
+        item_types=[item_type] if item_type else None,
+        playback_methods=[m.strip() for m in playback_methods.split(",")] if playback_methods else None,
     )
 
+    if is_all_servers(server_id):
+        return await _all_servers_ranking("top_content", _content_groups, _format_top_content, filters, limit, lazy)
+
+    groups = await _content_groups(server_id, filters)
+    return {"top_content": await _format_top_content(groups, limit, lazy)}
+
+
+async def _content_groups(server_id: Optional[str], filters: dict) -> dict:
+    """单个服务器按剧名/内容聚合的播放次数和时长（剧集按剧名，其他类型用完整名称）"""
+    where_clause, params = build_filter_conditions(**filters)
     count_expr = get_count_expr()
 
+    content_map = {}
     async with get_playback_db(server_id) as db:
         query = f"""
             SELECT
@@ -123,21 +129,10 @@ async def get_top_content(
         """
 
         async with db.execute(query, params) as cursor:
-            # 按剧名/内容聚合
-            content_map = defaultdict(lambda: {
-                "play_count": 0,
-                "duration": 0,
-                "item_id": None,
-                "item_type": None,
-                "full_name": None
-            })
-
             async for row in cursor:
                 item_id = row[0]
                 item_name = row[1] or "Unknown"
                 item_type_val = row[2]
-                play_count = int(row[3] or 0)
-                duration = row[4]
 
                 # 对于剧集，提取剧名作为聚合key；其他类型用完整名称
                 if item_type_val == "Episode" and " - " in item_name:
@@ -145,61 +140,76 @@ async def get_top_content(
                 else:
                     key = item_name
 
-                content_map[key]["play_count"] += play_count
-                content_map[key]["duration"] += duration
-
-                # 保存一个item_id用于获取海报
-                if not content_map[key]["item_id"]:
-                    content_map[key]["item_id"] = item_id
-                    content_map[key]["item_type"] = item_type_val
-                    content_map[key]["full_name"] = item_name
-
-        # 排序并限制数量
-        sorted_content = sorted(
-            content_map.items(),
-            key=lambda x: x[1]["play_count"],
-            reverse=True
-        )[:limit]
-
-        data = []
-        for name, info in sorted_content:
-            item_id = info["item_id"]
-            item_type_val = info["item_type"]
-
-            # 获取海报 URL 和剧集介绍
-            item_info = await emby_service.get_item_info(str(item_id))
-            poster_url = emby_service.get_poster_url(str(item_id), item_type_val, item_info)
-            backdrop_url = emby_service.get_backdrop_url(str(item_id), item_type_val, item_info)
-
-            # 获取 overview（剧集介绍）
-            overview = item_info.get("Overview", "") if item_info else ""
-            # 如果是单集，尝试获取剧集总介绍
-            if item_type_val == "Episode" and item_info:
-                series_id = item_info.get("SeriesId")
-                if series_id:
-                    series_info = await emby_service.get_item_info(series_id)
-                    if series_info:
-                        overview = series_info.get("Overview", overview)
-                        # 也尝试从剧集获取 backdrop
-                        if not backdrop_url and series_info.get("BackdropImageTags"):
-                            backdrop_url = f"/api/backdrop/{series_id}"
-
-            data.append({
-                "item_id": item_id,
-                "name": info["full_name"] or name,
-                "show_name": name,
-                "type": item_type_val,
-                "play_count": info["play_count"],
-                "duration_hours": round(info["duration"] / 3600, 2),
-                "poster_url": poster_url,
-                "backdrop_url": backdrop_url,
-                "overview": overview
-            })
-
-    return {"top_content": data}
+                # 保存第一个item_id用于获取海报
+                content = content_map.setdefault(key, {
+                    "play_count": 0,
+                    "duration": 0,
+                    "item_id": item_id,
+                    "item_type": item_type_val,
+                    "full_name": item_name,
+                    "server_id": server_id,
+                })
+                content["play_count"] += int(row[3] or 0)
+                content["duration"] += row[4]
+
+    return content_map
+
+
+async def _format_top_content(content_map: dict, limit: int, lazy: bool, namespaced: bool = False) -> list:
+    """排序取前 limit 项并补充海报和简介，namespaced 为 True 时项目 ID 带服务器前缀"""
+    sorted_content = sorted(content_map.items(), key=lambda x: x[1]["play_count"], reverse=True)[:limit]
+
+    # 批量获取海报和剧集信息（lazy 模式跳过）
+    infos_by_server = {} if lazy else await _items_info_by_server([info for _, info in sorted_content])
+
+    data = []
+    for name, info in sorted_content:
+        emby = get_emby_service(info["server_id"])
+        item_infos = infos_by_server.get(info["server_id"], {})
+        item_id = info["item_id"]
+        item_type_val = info["item_type"]
+
+        # 获取海报 URL 和剧集介绍
+        item_info = item_infos.get(str(item_id), {})
+        if lazy:
+            # 图片地址不依赖项目信息，单集由图片代理解析为所属剧集
+            is_episode = item_type_val == "Episode"
+            poster_url = emby.image_url("poster", str(item_id), series=is_episode)
+            backdrop_url = emby.image_url("backdrop", str(item_id), series=is_episode)
+        else:
+            poster_url = emby.get_poster_url(str(item_id), item_type_val, item_info)
+            backdrop_url = emby.get_backdrop_url(str(item_id), item_type_val, item_info)
+
+        # 获取 overview（剧集介绍）
+        overview = item_info.get("Overview", "") if item_info else ""
+        # 如果是单集，尝试获取剧集总介绍
+        if item_type_val == "Episode" and item_info:
+            series_id = item_info.get("SeriesId")
+            if series_id:
+                series_info = item_infos.get(series_id)
+                if series_info:
+                    overview = series_info.get("Overview", overview)
+                    # 也尝试从剧集获取 backdrop
+                    if not backdrop_url and series_info.get("BackdropImageTags"):
+                        backdrop_url = emby.image_url("backdrop", series_id)
+
+        data.append({
+            "item_id": namespaced_item_id(info["server_id"], item_id) if namespaced else item_id,
+            "name": info["full_name"] or name,
+            "show_name": name,
+            "type": item_type_val,
+            "play_count": info["play_count"],
+            "duration_hours": round(info["duration"] / 3600, 2),
+            "poster_url": poster_url,
+            "backdrop_url": backdrop_url,
+            "overview": overview
+        })
+
+    return data
 
 
 @router.get("/top-shows")
+@cached_response
 async def get_top_shows(
     days: int = Query(default=30, ge=1, le=365),
     limit: int = Query(default=10, ge=1, le=50),
@@ -209,27 +219,34 @@ async def get_top_shows(
     clients: Optional[str] = Query(default=None),
     devices: Optional[str] = Query(default=None),
     playback_methods: Optional[str] = Query(default=None),
+    lazy: bool = Query(default=False, description="立即返回，不等待 Emby 项目信息（简介通过 /api/items/enrich 补全）"),
     server_id: Optional[str] = Query(default=None),
 ):
     """获取热门剧集（按剧名聚合）"""
-    user_list = [u.strip() for u in users.split(",")] if users else None
-    client_list = [c.strip() for c in clients.split(",")] if clients else None
-    device_list = [d.strip() for d in devices.split(",")] if devices else None
-    method_list = [m.strip() for m in playback_methods.split(",")] if playback_methods else None
-
-    where_clause, params = build_filter_conditions(
+    filters = dict(
         days=days if not (start_date or end_date) else None,
         start_date=start_date,
         end_date=end_date,
-        users=user_list,
-        clients=client_list,
-        devices=device_list,
+        users=[u.strip() for u in users.split(",")] if users else None,
+        clients=[c.strip() for c in clients.split(",")] if clients else None,
+        devices=[d.strip() for d in devices.split(",")] if devices else None,
         item_types=["Episode"],  # 只查剧集
-        playback_methods=method_list,
+        playback_methods=[m.strip() for m in playback_methods.split(",")] if playback_methods else None,
     )
 
+    if is_all_servers(server_id):
+        return await _all_servers_ranking("top_shows", _show_groups, _format_top_shows, filters, limit, lazy)
+
+    groups = await _show_groups(server_id, filters)
+    return {"top_shows": await _format_top_shows(groups, limit, lazy)}
+
+
+async def _show_groups(server_id: Optional[str], filters: dict) -> dict:
+    """单个服务器按剧名聚合的播放次数、时长和播放过的单集"""
+    where_clause, params = build_filter_conditions(**filters)
     count_expr = get_count_expr()
 
+    shows = {}
     async with get_playback_db(server_id) as db:
         async with db.execute(f"""
             SELECT
@@ -242,46 +259,58 @@ async def get_top_shows(
             WHERE {where_clause}
             GROUP BY ItemId
         """, params) as cursor:
-            shows = defaultdict(lambda: {
-                "play_count": 0,
-                "duration": 0,
-                "episodes": set(),
-                "series_id": None,
-                "item_id": None
-            })
             async for row in cursor:
                 item_id = row[0]
                 item_name = row[1] or "Unknown"
                 show_name = item_name.split(" - ")[0] if " - " in item_name else item_name
-                shows[show_name]["play_count"] += int(row[3] or 0)
-                shows[show_name]["duration"] += row[4]
-                shows[show_name]["episodes"].add(item_name)
-                # 保存一个 item_id 用于获取 series_id
-                if not shows[show_name]["item_id"]:
-                    shows[show_name]["item_id"] = item_id
-
-    # 排序并限制数量
+                # 保存第一个 item_id 用于获取 series_id
+                show = shows.setdefault(show_name, {
+                    "play_count": 0,
+                    "duration": 0,
+                    "episodes": set(),
+                    "item_id": item_id,
+                    "server_id": server_id,
+                })
+                show["play_count"] += int(row[3] or 0)
+                show["duration"] += row[4]
+                show["episodes"].add(item_name)
+
+    return shows
+
+
+async def _format_top_shows(shows: dict, limit: int, lazy: bool, namespaced: bool = False) -> list:
+    """排序取前 limit 部剧集并补充海报和简介，namespaced 为 True 时项目 ID 带服务器前缀"""
     sorted_shows = sorted(shows.items(), key=lambda x: x[1]["play_count"], reverse=True)[:limit]
 
+    # 批量获取单集及其剧集信息（lazy 模式跳过）
+    infos_by_server = {} if lazy else await _items_info_by_server([data for _, data in sorted_shows])
+
     result = []
     for show_name, data in sorted_shows:
+        emby = get_emby_service(data["server_id"])
         # 获取海报和剧集介绍
         poster_url = None
         backdrop_url = None
         overview = ""
-        if data["item_id"]:
-            info = await emby_service.get_item_info(str(data["item_id"]))
+        if lazy and data["item_id"]:
+            poster_url = emby.image_url("poster", str(data["item_id"]), series=True)
+            backdrop_url = emby.image_url("backdrop", str(data["item_id"]), series=True)
+        elif data["item_id"]:
+            item_infos = infos_by_server.get(data["server_id"], {})
+            info = item_infos.get(str(data["item_id"]))
             if info and info.get("SeriesId"):
                 series_id = info["SeriesId"]
-                poster_url = f"/api/poster/{series_id}"
+                poster_url = emby.image_url("poster", series_id)
                 # 获取剧集总介绍
-                series_info = await emby_service.get_item_info(series_id)
+                series_info = item_infos.get(series_id)
                 if series_info:
                     overview = series_info.get("Overview", "")
                     if series_info.get("BackdropImageTags"):
-                        backdrop_url = f"/api/backdrop/{series_id}"
+                        backdrop_url = emby.image_url("backdrop", series_id)
 
+        item_id = data["item_id"]
         result.append({
+            "item_id": namespaced_item_id(data["server_id"], item_id) if namespaced and item_id else item_id,
             "show_name": show_name,
             "play_count": data["play_count"],
             "duration_hours": round(data["duration"] / 3600, 2),
@@ -291,39 +320,168 @@ async def get_top_shows(
             "overview": overview
         })
 
-    return {"top_shows": result}
+    return result
+
+
+async def _items_info_by_server(groups: list[dict]) -> dict:
+    """按所属服务器批量获取分组代表项目的信息 {server_id: {item_id: info}}"""
+    item_ids = defaultdict(list)
+    for group in groups:
+        if group["item_id"]:
+            item_ids[group["server_id"]].append(str(group["item_id"]))
+    server_ids = list(item_ids)
+    infos = await asyncio.gather(
+        *(get_emby_service(server_id).get_items_info(item_ids[server_id]) for server_id in server_ids)
+    )
+    return dict(zip(server_ids, infos))
+
+
+def _merge_server_groups(results: dict) -> dict:
+    """合并各服务器的排行分组：同名分组的次数和时长相加，单集取并集，
+    海报和简介取自该分组播放次数最多的服务器"""
+    by_key = defaultdict(list)
+    for groups in results.values():
+        for key, group in groups.items():
+            by_key[key].append(group)
+
+    merged = {}
+    for key, groups in by_key.items():
+        merged[key] = {
+            **max(groups, key=lambda g: g["play_count"]),
+            "play_count": sum(g["play_count"] for g in groups),
+            "duration": sum(g["duration"] for g in groups),
+        }
+        if "episodes" in merged[key]:
+            merged[key]["episodes"] = set().union(*(g["episodes"] for g in groups))
+    return merged
+
+
+async def _all_servers_ranking(
+    name: str,
+    group_func: Callable[[Optional[str], dict], Awaitable[dict]],
+    format_func: Callable[..., Awaitable[list]],
+    filters: dict,
+    limit: int,
+    lazy: bool,
+) -> dict:
+    """并发查询全部服务器的排行分组，合并后再取前 limit 项
+
+    项目 ID 带服务器前缀，图片地址带所属服务器的 server_id。
+    """
+    async def compute():
+        async def query(server_id: Optional[str]):
+            users, needed = split_user_filter(filters["users"], server_id)
+            if not needed:
+                return None
+            return await group_func(server_id, {**filters, "users": users})
+
+        results, statuses = await fan_out(query)
+        rows = await format_func(_merge_server_groups(results), limit, lazy, namespaced=True)
+        return {name: rows, "servers": statuses, "partial": is_partial(statuses)}
+
+    return await cached_call([f"all_servers_{name}", filters, limit, lazy], ALL_SERVERS, compute)
+
+
+def _image_response(request: Request, image: Optional[CachedImage]) -> Response:
+    """构造图片响应，支持 ETag / If-None-Match 条件请求"""
+    if image is None:
+        return Response(content=b"", media_type="image/jpeg")
+
+    headers = {
+        "ETag": image.etag,
+        "Cache-Control": f"public, max-age={settings.IMAGE_CACHE_MAX_AGE}",
+    }
+    if settings.IMAGE_CACHE_TRANSCODE:
+        headers["Vary"] = "Accept"
+    if etag_matches(request.headers.get("if-none-match"), image.etag):
+        image_cache_service.not_modified += 1
+        return Response(status_code=304, headers=headers)
+    return Response(content=image.content, media_type=image.content_type, headers=headers)
 
 
 @router.get("/poster/{item_id}")
 async def get_poster(
+    request: Request,
     item_id: str,
     maxHeight: int = Query(default=300),
-    maxWidth: int = Query(default=200)
+    maxWidth: int = Query(default=200),
+    series: bool = Query(default=False, description="单集时使用所属剧集的海报"),
+    server_id: Optional[str] = Query(default=None),
 ):
-    """代理获取 Emby 海报图片"""
-    content, content_type = await emby_service.get_poster(item_id, maxHeight, maxWidth)
-
-    return StreamingResponse(
-        iter([content]),
-        media_type=content_type,
-        headers={"Cache-Control": "public, max-age=86400"} if content else {}
+    """代理获取 Emby 海报图片（带磁盘缓存）"""
+    if series:
+        item_id = await get_emby_service(server_id).resolve_image_item(item_id)
+    image = await image_cache_service.get_image(
+        item_id, "Primary", maxWidth, maxHeight, request.headers.get("accept", ""), server_id
     )
+    return _image_response(request, image)
 
 
 @router.get("/backdrop/{item_id}")
 async def get_backdrop(
+    request: Request,
     item_id: str,
     maxHeight: int = Query(default=720),
-    maxWidth: int = Query(default=1280)
+    maxWidth: int = Query(default=1280),
+    series: bool = Query(default=False, description="单集时使用所属剧集的背景图"),
+    server_id: Optional[str] = Query(default=None),
 ):
-    """代理获取 Emby 背景图(横版)"""
-    content, content_type = await emby_service.get_backdrop(item_id, maxHeight, maxWidth)
-
-    return StreamingResponse(
-        iter([content]),
-        media_type=content_type,
-        headers={"Cache-Control": "public, max-age=86400"} if content else {}
+    """代理获取 Emby 背景图(横版)（带磁盘缓存）"""
+    if series:
+        item_id = await get_emby_service(server_id).resolve_image_item(item_id)
+    image = await image_cache_service.get_image(
+        item_id, "Backdrop", maxWidth, maxHeight, request.headers.get("accept", ""), server_id
     )
+    return _image_response(request, image)
+
+
+@router.get("/items/enrich")
+async def enrich_items(
+    ids: str = Query(..., description="项目ID列表，逗号分隔，最多 200 个"),
+    server_id: Optional[str] = Query(default=None),
+):
+    """批量获取项目的简介和图片信息
+
+    配合 recent / top-content / top-shows 的 lazy 模式使用：列表先展示，再用一次请求
+    补全简介、所属剧集和准确的海报 / 背景图地址。获取不到信息的项目不在结果中。
+    server_id 为 all 时项目 ID 使用排行返回的带服务器前缀的形式。
+    """
+    item_ids = list(dict.fromkeys(i.strip() for i in ids.split(",") if i.strip()))[:200]
+
+    if is_all_servers(server_id):
+        # 汇总模式下的项目 ID 带服务器前缀，按服务器分别补全
+        grouped = split_item_ids(item_ids)
+        results = await asyncio.gather(*(_enrich_server_items(sid, grouped[sid]) for sid in grouped))
+        items = {}
+        for sid, server_items in zip(grouped, results):
+            items.update({namespaced_item_id(sid, item_id): info for item_id, info in server_items.items()})
+        return {"items": items}
+
+    return {"items": await _enrich_server_items(server_id, item_ids)}
+
+
+async def _enrich_server_items(server_id: Optional[str], item_ids: list[str]) -> dict:
+    """获取单个服务器上项目的简介和图片信息"""
+    emby = get_emby_service(server_id)
+    item_infos = await emby.get_items_info(item_ids)
+
+    items = {}
+    for item_id in item_ids:
+        info = item_infos.get(item_id)
+        if not info:
+            continue
+        series_id = info.get("SeriesId")
+        series_info = item_infos.get(series_id, {}) if series_id else {}
+        item_type = "Episode" if series_id else info.get("Type")
+        items[item_id] = {
+            "overview": info.get("Overview", ""),
+            "series_id": series_id,
+            "series_name": info.get("SeriesName"),
+            "series_overview": series_info.get("Overview", ""),
+            "poster_url": emby.get_poster_url(item_id, item_type, info),
+            "backdrop_url": emby.get_backdrop_url(item_id, item_type, info),
+        }
+    return items
 
 
 @router.get("/favorites")
@@ -343,16 +501,19 @@ async def get_favorites(
     
     注意：此接口从 Emby API 获取收藏数据，不依赖数据库 IsFavorite 字段
     """
+    if is_all_servers(server_id):
+        raise HTTPException(status_code=400, detail="收藏统计不支持全部服务器汇总，请指定服务器")
+    emby = get_emby_service(server_id)
     try:
         # 从 Emby API 获取所有用户
-        api_key = await emby_service.get_api_key()
+        api_key = await emby.get_api_key()
         if not api_key:
             raise HTTPException(status_code=500, detail="无法获取 Emby API Key")
         
         async with httpx.AsyncClient() as client:
             # 获取所有用户列表
             users_resp = await client.get(
-                f"{emby_service._emby_url}/emby/Users",
+                f"{emby.emby_url}/emby/Users",
                 params={"api_key": api_key},
                 timeout=10
             )
@@ -373,7 +534,7 @@ async def get_favorites(
                 
                 # 获取用户的收藏项目
                 favorites_resp = await client.get(
-                    f"{emby_service._emby_url}/emby/Users/{user_id}/Items",
+                    f"{emby.emby_url}/emby/Users/{user_id}/Items",
                     params={
                         "api_key": api_key,
                         "Filters": "IsFavorite",
@@ -459,14 +620,14 @@ async def get_favorites(
             
             # 为每个项目获取海报信息
             for item in ranking_list:
-                poster_info = await emby_service.get_item_images(item["item_id"])
+                poster_info = await emby.get_item_images(item["item_id"])
                 item["poster_url"] = poster_info.get("poster_url")
                 item["backdrop_url"] = poster_info.get("backdrop_url")
                 item["overview"] = poster_info.get("overview")
             
             for user in user_list:
                 for fav in user["favorites"]:
-                    poster_info = await emby_service.get_item_images(fav["item_id"])
+                    poster_info = await emby.get_item_images(fav["item_id"])
                     fav["poster_url"] = poster_info.get("poster_url")
                     fav["backdrop_url"] = poster_info.get("backdrop_url")
                     fav["overview"] = poster_info.get("overview")
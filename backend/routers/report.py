@@ -79,7 +79,6 @@ async def send_report_image(
         
         # 根据配置的渠道发送
         channels = report_config.get("channels", {"telegram": True})
-        sent_count = 0
         
         title_map = {
             "daily": "📊 每日观影报告",
@@ -88,44 +87,9 @@ async def send_report_image(
         }
         caption = title_map.get(type, "📊 观影报告")
         
-        if channels.get("telegram") and tg_config.get("bot_token"):
-            try:
-                notification_service._send_telegram_photo_file_direct(
-                    tg_config.get("bot_token"),
-                    tg_config.get("admins", []) + tg_config.get("users", []),
-                    image_bytes,
-                    caption
-                )
-                sent_count += 1
-                logger.info("报告图片已通过 Telegram 发送")
-            except Exception as e:
-                logger.error(f"Telegram 发送失败: {e}")
-        
-        if channels.get("wecom") and wecom_config.get("corp_id"):
-            try:
-                if notification_service._send_wecom_photo_bytes(image_bytes, caption):
-                    sent_count += 1
-                    logger.info("报告图片已通过企业微信发送")
-            except Exception as e:
-                logger.error(f"企业微信发送失败: {e}")
-        
-        if channels.get("discord") and discord_config.get("webhook_url"):
-            try:
-                if notification_service._send_discord_photo_bytes(image_bytes, caption):
-                    sent_count += 1
-                    logger.info("报告图片已通过 Discord 发送")
-            except Exception as e:
-                logger.error(f"Discord 发送失败: {e}")
-        
-        if channels.get("onebot") and onebot_config.get("http_url"):
-            try:
-                if notification_service._send_onebot_photo_bytes(image_bytes, caption):
-                    sent_count += 1
-                    logger.info("报告图片已通过 OneBot 发送")
-            except Exception as e:
-                logger.error(f"OneBot 发送失败: {e}")
+        # 各渠道并发发送，单个渠道超时不影响其他渠道
+        sent_count = await notification_service.send_photo_all(image_bytes, caption, channels)
 
-        
         if sent_count == 0:
             raise HTTPException(status_code=400, detail="没有可用的推送渠道或发送失败")
         
@@ -2,19 +2,38 @@
 统计相关路由模块
 处理所有统计数据的 API 端点
 """
-from fastapi import APIRouter, Query
+import base64
+import json
+import sqlite3
+from fastapi import APIRouter, HTTPException, Query
 from datetime import datetime, timedelta
 from typing import Optional, List
 
+from config import settings
 from database import (
     get_playback_db,
     get_count_expr,
     get_duration_filter,
     local_datetime,
-    local_date
+    local_date,
+    date_range_conditions
 )
 from services.users import user_service
-from services.emby import emby_service
+from services.server_registry import get_emby_service
+from services.rollup import rollup_service
+from services.search_index import search_index_service
+from services.response_cache import cached_call, cached_response, response_cache
+from services.multi_server import (
+    ALL_SERVERS,
+    fan_out,
+    is_all_servers,
+    is_partial,
+    list_servers,
+    namespaced_item_id,
+    namespaced_user_id,
+    namespaced_username,
+    split_user_filter,
+)
 from name_mappings import name_mapping_service
 
 router = APIRouter(prefix="/api", tags=["stats"])
@@ -30,29 +49,19 @@ def build_filter_conditions(
     item_types: Optional[List[str]] = None,
     playback_methods: Optional[List[str]] = None,
     search: Optional[str] = None,
+    search_matches: Optional[tuple[list[int], int]] = None,
 ) -> tuple[str, list]:
     """
     构建通用的筛选条件
     返回 (WHERE 子句部分, 参数列表)
-    """
-    conditions = []
-    params = []
-    date_col = local_date("DateCreated")
 
-    # 日期范围筛选
-    if start_date and end_date:
-        conditions.append(f"{date_col} >= date(?) AND {date_col} <= date(?)")
-        params.extend([start_date, end_date])
-    elif start_date:
-        conditions.append(f"{date_col} >= date(?)")
-        params.append(start_date)
-    elif end_date:
-        conditions.append(f"{date_col} <= date(?)")
-        params.append(end_date)
-    elif days:
-        since_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
-        conditions.append(f"{date_col} >= date(?)")
-        params.append(since_date)
+    search_matches 为 search_index_service.match() 的结果，传入时先按索引选出的
+    rowid 缩小范围，再用 LIKE 确认。
+    """
+    # 日期范围筛选（换算为 UTC 边界直接比较 DateCreated，可走索引）
+    if not (start_date or end_date) and days:
+        start_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+    conditions, params = date_range_conditions(start_date, end_date)
 
     # 用户筛选
     if users and len(users) > 0:
@@ -86,6 +95,13 @@ def build_filter_conditions(
 
     # 搜索关键词筛选
     if search and search.strip():
+        if search_matches is not None:
+            # 索引高水位之后的新记录不在索引中，按 rowid 范围逐行匹配
+            rowids, hwm = search_matches
+            conditions.append(
+                "rowid IN (SELECT value FROM json_each(?) UNION ALL SELECT rowid FROM PlaybackActivity WHERE rowid > ?)"
+            )
+            params.extend([json.dumps(rowids), hwm])
         conditions.append("ItemName LIKE ?")
         params.append(f"%{search.strip()}%")
 
@@ -93,7 +109,183 @@ def build_filter_conditions(
     return where_clause, params
 
 
+# ==================== 分页游标 ====================
+# 最近播放按 (DateCreated, rowid) 倒序分页，游标对前端是不透明的字符串
+
+def encode_cursor(date_created: str, rowid: int) -> str:
+    """把一页最后一行的 (DateCreated, rowid) 编码为游标"""
+    raw = json.dumps([date_created, rowid], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple[str, int]:
+    """解析游标，格式不正确时返回 400"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        date_created, rowid = json.loads(raw)
+        if not isinstance(date_created, str) or not isinstance(rowid, int):
+            raise ValueError
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+    return date_created, rowid
+
+
+# ==================== 结果格式化 ====================
+# 各统计接口和 /dashboard 共用，输入为 (维度..., 播放次数, 时长[, 最后播放]) 形式的行
+
+
+def format_overview(
+    total_plays: int,
+    total_duration: int,
+    unique_users: int,
+    unique_items: int,
+    by_type: dict,
+    days: int,
+) -> dict:
+    """格式化总览统计"""
+    return {
+        "total_plays": total_plays,
+        "total_duration_seconds": total_duration,
+        "total_duration_hours": round(total_duration / 3600, 2),
+        "unique_users": unique_users,
+        "unique_items": unique_items,
+        "by_type": by_type,
+        "days": days
+    }
+
+
+def format_trend(rows) -> list:
+    """格式化趋势数据，行格式 (日期, 播放次数, 时长)"""
+    data = []
+    for row in rows:
+        data.append({
+            "date": row[0],
+            "plays": int(row[1] or 0),
+            "duration_hours": round(row[2] / 3600, 2)
+        })
+    return data
+
+
+def format_users(rows, user_map: dict) -> list:
+    """格式化用户统计，行格式 (用户ID, 播放次数, 时长, 最后播放)"""
+    data = []
+    for row in rows:
+        user_id = row[0] or ""
+        username = user_service.match_username(user_id, user_map)
+
+        data.append({
+            "user_id": user_id,
+            "username": username,
+            "play_count": int(row[1] or 0),
+            "duration_hours": round(row[2] / 3600, 2),
+            "last_play": row[3]
+        })
+    return data
+
+
+def format_clients(rows) -> list:
+    """格式化客户端统计，行格式 (客户端, 播放次数, 时长)，映射后同名的客户端合并"""
+    # 使用字典合并同名映射后的客户端
+    merged_data = {}
+    for row in rows:
+        original_name = row[0] or "Unknown"
+        mapped_name = name_mapping_service.map_client_name(original_name)
+        play_count = int(row[1] or 0)
+        duration = row[2]
+
+        if mapped_name in merged_data:
+            merged_data[mapped_name]["play_count"] += play_count
+            merged_data[mapped_name]["duration"] += duration
+        else:
+            merged_data[mapped_name] = {
+                "play_count": play_count,
+                "duration": duration
+            }
+
+    # 转换为列表并按播放次数排序
+    data = [
+        {
+            "client": name,
+            "play_count": info["play_count"],
+            "duration_hours": round(info["duration"] / 3600, 2)
+        }
+        for name, info in sorted(
+            merged_data.items(),
+            key=lambda x: x[1]["play_count"],
+            reverse=True
+        )
+    ]
+
+    return data
+
+
+def format_devices(rows) -> list:
+    """格式化设备统计，行格式 (设备, 客户端, 播放次数, 时长)，同一设备取第一行的客户端"""
+    # 使用字典合并同名映射后的设备
+    merged_data = {}
+    for row in rows:
+        original_device = row[0] or "Unknown"
+        original_client = row[1] or "Unknown"
+        mapped_device = name_mapping_service.map_device_name(original_device)
+        mapped_client = name_mapping_service.map_client_name(original_client)
+        play_count = int(row[2] or 0)
+        duration = row[3]
+
+        # 使用设备名作为 key 进行合并
+        if mapped_device in merged_data:
+            merged_data[mapped_device]["play_count"] += play_count
+            merged_data[mapped_device]["duration"] += duration
+        else:
+            merged_data[mapped_device] = {
+                "client": mapped_client,
+                "play_count": play_count,
+                "duration": duration
+            }
+
+    # 转换为列表并按播放次数排序
+    data = [
+        {
+            "device": name,
+            "client": info["client"],
+            "play_count": info["play_count"],
+            "duration_hours": round(info["duration"] / 3600, 2)
+        }
+        for name, info in sorted(
+            merged_data.items(),
+            key=lambda x: x[1]["play_count"],
+            reverse=True
+        )
+    ]
+
+    return data
+
+
+def format_playback_methods(rows) -> list:
+    """格式化播放方式统计，行格式 (播放方式, 播放次数, 时长)"""
+    data = []
+    for row in rows:
+        data.append({
+            "method": row[0] or "Unknown",
+            "play_count": int(row[1] or 0),
+            "duration_hours": round(row[2] / 3600, 2)
+        })
+    return data
+
+
+def format_hourly(rows) -> list:
+    """格式化热力图数据，行格式 (星期, 小时, 播放次数)"""
+    data = []
+    for row in rows:
+        data.append({
+            "day": int(row[0]),  # 0=Sunday, 1=Monday, ...
+            "hour": int(row[1]),
+            "count": int(row[2] or 0)
+        })
+    return data
+
+
 @router.get("/overview")
+@cached_response
 async def get_overview(
     days: int = Query(default=30, ge=1, le=365),
     start_date: Optional[str] = Query(default=None, description="开始日期 YYYY-MM-DD"),
@@ -106,8 +298,6 @@ async def get_overview(
     server_id: Optional[str] = Query(default=None, description="服务器ID"),
 ):
     """获取总览统计"""
-    user_map = await user_service.get_user_map()
-
     # 解析逗号分隔的列表参数
     user_list = [u.strip() for u in users.split(",")] if users else None
     client_list = [c.strip() for c in clients.split(",")] if clients else None
@@ -115,7 +305,7 @@ async def get_overview(
     type_list = [t.strip() for t in item_types.split(",")] if item_types else None
     method_list = [m.strip() for m in playback_methods.split(",")] if playback_methods else None
 
-    where_clause, params = build_filter_conditions(
+    filters = dict(
         days=days if not (start_date or end_date) else None,
         start_date=start_date,
         end_date=end_date,
@@ -125,49 +315,69 @@ async def get_overview(
         item_types=type_list,
         playback_methods=method_list,
     )
+    where_clause, params = build_filter_conditions(**filters)
+
+    if is_all_servers(server_id):
+        dashboard = await _all_servers_dashboard(filters, days)
+        return {**dashboard["overview"], "servers": dashboard["servers"], "partial": dashboard["partial"]}
+
+    rows = await rollup_service.aggregate(server_id, ["UserId", "ItemType"], filters)
 
     async with get_playback_db(server_id) as db:
         count_expr = get_count_expr()
 
-        # 总播放次数（只计满足时长的）和时长（统计所有）
-        async with db.execute(f"""
-            SELECT
-                {count_expr} as total_plays,
-                COALESCE(SUM(PlayDuration), 0) as total_duration,
-                COUNT(DISTINCT UserId) as unique_users,
-                COUNT(DISTINCT ItemId) as unique_items
-            FROM PlaybackActivity
-            WHERE {where_clause}
-        """, params) as cursor:
-            row = await cursor.fetchone()
-            total_plays = int(row[0] or 0)
-            total_duration = row[1]
-            unique_users = row[2]
-            unique_items = row[3]
-
-        # 按类型统计
-        async with db.execute(f"""
-            SELECT ItemType, {count_expr} as count, COALESCE(SUM(PlayDuration), 0) as duration
-            FROM PlaybackActivity
-            WHERE {where_clause}
-            GROUP BY ItemType
-        """, params) as cursor:
+        if rows is not None:
+            # 汇总库可用：次数、时长、用户数和类型分布直接由汇总结果计算
+            total_plays = sum(row[2] for row in rows)
+            total_duration = sum(row[3] for row in rows)
+            # 汇总库用 '' 表示 UserId 为 NULL，与 COUNT(DISTINCT UserId) 一致不计入用户数
+            unique_users = len({row[0] for row in rows if row[0]})
             by_type = {}
-            async for row in cursor:
-                by_type[row[0] or "Unknown"] = {"count": int(row[1] or 0), "duration": row[2]}
-
-    return {
-        "total_plays": total_plays,
-        "total_duration_seconds": total_duration,
-        "total_duration_hours": round(total_duration / 3600, 2),
-        "unique_users": unique_users,
-        "unique_items": unique_items,
-        "by_type": by_type,
-        "days": days
-    }
+            for row in sorted(rows, key=lambda r: r[1]):
+                entry = by_type.setdefault(row[1] or "Unknown", {"count": 0, "duration": 0})
+                entry["count"] += row[2]
+                entry["duration"] += row[3]
+
+            # 内容数无法从汇总库得出，仍查询原表
+            async with db.execute(f"""
+                SELECT COUNT(DISTINCT ItemId)
+                FROM PlaybackActivity
+                WHERE {where_clause}
+            """, params) as cursor:
+                unique_items = (await cursor.fetchone())[0]
+        else:
+            # 总播放次数（只计满足时长的）和时长（统计所有）
+            async with db.execute(f"""
+                SELECT
+                    {count_expr} as total_plays,
+                    COALESCE(SUM(PlayDuration), 0) as total_duration,
+                    COUNT(DISTINCT UserId) as unique_users,
+                    COUNT(DISTINCT ItemId) as unique_items
+                FROM PlaybackActivity
+                WHERE {where_clause}
+            """, params) as cursor:
+                row = await cursor.fetchone()
+                total_plays = int(row[0] or 0)
+                total_duration = row[1]
+                unique_users = row[2]
+                unique_items = row[3]
+
+            # 按类型统计
+            async with db.execute(f"""
+                SELECT ItemType, {count_expr} as count, COALESCE(SUM(PlayDuration), 0) as duration
+                FROM PlaybackActivity
+                WHERE {where_clause}
+                GROUP BY ItemType
+            """, params) as cursor:
+                by_type = {}
+                async for row in cursor:
+                    by_type[row[0] or "Unknown"] = {"count": int(row[1] or 0), "duration": row[2]}
+
+    return format_overview(total_plays, total_duration, unique_users, unique_items, by_type, days)
 
 
 @router.get("/trend")
+@cached_response
 async def get_trend(
     days: int = Query(default=30, ge=1, le=365),
     start_date: Optional[str] = Query(default=None),
@@ -186,7 +396,7 @@ async def get_trend(
     type_list = [t.strip() for t in item_types.split(",")] if item_types else None
     method_list = [m.strip() for m in playback_methods.split(",")] if playback_methods else None
 
-    where_clause, params = build_filter_conditions(
+    filters = dict(
         days=days if not (start_date or end_date) else None,
         start_date=start_date,
         end_date=end_date,
@@ -196,33 +406,36 @@ async def get_trend(
         item_types=type_list,
         playback_methods=method_list,
     )
+    where_clause, params = build_filter_conditions(**filters)
+
+    if is_all_servers(server_id):
+        return _dashboard_part(await _all_servers_dashboard(filters, days), "trend")
 
     count_expr = get_count_expr()
     date_col = local_date("DateCreated")
 
-    async with get_playback_db(server_id) as db:
-        async with db.execute(f"""
-            SELECT
-                {date_col} as play_date,
-                {count_expr} as plays,
-                COALESCE(SUM(PlayDuration), 0) as duration
-            FROM PlaybackActivity
-            WHERE {where_clause}
-            GROUP BY {date_col}
-            ORDER BY play_date
-        """, params) as cursor:
-            data = []
-            async for row in cursor:
-                data.append({
-                    "date": row[0],
-                    "plays": int(row[1] or 0),
-                    "duration_hours": round(row[2] / 3600, 2)
-                })
-
-    return {"trend": data}
+    rows = await rollup_service.aggregate(server_id, ["date"], filters)
+    if rows is not None:
+        rows.sort(key=lambda r: r[0])
+    else:
+        async with get_playback_db(server_id) as db:
+            async with db.execute(f"""
+                SELECT
+                    {date_col} as play_date,
+                    {count_expr} as plays,
+                    COALESCE(SUM(PlayDuration), 0) as duration
+                FROM PlaybackActivity
+                WHERE {where_clause}
+                GROUP BY {date_col}
+                ORDER BY play_date
+            """, params) as cursor:
+                rows = await cursor.fetchall()
+
+    return {"trend": format_trend(rows)}
 
 
 @router.get("/users")
+@cached_response
 async def get_user_stats(
     days: int = Query(default=30, ge=1, le=365),
     start_date: Optional[str] = Query(default=None),
@@ -235,15 +448,13 @@ async def get_user_stats(
     server_id: Optional[str] = Query(default=None),
 ):
     """获取用户统计"""
-    user_map = await user_service.get_user_map()
-
     user_list = [u.strip() for u in users.split(",")] if users else None
     client_list = [c.strip() for c in clients.split(",")] if clients else None
     device_list = [d.strip() for d in devices.split(",")] if devices else None
     type_list = [t.strip() for t in item_types.split(",")] if item_types else None
     method_list = [m.strip() for m in playback_methods.split(",")] if playback_methods else None
 
-    where_clause, params = build_filter_conditions(
+    filters = dict(
         days=days if not (start_date or end_date) else None,
         start_date=start_date,
         end_date=end_date,
@@ -253,39 +464,38 @@ async def get_user_stats(
         item_types=type_list,
         playback_methods=method_list,
     )
+    where_clause, params = build_filter_conditions(**filters)
+
+    if is_all_servers(server_id):
+        return _dashboard_part(await _all_servers_dashboard(filters, days), "users")
 
+    user_map = await user_service.get_user_map(server_id)
     count_expr = get_count_expr()
     datetime_col = local_datetime("DateCreated")
 
-    async with get_playback_db(server_id) as db:
-        async with db.execute(f"""
-            SELECT
-                UserId,
-                {count_expr} as play_count,
-                COALESCE(SUM(PlayDuration), 0) as total_duration,
-                MAX({datetime_col}) as last_play
-            FROM PlaybackActivity
-            WHERE {where_clause}
-            GROUP BY UserId
-            ORDER BY total_duration DESC
-        """, params) as cursor:
-            data = []
-            async for row in cursor:
-                user_id = row[0] or ""
-                username = user_service.match_username(user_id, user_map)
-
-                data.append({
-                    "user_id": user_id,
-                    "username": username,
-                    "play_count": int(row[1] or 0),
-                    "duration_hours": round(row[2] / 3600, 2),
-                    "last_play": row[3]
-                })
-
-    return {"users": data}
+    rows = await rollup_service.aggregate(server_id, ["UserId"], filters)
+    if rows is not None:
+        rows.sort(key=lambda r: r[2], reverse=True)
+    else:
+        async with get_playback_db(server_id) as db:
+            async with db.execute(f"""
+                SELECT
+                    UserId,
+                    {count_expr} as play_count,
+                    COALESCE(SUM(PlayDuration), 0) as total_duration,
+                    MAX({datetime_col}) as last_play
+                FROM PlaybackActivity
+                WHERE {where_clause}
+                GROUP BY UserId
+                ORDER BY total_duration DESC
+            """, params) as cursor:
+                rows = await cursor.fetchall()
+
+    return {"users": format_users(rows, user_map)}
 
 
 @router.get("/clients")
+@cached_response
 async def get_client_stats(
     days: int = Query(default=30, ge=1, le=365),
     start_date: Optional[str] = Query(default=None),
@@ -304,7 +514,7 @@ async def get_client_stats(
     type_list = [t.strip() for t in item_types.split(",")] if item_types else None
     method_list = [m.strip() for m in playback_methods.split(",")] if playback_methods else None
 
-    where_clause, params = build_filter_conditions(
+    filters = dict(
         days=days if not (start_date or end_date) else None,
         start_date=start_date,
         end_date=end_date,
@@ -314,55 +524,33 @@ async def get_client_stats(
         item_types=type_list,
         playback_methods=method_list,
     )
+    where_clause, params = build_filter_conditions(**filters)
+
+    if is_all_servers(server_id):
+        return _dashboard_part(await _all_servers_dashboard(filters, days), "clients")
 
     count_expr = get_count_expr()
 
-    async with get_playback_db(server_id) as db:
-        async with db.execute(f"""
-            SELECT
-                ClientName,
-                {count_expr} as play_count,
-                COALESCE(SUM(PlayDuration), 0) as total_duration
-            FROM PlaybackActivity
-            WHERE {where_clause}
-            GROUP BY ClientName
-            ORDER BY play_count DESC
-        """, params) as cursor:
-            # 使用字典合并同名映射后的客户端
-            merged_data = {}
-            async for row in cursor:
-                original_name = row[0] or "Unknown"
-                mapped_name = name_mapping_service.map_client_name(original_name)
-                play_count = int(row[1] or 0)
-                duration = row[2]
-
-                if mapped_name in merged_data:
-                    merged_data[mapped_name]["play_count"] += play_count
-                    merged_data[mapped_name]["duration"] += duration
-                else:
-                    merged_data[mapped_name] = {
-                        "play_count": play_count,
-                        "duration": duration
-                    }
-
-            # 转换为列表并按播放次数排序
-            data = [
-                {
-                    "client": name,
-                    "play_count": info["play_count"],
-                    "duration_hours": round(info["duration"] / 3600, 2)
-                }
-                for name, info in sorted(
-                    merged_data.items(),
-                    key=lambda x: x[1]["play_count"],
-                    reverse=True
-                )
-            ]
-
-    return {"clients": data}
+    rows = await rollup_service.aggregate(server_id, ["ClientName"], filters)
+    if rows is None:
+        async with get_playback_db(server_id) as db:
+            async with db.execute(f"""
+                SELECT
+                    ClientName,
+                    {count_expr} as play_count,
+                    COALESCE(SUM(PlayDuration), 0) as total_duration
+                FROM PlaybackActivity
+                WHERE {where_clause}
+                GROUP BY ClientName
+                ORDER BY play_count DESC
+            """, params) as cursor:
+                rows = await cursor.fetchall()
+
+    return {"clients": format_clients(rows)}
 
 
 @router.get("/devices")
+@cached_response
 async def get_device_stats(
     days: int = Query(default=30, ge=1, le=365),
     start_date: Optional[str] = Query(default=None),
@@ -381,7 +569,7 @@ async def get_device_stats(
     type_list = [t.strip() for t in item_types.split(",")] if item_types else None
     method_list = [m.strip() for m in playback_methods.split(",")] if playback_methods else None
 
-    where_clause, params = build_filter_conditions(
+    filters = dict(
         days=days if not (start_date or end_date) else None,
         start_date=start_date,
         end_date=end_date,
@@ -391,61 +579,35 @@ async def get_device_stats(
         item_types=type_list,
         playback_methods=method_list,
     )
+    where_clause, params = build_filter_conditions(**filters)
+
+    if is_all_servers(server_id):
+        return _dashboard_part(await _all_servers_dashboard(filters, days), "devices")
 
     count_expr = get_count_expr()
 
-    async with get_playback_db(server_id) as db:
-        async with db.execute(f"""
-            SELECT
-                DeviceName,
-                ClientName,
-                {count_expr} as play_count,
-                COALESCE(SUM(PlayDuration), 0) as total_duration
-            FROM PlaybackActivity
-            WHERE {where_clause}
-            GROUP BY DeviceName
-            ORDER BY play_count DESC
-        """, params) as cursor:
-            # 使用字典合并同名映射后的设备
-            merged_data = {}
-            async for row in cursor:
-                original_device = row[0] or "Unknown"
-                original_client = row[1] or "Unknown"
-                mapped_device = name_mapping_service.map_device_name(original_device)
-                mapped_client = name_mapping_service.map_client_name(original_client)
-                play_count = int(row[2] or 0)
-                duration = row[3]
-
-                # 使用设备名作为 key 进行合并
-                if mapped_device in merged_data:
-                    merged_data[mapped_device]["play_count"] += play_count
-                    merged_data[mapped_device]["duration"] += duration
-                else:
-                    merged_data[mapped_device] = {
-                        "client": mapped_client,
-                        "play_count": play_count,
-                        "duration": duration
-                    }
-
-            # 转换为列表并按播放次数排序
-            data = [
-                {
-                    "device": name,
-                    "client": info["client"],
-                    "play_count": info["play_count"],
-                    "duration_hours": round(info["duration"] / 3600, 2)
-                }
-                for name, info in sorted(
-                    merged_data.items(),
-                    key=lambda x: x[1]["play_count"],
-                    reverse=True
-                )
-            ]
-
-    return {"devices": data}
+    # 汇总库按 (设备, 客户端) 返回且按播放次数降序，合并时设备取播放最多的客户端
+    rows = await rollup_service.aggregate(server_id, ["DeviceName", "ClientName"], filters)
+    if rows is None:
+        async with get_playback_db(server_id) as db:
+            async with db.execute(f"""
+                SELECT
+                    DeviceName,
+                    ClientName,
+                    {count_expr} as play_count,
+                    COALESCE(SUM(PlayDuration), 0) as total_duration
+                FROM PlaybackActivity
+                WHERE {where_clause}
+                GROUP BY DeviceName
+                ORDER BY play_count DESC
+            """, params) as cursor:
+                rows = await cursor.fetchall()
+
+    return {"devices": format_devices(rows)}
 
 
 @router.get("/playback-methods")
+@cached_response
 async def get_playback_methods(
     days: int = Query(default=30, ge=1, le=365),
     start_date: Optional[str] = Query(default=None),
@@ -464,7 +626,7 @@ async def get_playback_methods(
     type_list = [t.strip() for t in item_types.split(",")] if item_types else None
     method_list = [m.strip() for m in playback_methods.split(",")] if playback_methods else None
 
-    where_clause, params = build_filter_conditions(
+    filters = dict(
         days=days if not (start_date or end_date) else None,
         start_date=start_date,
         end_date=end_date,
@@ -474,32 +636,33 @@ async def get_playback_methods(
         item_types=type_list,
         playback_methods=method_list,
     )
+    where_clause, params = build_filter_conditions(**filters)
+
+    if is_all_servers(server_id):
+        return _dashboard_part(await _all_servers_dashboard(filters, days), "methods")
 
     count_expr = get_count_expr()
 
-    async with get_playback_db(server_id) as db:
-        async with db.execute(f"""
-            SELECT
-                PlaybackMethod,
-                {count_expr} as play_count,
-                COALESCE(SUM(PlayDuration), 0) as total_duration
-            FROM PlaybackActivity
-            WHERE {where_clause}
-            GROUP BY PlaybackMethod
-            ORDER BY play_count DESC
-        """, params) as cursor:
-            data = []
-            async for row in cursor:
-                data.append({
-                    "method": row[0] or "Unknown",
-                    "play_count": int(row[1] or 0),
-                    "duration_hours": round(row[2] / 3600, 2)
-                })
+    rows = await rollup_service.aggregate(server_id, ["PlaybackMethod"], filters)
+    if rows is None:
+        async with get_playback_db(server_id) as db:
+            async with db.execute(f"""
+                SELECT
+                    PlaybackMethod,
+                    {count_expr} as play_count,
+                    COALESCE(SUM(PlayDuration), 0) as total_duration
+                FROM PlaybackActivity
+                WHERE {where_clause}
+                GROUP BY PlaybackMethod
+                ORDER BY play_count DESC
+            """, params) as cursor:
+                rows = await cursor.fetchall()
 
-    return {"methods": data}
+    return {"methods": format_playback_methods(rows)}
 
 
 @router.get("/hourly")
+@cached_response
 async def get_hourly_stats(
     days: int = Query(default=30, ge=1, le=365),
     start_date: Optional[str] = Query(default=None),
@@ -518,7 +681,7 @@ async def get_hourly_stats(
     type_list = [t.strip() for t in item_types.split(",")] if item_types else None
     method_list = [m.strip() for m in playback_methods.split(",")] if playback_methods else None
 
-    where_clause, params = build_filter_conditions(
+    filters = dict(
         days=days if not (start_date or end_date) else None,
         start_date=start_date,
         end_date=end_date,
@@ -528,36 +691,311 @@ async def get_hourly_stats(
         item_types=type_list,
         playback_methods=method_list,
     )
+    where_clause, params = build_filter_conditions(**filters)
+
+    if is_all_servers(server_id):
+        return _dashboard_part(await _all_servers_dashboard(filters, days), "hourly")
 
     count_expr = get_count_expr()
     datetime_col = local_datetime("DateCreated")
 
+    rows = await rollup_service.aggregate(server_id, ["dow", "hour"], filters)
+    if rows is not None:
+        rows.sort(key=lambda r: (r[0], r[1]))
+    else:
+        async with get_playback_db(server_id) as db:
+            async with db.execute(f"""
+                SELECT
+                    strftime('%w', {datetime_col}) as day_of_week,
+                    strftime('%H', {datetime_col}) as hour,
+                    {count_expr} as play_count
+                FROM PlaybackActivity
+                WHERE {where_clause}
+                GROUP BY day_of_week, hour
+            """, params) as cursor:
+                rows = await cursor.fetchall()
+
+    return {"hourly": format_hourly(rows)}
+
+
+# /dashboard 原表查询：SQLite 不支持 GROUPING SETS，用物化 CTE 只扫描一次原表，
+# 再以 UNION ALL 对同一份中间结果做各组分组。3.35 之前的 SQLite 不支持 MATERIALIZED 关键字
+_MATERIALIZED = "MATERIALIZED" if sqlite3.sqlite_version_info >= (3, 35, 0) else ""
+
+
+@router.get("/dashboard")
+@cached_response
+async def get_dashboard(
+    days: int = Query(default=30, ge=1, le=365),
+    start_date: Optional[str] = Query(default=None),
+    end_date: Optional[str] = Query(default=None),
+    users: Optional[str] = Query(default=None),
+    clients: Optional[str] = Query(default=None),
+    devices: Optional[str] = Query(default=None),
+    item_types: Optional[str] = Query(default=None),
+    playback_methods: Optional[str] = Query(default=None),
+    server_id: Optional[str] = Query(default=None),
+):
+    """获取仪表盘全部统计（总览、趋势、用户、客户端、设备、播放方式、热力图）
+
+    一次请求返回各单独接口的内容。汇总库可用时逐项查询汇总库，否则用一条语句
+    扫描一次原表得出全部分组结果。server_id 为 all 时汇总全部服务器。
+    """
+    user_list = [u.strip() for u in users.split(",")] if users else None
+    client_list = [c.strip() for c in clients.split(",")] if clients else None
+    device_list = [d.strip() for d in devices.split(",")] if devices else None
+    type_list = [t.strip() for t in item_types.split(",")] if item_types else None
+    method_list = [m.strip() for m in playback_methods.split(",")] if playback_methods else None
+
+    filters = dict(
+        days=days if not (start_date or end_date) else None,
+        start_date=start_date,
+        end_date=end_date,
+        users=user_list,
+        clients=client_list,
+        devices=device_list,
+        item_types=type_list,
+        playback_methods=method_list,
+    )
+
+    if is_all_servers(server_id):
+        return await _all_servers_dashboard(filters, days)
+
+    user_map = await user_service.get_user_map(server_id)
+    groups = await _server_dashboard_groups(server_id, filters)
+    return _format_dashboard(groups, user_map, days)
+
+
+async def _server_dashboard_groups(server_id: Optional[str], filters: dict) -> dict:
+    """单个服务器的仪表盘各组结果，优先使用汇总库"""
+    where_clause, params = build_filter_conditions(**filters)
+    groups = await _dashboard_from_rollup(server_id, filters, where_clause, params)
+    if groups is None:
+        groups = await _dashboard_from_raw(server_id, where_clause, params)
+    return groups
+
+
+def _format_dashboard(groups: dict, user_map: dict, days: int) -> dict:
+    """把各组结果格式化为与各单独接口一致的结构"""
+    total_plays, total_duration, unique_users, unique_items = groups["total"]
+    by_type = {}
+    for row in sorted(groups["type"], key=lambda r: r[0] or ""):
+        entry = by_type.setdefault(row[0] or "Unknown", {"count": 0, "duration": 0})
+        entry["count"] += int(row[1] or 0)
+        entry["duration"] += row[2]
+
+    return {
+        "overview": format_overview(
+            int(total_plays or 0), total_duration, unique_users, unique_items, by_type, days
+        ),
+        "trend": format_trend(sorted(groups["date"], key=lambda r: r[0])),
+        "users": format_users(sorted(groups["user"], key=lambda r: r[2], reverse=True), user_map),
+        "clients": format_clients(sorted(groups["client"], key=lambda r: r[1], reverse=True)),
+        "devices": format_devices(sorted(groups["device"], key=lambda r: r[2], reverse=True)),
+        "methods": format_playback_methods(sorted(groups["method"], key=lambda r: r[1], reverse=True)),
+        "hourly": format_hourly(sorted(groups["hourly"], key=lambda r: (int(r[0]), int(r[1])))),
+    }
+
+
+async def _dashboard_from_rollup(server_id: Optional[str], filters: dict, where_clause: str, params: list) -> Optional[dict]:
+    """从汇总库逐项查询仪表盘各组结果，汇总库不可用时返回 None"""
+    by_user_type = await rollup_service.aggregate(server_id, ["UserId", "ItemType"], filters)
+    if by_user_type is None:
+        return None
+
+    groups = {}
+    for name, dims in (
+        ("date", ["date"]),
+        ("user", ["UserId"]),
+        ("client", ["ClientName"]),
+        ("device", ["DeviceName", "ClientName"]),
+        ("method", ["PlaybackMethod"]),
+        ("hourly", ["dow", "hour"]),
+    ):
+        rows = await rollup_service.aggregate(server_id, dims, filters)
+        if rows is None:
+            return None
+        # 汇总库返回 (维度..., 次数, 时长, 最后播放)，只有用户统计需要最后播放时间
+        groups[name] = rows if name == "user" else [row[:-1] for row in rows]
+    groups["hourly"] = [(dow, hour, plays) for dow, hour, plays, _ in groups["hourly"]]
+
+    # 内容数无法从汇总库得出，仍查询原表
     async with get_playback_db(server_id) as db:
         async with db.execute(f"""
-            SELECT
-                strftime('%w', {datetime_col}) as day_of_week,
-                strftime('%H', {datetime_col}) as hour,
-                {count_expr} as play_count
+            SELECT COUNT(DISTINCT ItemId)
             FROM PlaybackActivity
             WHERE {where_clause}
-            GROUP BY day_of_week, hour
         """, params) as cursor:
-            data = []
-            async for row in cursor:
-                data.append({
-                    "day": int(row[0]),  # 0=Sunday, 1=Monday, ...
-                    "hour": int(row[1]),
-                    "count": int(row[2] or 0)
-                })
+            unique_items = (await cursor.fetchone())[0]
+
+    groups["total"] = (
+        sum(row[2] for row in by_user_type),
+        sum(row[3] for row in by_user_type),
+        len({row[0] for row in by_user_type if row[0]}),
+        unique_items,
+    )
+    groups["type"] = [row[1:4] for row in by_user_type]
+    return groups
 
-    return {"hourly": data}
+
+async def _dashboard_from_raw(server_id: Optional[str], where_clause: str, params: list) -> dict:
+    """扫描一次原表得出仪表盘各组结果"""
+    counted = "1"
+    if settings.MIN_PLAY_DURATION > 0:
+        counted = f"CASE WHEN COALESCE(PlayDuration, 0) >= {settings.MIN_PLAY_DURATION} THEN 1 ELSE 0 END"
+
+    # 每行为 (分组名, 键1, 键2, 次数, 时长, 附加值)
+    async with get_playback_db(server_id) as db:
+        async with db.execute(f"""
+            WITH f AS {_MATERIALIZED} (
+                SELECT
+                    {local_datetime("DateCreated")} AS ldt,
+                    UserId, ItemId, ItemType, ClientName, DeviceName, PlaybackMethod,
+                    COALESCE(PlayDuration, 0) AS d,
+                    {counted} AS c
+                FROM PlaybackActivity
+                WHERE {where_clause}
+            )
+            SELECT 'total', COUNT(DISTINCT UserId), COUNT(DISTINCT ItemId), SUM(c), COALESCE(SUM(d), 0), NULL FROM f
+            UNION ALL
+            SELECT 'type', ItemType, NULL, SUM(c), SUM(d), NULL FROM f GROUP BY ItemType
+            UNION ALL
+            SELECT 'date', date(ldt), NULL, SUM(c), SUM(d), NULL FROM f GROUP BY date(ldt)
+            UNION ALL
+            SELECT 'user', UserId, NULL, SUM(c), SUM(d), MAX(ldt) FROM f GROUP BY UserId
+            UNION ALL
+            SELECT 'client', ClientName, NULL, SUM(c), SUM(d), NULL FROM f GROUP BY ClientName
+            UNION ALL
+            SELECT 'device', DeviceName, ClientName, SUM(c), SUM(d), NULL FROM f GROUP BY DeviceName
+            UNION ALL
+            SELECT 'method', PlaybackMethod, NULL, SUM(c), SUM(d), NULL FROM f GROUP BY PlaybackMethod
+            UNION ALL
+            SELECT 'hourly', strftime('%w', ldt), strftime('%H', ldt), SUM(c), NULL, NULL FROM f
+            GROUP BY strftime('%w', ldt), strftime('%H', ldt)
+        """, params) as cursor:
+            rows = await cursor.fetchall()
+
+    groups = {name: [] for name in ("type", "date", "user", "client", "device", "method", "hourly")}
+    for name, key1, key2, plays, duration, extra in rows:
+        if name == "total":
+            groups["total"] = (plays, duration, key1, key2)
+        elif name == "user":
+            groups["user"].append((key1, plays, duration, extra))
+        elif name == "device":
+            groups["device"].append((key1, key2, plays, duration))
+        elif name == "hourly":
+            groups["hourly"].append((key1, key2, plays))
+        else:
+            groups[name].append((key1, plays, duration))
+    return groups
+
+
+# ==================== 多服务器汇总（server_id=all） ====================
+
+
+def _merge_rows(rows, key_len: int) -> list[tuple]:
+    """按前 key_len 列合并多个服务器的分组结果，其余列（次数、时长）相加"""
+    merged = {}
+    for row in rows:
+        key = tuple(row[:key_len])
+        values = [value or 0 for value in row[key_len:]]
+        if key in merged:
+            merged[key] = [a + b for a, b in zip(merged[key], values)]
+        else:
+            merged[key] = values
+    return [(*key, *values) for key, values in merged.items()]
+
+
+def _merge_dashboard_groups(results: dict, server_names: dict) -> tuple[dict, dict]:
+    """合并各服务器的仪表盘分组结果
+
+    用户 ID 和用户名带上服务器前缀，因此用户数、内容数可以直接相加
+    （不同服务器的项目 ID 互不相同）。
+
+    Returns:
+        (合并后的分组结果, 带前缀用户 ID 到用户名的映射)
+    """
+    total = [0, 0, 0, 0]
+    rows = {name: [] for name in ("type", "date", "client", "device", "method", "hourly")}
+    user_rows = []
+    user_map = {}
+
+    for server_id, (groups, server_user_map) in results.items():
+        plays, duration, unique_users, unique_items = groups["total"]
+        total[0] += int(plays or 0)
+        total[1] += duration or 0
+        total[2] += unique_users or 0
+        total[3] += unique_items or 0
+
+        for name in rows:
+            rows[name].extend(groups[name])
+        for user_id, plays, duration, last_play in groups["user"]:
+            user_id = user_id or ""
+            key = namespaced_user_id(server_id, user_id)
+            user_rows.append((key, plays, duration, last_play))
+            user_map[key] = namespaced_username(
+                server_names[server_id], user_service.match_username(user_id, server_user_map)
+            )
+
+    # 汇总库和原表返回的星期 / 小时类型不同，统一为整数后再合并
+    hourly = [(int(dow), int(hour), plays) for dow, hour, plays in rows["hourly"]]
+    merged = {
+        "total": tuple(total),
+        "type": _merge_rows(rows["type"], 1),
+        "date": _merge_rows(rows["date"], 1),
+        "user": user_rows,
+        "client": _merge_rows(rows["client"], 1),
+        "device": _merge_rows(rows["device"], 2),
+        "method": _merge_rows(rows["method"], 1),
+        "hourly": _merge_rows(hourly, 2),
+    }
+    return merged, user_map
+
+
+async def _all_servers_dashboard(filters: dict, days: int) -> dict:
+    """并发查询全部服务器并合并仪表盘数据
+
+    各单独接口在汇总模式下也取其中对应部分，同一组筛选条件只计算一次（响应缓存中单飞合并）。
+    """
+    async def compute():
+        async def query(server_id: Optional[str]):
+            users, needed = split_user_filter(filters["users"], server_id)
+            if not needed:
+                return None
+            groups = await _server_dashboard_groups(server_id, {**filters, "users": users})
+            return groups, await user_service.get_user_map(server_id)
+
+        results, statuses = await fan_out(query)
+        groups, user_map = _merge_dashboard_groups(results, dict(list_servers()))
+        dashboard = _format_dashboard(groups, user_map, days)
+        dashboard["servers"] = statuses
+        dashboard["partial"] = is_partial(statuses)
+        return dashboard
+
+    return await cached_call(["all_servers_dashboard", filters, days], ALL_SERVERS, compute)
+
+
+def _dashboard_part(dashboard: dict, key: str) -> dict:
+    """汇总模式下单独接口的响应：仪表盘对应部分加上各服务器状态"""
+    return {key: dashboard[key], "servers": dashboard["servers"], "partial": dashboard["partial"]}
 
 
 @router.get("/now-playing")
-async def get_now_playing():
+async def get_now_playing(
+    server_id: Optional[str] = Query(default=None, description="服务器ID"),
+):
     """获取当前正在播放的内容"""
-    user_map = await user_service.get_user_map()
-    sessions = await emby_service.get_now_playing()
+    if is_all_servers(server_id):
+        return await _all_servers_now_playing()
+    data = await _now_playing_rows(server_id)
+    return {"now_playing": data, "count": len(data)}
+
+
+async def _now_playing_rows(server_id: Optional[str]) -> list:
+    """单个服务器正在播放的会话"""
+    emby = get_emby_service(server_id)
+    user_map = await user_service.get_user_map(server_id)
+    sessions = await emby.get_now_playing()
 
     data = []
     for session in sessions:
@@ -579,9 +1017,9 @@ async def get_now_playing():
         # 获取海报
         poster_url = None
         if item_type == "Episode" and item.get("SeriesId"):
-            poster_url = f"/api/poster/{item['SeriesId']}"
+            poster_url = emby.image_url("poster", item['SeriesId'])
         elif item.get("ImageTags", {}).get("Primary"):
-            poster_url = f"/api/poster/{item_id}"
+            poster_url = emby.image_url("poster", item_id)
 
         # 构建显示名称
         if series_name:
@@ -615,10 +1053,27 @@ async def get_now_playing():
             "play_method": session.get("PlayState", {}).get("PlayMethod", ""),
         })
 
-    return {"now_playing": data, "count": len(data)}
+    return data
+
+
+async def _all_servers_now_playing() -> dict:
+    """合并各服务器正在播放的会话，用户名和项目 ID 带上服务器标识"""
+    results, statuses = await fan_out(_now_playing_rows)
+    server_names = dict(list_servers())
+
+    data = []
+    for server_id, rows in results.items():
+        for row in rows:
+            data.append({
+                **row,
+                "user_name": namespaced_username(server_names[server_id], row["user_name"]),
+                "item_id": namespaced_item_id(server_id, row["item_id"]),
+            })
+    return {"now_playing": data, "count": len(data), "servers": statuses, "partial": is_partial(statuses)}
 
 
 @router.get("/recent")
+@cached_response
 async def get_recent_plays(
     limit: int = Query(default=20, ge=1, le=100),
     days: Optional[int] = Query(default=None, ge=1, le=365, description="天数范围，不传则查询全部"),
@@ -630,10 +1085,18 @@ async def get_recent_plays(
     item_types: Optional[str] = Query(default=None, description="媒体类型列表，逗号分隔"),
     playback_methods: Optional[str] = Query(default=None, description="播放方式列表，逗号分隔"),
     search: Optional[str] = Query(default=None, description="搜索关键词，匹配内容名称"),
+    cursor: Optional[str] = Query(default=None, description="分页游标，取上一页返回的 next_cursor"),
+    lazy: bool = Query(default=False, description="立即返回，不等待 Emby 项目信息（简介通过 /api/items/enrich 补全）"),
     server_id: Optional[str] = Query(default=None, description="服务器ID"),
 ):
-    """获取最近播放记录"""
-    user_map = await user_service.get_user_map()
+    """获取最近播放记录
+
+    按时间倒序分页：返回的 next_cursor 传回 cursor 参数即可取下一页，没有更多记录时为 null。
+    每页从游标位置继续查询，翻到多深代价都相同。
+    """
+    if is_all_servers(server_id):
+        raise HTTPException(status_code=400, detail="播放记录不支持全部服务器汇总，请指定服务器")
+    user_map = await user_service.get_user_map(server_id)
     datetime_col = local_datetime("DateCreated")
 
     # 解析筛选参数
@@ -654,10 +1117,14 @@ async def get_recent_plays(
         item_types=item_type_list,
         playback_methods=playback_method_list,
         search=search,
+        search_matches=await search_index_service.match(server_id, search),
     )
 
-    # 添加 limit 参数
-    params.append(limit)
+    # 从游标位置继续（rowid 区分同一时间的多条记录）
+    keyset = ""
+    if cursor:
+        keyset = " AND (DateCreated, rowid) < (?, ?)"
+        params.extend(decode_cursor(cursor))
 
     # 获取播放时长过滤条件
     duration_filter = get_duration_filter()
@@ -673,65 +1140,84 @@ async def get_recent_plays(
                 ClientName,
                 DeviceName,
                 PlayDuration,
-                PlaybackMethod
+                PlaybackMethod,
+                DateCreated,
+                rowid
             FROM PlaybackActivity
-            WHERE {where_clause}{duration_filter}
-            ORDER BY DateCreated DESC
+            WHERE {where_clause}{duration_filter}{keyset}
+            ORDER BY DateCreated DESC, rowid DESC
             LIMIT ?
-        """, params) as cursor:
-            data = []
-            async for row in cursor:
-                user_id = row[1] or ""
-                item_id = row[2]
-                item_name = row[3]
-                item_type = row[4]
-
-                username = user_service.match_username(user_id, user_map)
-
-                # 获取海报和背景图
-                info = await emby_service.get_item_info(str(item_id))
-                poster_url = emby_service.get_poster_url(str(item_id), item_type, info)
-                backdrop_url = emby_service.get_backdrop_url(str(item_id), item_type, info)
-
-                # 提取剧名
-                show_name = item_name.split(" - ")[0] if " - " in item_name else item_name
-
-                # 获取单集简介（如果有）
-                overview = info.get("Overview", "") if info else ""
-
-                # 如果是剧集且没有 backdrop，尝试从剧集获取
-                if item_type == "Episode" and not backdrop_url and info:
-                    series_id = info.get("SeriesId")
-                    if series_id:
-                        series_info = await emby_service.get_item_info(series_id)
-                        if series_info and series_info.get("BackdropImageTags"):
-                            backdrop_url = f"/api/backdrop/{series_id}"
-
-                data.append({
-                    "time": row[0],
-                    "username": username,
-                    "item_id": item_id,
-                    "item_name": item_name,
-                    "show_name": show_name,
-                    "item_type": item_type,
-                    "client": name_mapping_service.map_client_name(row[5]),
-                    "device": name_mapping_service.map_device_name(row[6]),
-                    "duration_minutes": round((row[7] or 0) / 60, 1),
-                    "method": row[8],
-                    "poster_url": poster_url,
-                    "backdrop_url": backdrop_url,
-                    "overview": overview
-                })
-
-    return {"recent": data}
+        """, params + [limit]) as db_cursor:
+            rows = await db_cursor.fetchall()
+
+    # 批量获取海报、背景图和剧集信息（lazy 模式跳过）
+    emby = get_emby_service(server_id)
+    item_infos = {} if lazy else await emby.get_items_info([str(row[2]) for row in rows])
+
+    data = []
+    for row in rows:
+        user_id = row[1] or ""
+        item_id = row[2]
+        item_name = row[3]
+        item_type = row[4]
+
+        username = user_service.match_username(user_id, user_map)
+
+        # 获取海报和背景图
+        info = item_infos.get(str(item_id), {})
+        if lazy:
+            # 图片地址不依赖项目信息，单集由图片代理解析为所属剧集
+            poster_url = emby.image_url("poster", str(item_id), series=item_type == "Episode")
+            backdrop_url = emby.image_url("backdrop", str(item_id), series=item_type == "Episode")
+        else:
+            poster_url = emby.get_poster_url(str(item_id), item_type, info)
+            backdrop_url = emby.get_backdrop_url(str(item_id), item_type, info)
+
+        # 提取剧名
+        show_name = item_name.split(" - ")[0] if " - " in item_name else item_name
+
+        # 获取单集简介（如果有）
+        overview = info.get("Overview", "") if info else ""
+
+        # 如果是剧集且没有 backdrop，尝试从剧集获取
+        if item_type == "Episode" and not backdrop_url and info:
+            series_id = info.get("SeriesId")
+            if series_id:
+                series_info = item_infos.get(series_id)
+                if series_info and series_info.get("BackdropImageTags"):
+                    backdrop_url = emby.image_url("backdrop", series_id)
+
+        data.append({
+            "time": row[0],
+            "username": username,
+            "item_id": item_id,
+            "item_name": item_name,
+            "show_name": show_name,
+            "item_type": item_type,
+            "client": name_mapping_service.map_client_name(row[5]),
+            "device": name_mapping_service.map_device_name(row[6]),
+            "duration_minutes": round((row[7] or 0) / 60, 1),
+            "method": row[8],
+            "poster_url": poster_url,
+            "backdrop_url": backdrop_url,
+            "overview": overview
+        })
+
+    # 不足一页说明已经到底
+    next_cursor = encode_cursor(rows[-1][9], rows[-1][10]) if len(rows) == limit else None
+    return {"recent": data, "next_cursor": next_cursor}
 
 
 @router.get("/filter-options")
+@cached_response
 async def get_filter_options(
     server_id: Optional[str] = Query(default=None, description="服务器ID"),
 ):
-    """获取所有可用的筛选选项"""
-    user_map = await user_service.get_user_map()
+    """获取所有可用的筛选选项（server_id 为 all 时合并全部服务器，用户 ID 带服务器前缀）"""
+    if is_all_servers(server_id):
+        return await _all_servers_filter_options()
+
+    user_map = await user_service.get_user_map(server_id)
 
     async with get_playback_db(server_id) as db:
         # 获取所有用户
@@ -813,6 +1299,45 @@ async def get_filter_options(
     }
 
 
+async def _all_servers_filter_options() -> dict:
+    """合并各服务器的筛选选项"""
+    results, statuses = await fan_out(lambda sid: get_filter_options(server_id=sid))
+    server_names = dict(list_servers())
+
+    users, clients, devices = [], {}, {}
+    item_types, playback_methods = set(), set()
+    date_min, date_max = None, None
+    for server_id, options in results.items():
+        for user in options["users"]:
+            users.append({
+                "id": namespaced_user_id(server_id, user["id"]),
+                "name": namespaced_username(server_names[server_id], user["name"]),
+            })
+        # 客户端和设备按映射后名称去重
+        for client in options["clients"]:
+            clients.setdefault(client["display"], client)
+        for device in options["devices"]:
+            devices.setdefault(device["display"], device)
+        item_types.update(options["item_types"])
+        playback_methods.update(options["playback_methods"])
+        date_range = options["date_range"]
+        if date_range["min"] and (date_min is None or date_range["min"] < date_min):
+            date_min = date_range["min"]
+        if date_range["max"] and (date_max is None or date_range["max"] > date_max):
+            date_max = date_range["max"]
+
+    return {
+        "users": users,
+        "clients": sorted(clients.values(), key=lambda c: c["original"]),
+        "devices": sorted(devices.values(), key=lambda d: d["original"]),
+        "item_types": sorted(item_types),
+        "playback_methods": sorted(playback_methods),
+        "date_range": {"min": date_min, "max": date_max},
+        "servers": statuses,
+        "partial": is_partial(statuses),
+    }
+
+
 @router.get("/name-mappings")
 async def get_name_mappings():
     """获取名称映射配置"""
@@ -824,6 +1349,7 @@ async def save_name_mappings(mappings: dict):
     """保存名称映射配置"""
     success = name_mapping_service.save_mappings(mappings)
     if success:
+        response_cache.invalidate()
         return {"status": "ok", "message": "映射配置已保存"}
     else:
         return {"status": "error", "message": "保存失败"}
@@ -833,4 +1359,5 @@ async def save_name_mappings(mappings: dict):
 async def reload_name_mappings():
     """重新加载名称映射配置"""
     name_mapping_service.reload()
+    response_cache.invalidate()
     return {"status": "ok", "message": "配置已重新加载"}
@@ -1,12 +1,14 @@
 """Webhook路由"""
-from fastapi import APIRouter, Request, HTTPException
-from typing import Dict, Any
+from fastapi import APIRouter, Request, HTTPException, Query
+from typing import Dict, Any, Optional
+import json
 import logging
 import sys
 
 from services.webhook import WebhookService
 from services.tmdb import TMDBService
 from services.notification import NotificationService, NotificationTemplateService
+from services.webhook_queue import webhook_queue
 from config import settings
 from config_storage import config_storage
 
@@ -20,97 +22,158 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/webhook", tags=["webhook"])
 
+# 同一剧集的 library.new 合并后的事件类型
+LIBRARY_DIGEST_EVENT = "library.digest"
+
 # 初始化服务
 webhook_service = WebhookService()
 
 
+def _template_name(event: str) -> str:
+    """根据事件类型确定模板"""
+    if event.startswith("playback."):
+        return "playback"
+    if event == "library.new":
+        return "library"
+    if event in ("user.authenticated", "user.authenticationfailed"):
+        return "login"
+    if event.startswith("item.mark") or event.startswith("user.rating") or event.startswith("item.rating") or event.startswith("user.favorite") or event.startswith("item.favorite") or event == "item.rate":
+        return "mark"
+    return "default"
+
+
+async def deliver_webhook_event(data: Dict[str, Any]):
+    """处理队列中的一个 webhook 事件：构建上下文、获取图片、渲染模板并发送通知
+
+    所有已配置的渠道都发送失败时抛出异常，由队列稍后重试
+    """
+    event_type = data.get('Event', 'Unknown')
+
+    # 构建事件上下文（合并的入库事件只查询一次剧集信息、获取一次图片）
+    if event_type == LIBRARY_DIGEST_EVENT:
+        context = await webhook_service.build_library_digest_context(data.get("Events", []))
+    else:
+        context = await webhook_service.build_event_context(data)
+    if not context:
+        # 数据本身无效，重试也不会成功
+        logger.warning(f"无效的webhook事件数据，已忽略: {event_type}")
+        return
+
+    # 从配置文件获取通知配置
+    tg_config = config_storage.get_telegram_config()
+    wecom_config = config_storage.get_wecom_config()
+    discord_config = config_storage.get_discord_config()
+    onebot_config = config_storage.get("onebot", {})
+    tmdb_config = config_storage.get_tmdb_config()
+
+    notification_config = {
+        "telegram": {
+            "token": tg_config.get("bot_token", ""),
+            "admins": tg_config.get("admins", []),
+            "users": tg_config.get("users", []),
+        },
+        "wecom": wecom_config,
+        "discord": discord_config,
+        "onebot": onebot_config
+    }
+
+    # 初始化通知服务
+    notification_service = NotificationService(notification_config)
+    templates = config_storage.get_templates()
+    template_service = NotificationTemplateService(templates)
+
+    # 获取TMDB图片
+    image_url = None
+    if context.get("item_id"):
+        tmdb_service = TMDBService(
+            api_key=tmdb_config.get("api_key", ""),
+            image_base_url=tmdb_config.get("image_base_url", "https://image.tmdb.org/t/p/original"),
+            emby_server=settings.EMBY_URL,
+            proxy=tmdb_config.get("proxy", "")
+        )
+
+        # 构建item对象
+        item = {
+            "Id": context.get("item_id"),
+            "Type": context.get("item_type"),
+            "Name": context.get("item_name"),
+            "SeriesName": context.get("series_name"),
+            "ProductionYear": context.get("item_year"),
+            "ProviderIds": {
+                "Tmdb": context.get("tmdb_id"),
+                "Imdb": context.get("imdb_id"),
+            }
+        }
+        image_url = await tmdb_service.get_image_url(item)
+
+    # 渲染通知模板
+    title, message = template_service.render(_template_name(context.get("event", "")), context)
+
+    # 发送通知；部分渠道成功时不重试，避免已成功的渠道收到重复消息
+    sent = await notification_service.send_all(title, message, image_url)
+    if sent == 0 and any(notification_service._enabled_channels(None).values()):
+        raise RuntimeError("所有通知渠道发送失败")
+
+
 @router.post("/emby")
 async def handle_emby_webhook(request: Request):
-    """处理Emby Webhook事件"""
+    """接收Emby Webhook事件：写入队列后立即返回，通知由后台 worker 发送"""
+    body = await request.body()
     try:
-        # 获取请求体
-        data = await request.json()
-        event_type = data.get('Event', 'Unknown')
-        logger.info(f"收到Emby webhook事件: {event_type}")
-        logger.info(f"完整webhook数据: {data}")
-        
-        # 构建事件上下文
-        context = await webhook_service.build_event_context(data)
-        if not context:
-            raise HTTPException(status_code=400, detail="无效的事件数据")
-        
-        # 从配置文件获取通知配置
-        tg_config = config_storage.get_telegram_config()
-        wecom_config = config_storage.get_wecom_config()
-        discord_config = config_storage.get_discord_config()
-        onebot_config = config_storage.get("onebot", {})
-        tmdb_config = config_storage.get_tmdb_config()
-        
-        notification_config = {
-            "telegram": {
-                "token": tg_config.get("bot_token", ""),
-                "admins": tg_config.get("admins", []),
-                "users": tg_config.get("users", []),
-            },
-            "wecom": wecom_config,
-            "discord": discord_config,
-            "onebot": onebot_config
-        }
-        
-        # 初始化通知服务
-        notification_service = NotificationService(notification_config)
-        templates = config_storage.get_templates()
-        template_service = NotificationTemplateService(templates)
-        
-        # 获取TMDB图片
-        image_url = None
-        if context.get("item_id"):
-            tmdb_service = TMDBService(
-                api_key=tmdb_config.get("api_key", ""),
-                image_base_url=tmdb_config.get("image_base_url", "https://image.tmdb.org/t/p/original"),
-                emby_server=settings.EMBY_URL,
-                proxy=tmdb_config.get("proxy", "")
+        data = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="无效的JSON数据")
+    if not isinstance(data, dict) or not data.get("Event"):
+        raise HTTPException(status_code=400, detail="无效的事件数据")
+
+    event_type = data["Event"]
+    logger.info(f"收到Emby webhook事件: {event_type}")
+    logger.debug(f"完整webhook数据: {data}")
+
+    header_key = request.headers.get("Idempotency-Key") or request.headers.get("X-Request-Id")
+    item = data.get("Item") or {}
+    digest = (
+        event_type == "library.new"
+        and item.get("Type") == "Episode"
+        and item.get("SeriesId")
+        and settings.LIBRARY_DIGEST_WINDOW > 0
+    )
+    try:
+        if digest:
+            # 整季入库时每集一个事件，按剧集暂存后合并为一条通知
+            job_id = await webhook_queue.hold(
+                f"library.new:{item['SeriesId']}",
+                LIBRARY_DIGEST_EVENT,
+                body,
+                data,
+                header_key,
+                window=settings.LIBRARY_DIGEST_WINDOW,
+                max_batch=settings.LIBRARY_DIGEST_MAX_BATCH,
             )
-            
-            # 构建item对象
-            item = {
-                "Id": context.get("item_id"),
-                "Type": context.get("item_type"),
-                "Name": context.get("item_name"),
-                "SeriesName": context.get("series_name"),
-                "ProductionYear": context.get("item_year"),
-                "ProviderIds": {
-                    "Tmdb": context.get("tmdb_id"),
-                    "Imdb": context.get("imdb_id"),
-                }
-            }
-            image_url = tmdb_service.get_image_url(item)
-        
-        # 确定模板类型
-        event = context.get("event", "")
-        if event.startswith("playback."):
-            template_name = "playback"
-        elif event == "library.new":
-            template_name = "library"
-        elif event in ("user.authenticated", "user.authenticationfailed"):
-            template_name = "login"
-        elif event.startswith("item.mark") or event.startswith("user.rating") or event.startswith("item.rating") or event.startswith("user.favorite") or event.startswith("item.favorite") or event == "item.rate":
-            template_name = "mark"
         else:
-            template_name = "default"
-        
-        # 渲染通知模板
-        title, message = template_service.render(template_name, context)
-        
-        # 发送通知
-        await notification_service.send_all(title, message, image_url)
-        
-        return {"status": "success", "event": context.get("event")}
-    
+            job_id = await webhook_queue.enqueue(body, data, header_key)
     except Exception as e:
-        logger.exception(f"处理webhook时出错: {str(e)}")
+        logger.exception(f"webhook事件写入队列失败: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+    if job_id is None:
+        logger.info(f"重复的webhook事件，已忽略: {event_type}")
+        return {"status": "duplicate", "event": event_type}
+    return {"status": "held" if digest else "queued", "event": event_type, "id": job_id}
+
+
+@router.get("/queue")
+async def get_webhook_queue(limit: int = Query(default=20, ge=0, le=200, description="返回的死信数量")):
+    """Webhook 队列状态和最近的死信"""
+    return await webhook_queue.stats(limit)
+
+
+@router.post("/queue/retry")
+async def retry_dead_letters(id: Optional[int] = Query(default=None, description="死信ID，不传时全部重新入队")):
+    """把死信表中的事件重新放回队列"""
+    count = await webhook_queue.requeue_dead_letters(id)
+    return {"status": "success", "requeued": count}
+
 
 @router.get("/test")
 async def test_notification():
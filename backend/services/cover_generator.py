@@ -13,12 +13,11 @@ from typing import Dict, Any, List, Optional, Tuple
 from collections import Counter
 from datetime import datetime
 
-import httpx
 from PIL import Image, ImageDraw, ImageFilter, ImageFont, ImageOps
 import numpy as np
 
-from config import settings
-from services.emby import EmbyService
+from services.emby import EmbyService, emby_service
+from services.http_client import http_client_pool
 from services.image_utils import (
     crop_to_square, add_rounded_corners, add_shadow_and_rotate,
     darken_color, find_dominant_macaron_colors, add_film_grain,
@@ -193,8 +192,9 @@ class CoverGeneratorService:
         "CANVAS_HEIGHT": 1080,
     }
     
-    def __init__(self):
-        self.emby_service = EmbyService()
+    def __init__(self, emby_service: Optional[EmbyService] = None):
+        # 多服务器时由 services.server_registry 传入对应服务器的 EmbyService
+        self.emby_service = emby_service or EmbyService()
         self.cache_dir = Path("/tmp/cover_cache")
         self.cache_dir.mkdir(exist_ok=True, parents=True)
         
@@ -225,24 +225,25 @@ class CoverGeneratorService:
                 logger.error("无法获取API密钥")
                 return []
             
-            async with httpx.AsyncClient(timeout=30) as client:
-                resp = await client.get(
-                    f"{settings.EMBY_URL}/Library/MediaFolders",
-                    headers={"Authorization": f'MediaBrowser Token="{api_key}"'}
-                )
-                
-                if resp.status_code == 200:
-                    data = resp.json()
-                    libraries = []
-                    if "Items" in data:
-                        for item in data["Items"]:
-                            if "Id" in item and "Name" in item:
-                                libraries.append({
-                                    "id": item["Id"],
-                                    "name": item["Name"],
-                                    "type": item.get("CollectionType", "unknown")
-                                })
-                    return libraries
+            client = http_client_pool.get(self.emby_service.emby_url)
+            resp = await client.get(
+                f"{self.emby_service.emby_url}/Library/MediaFolders",
+                headers={"Authorization": f'MediaBrowser Token="{api_key}"'},
+                timeout=30
+            )
+
+            if resp.status_code == 200:
+                data = resp.json()
+                libraries = []
+                if "Items" in data:
+                    for item in data["Items"]:
+                        if "Id" in item and "Name" in item:
+                            libraries.append({
+                                "id": item["Id"],
+                                "name": item["Name"],
+                                "type": item.get("CollectionType", "unknown")
+                            })
+                return libraries
         except Exception as e:
             logger.error(f"获取媒体库列表失败: {e}")
         
@@ -257,7 +258,7 @@ class CoverGeneratorService:
             if not api_key or not user_id:
                 return []
             
-            url = f"{settings.EMBY_URL}/Users/{user_id}/Items"
+            url = f"{self.emby_service.emby_url}/Users/{user_id}/Items"
             params = {
                 "ParentId": library_id,
                 "Recursive": "true",
@@ -270,12 +271,12 @@ class CoverGeneratorService:
                 "api_key": api_key
             }
             
-            async with httpx.AsyncClient(timeout=30) as client:
-                resp = await client.get(url, params=params)
-                
-                if resp.status_code == 200:
-                    data = resp.json()
-                    return data.get("Items", [])
+            client = http_client_pool.get(self.emby_service.emby_url)
+            resp = await client.get(url, params=params, timeout=30)
+
+            if resp.status_code == 200:
+                data = resp.json()
+                return data.get("Items", [])
         except Exception as e:
             logger.error(f"获取媒体库项目失败: {e}")
         
@@ -289,13 +290,13 @@ class CoverGeneratorService:
                 return None
             
             # 尝试获取主图
-            url = f"{settings.EMBY_URL}/Items/{item_id}/Images/Primary"
+            url = f"{self.emby_service.emby_url}/Items/{item_id}/Images/Primary"
             params = {"api_key": api_key, "maxWidth": 500}
             
-            async with httpx.AsyncClient(timeout=30) as client:
-                resp = await client.get(url, params=params)
-                if resp.status_code == 200:
-                    return resp.content
+            client = http_client_pool.get(self.emby_service.emby_url)
+            resp = await client.get(url, params=params, timeout=30)
+            if resp.status_code == 200:
+                return resp.content
         except Exception as e:
             logger.error(f"下载海报失败 {item_name}: {e}")
         
@@ -1838,4 +1839,4 @@ class CoverGeneratorService:
 
 
 # 创建全局实例
-cover_service = CoverGeneratorService()
+cover_service = CoverGeneratorService(emby_service)
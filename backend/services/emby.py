@@ -2,32 +2,61 @@
 Emby API 服务模块
 处理与 Emby 服务器的所有交互
 """
+import asyncio
+import time
+from typing import Optional
+from urllib.parse import urlencode
 import httpx
-import aiosqlite
 from config import settings
+from database import get_auth_db, get_server_config
+from services.http_client import http_client_pool
+from services.item_cache import MISSING, create_item_cache
+from services.item_store import get_item_store
+
+# 获取项目信息时请求的字段（单个和批量接口共用，保证缓存内容一致）
+ITEM_INFO_FIELDS = "SeriesInfo,ImageTags,SeriesPrimaryImageTag,PrimaryImageAspectRatio,Overview,BackdropImageTags,ProviderIds,DateModified"
 
 
 class EmbyService:
-    """Emby 服务类，管理与 Emby 服务器的交互"""
+    """Emby 服务类，管理与 Emby 服务器的交互
+
+    server_id 为 None 时使用环境变量配置的默认服务器，否则使用 config_storage 中
+    对应服务器的地址、API Key 和认证库。多服务器时通过 services.server_registry
+    获取各服务器的实例。
+    """
 
-    def __init__(self):
+    def __init__(self, server_id: Optional[str] = None):
+        config = get_server_config(server_id)
+        self.server_id: Optional[str] = config['server_id']
+        self._configured_api_key: str = config['emby_api_key']
         self._api_key_cache: str | None = None
         self._user_id_cache: str | None = None
-        self._item_info_cache: dict = {}
-        self._emby_url = settings.EMBY_URL
-        self._emby_url = settings.EMBY_URL
+        self._item_info_cache = create_item_cache()
+        self._item_store = get_item_store(ITEM_INFO_FIELDS)
+        self._background_tasks: set[asyncio.Task] = set()
+        self._revalidating: set[str] = set()
+        self._emby_url = config['emby_url']
+
+    @property
+    def emby_url(self) -> str:
+        """当前服务器的 Emby 地址"""
+        return self._emby_url
+
+    def _client(self) -> httpx.AsyncClient:
+        """获取当前服务器的共享 HTTP 客户端（由应用生命周期负责关闭）"""
+        return http_client_pool.get(self._emby_url)
 
     async def get_api_key(self) -> str:
         """获取 Emby API Key，优先使用环境变量，否则从数据库获取"""
-        # 优先使用环境变量配置的 API Key
-        if settings.EMBY_API_KEY:
-            return settings.EMBY_API_KEY
+        # 优先使用环境变量或服务器配置的 API Key
+        if self._configured_api_key:
+            return self._configured_api_key
 
         if self._api_key_cache:
             return self._api_key_cache
 
         try:
-            async with aiosqlite.connect(settings.AUTH_DB) as db:
+            async with get_auth_db(self.server_id) as db:
                 async with db.execute(
                     "SELECT AccessToken FROM Tokens_2 WHERE IsActive=1 ORDER BY DateLastActivityInt DESC LIMIT 1"
                 ) as cursor:
@@ -46,17 +75,16 @@ class EmbyService:
 
         try:
             api_key = await self.get_api_key()
-            async with httpx.AsyncClient() as client:
-                resp = await client.get(
-                    f"{settings.EMBY_URL}/emby/Users",
-                    params={"api_key": api_key},
-                    timeout=10
-                )
-                if resp.status_code == 200:
-                    users = resp.json()
-                    if users:
-                        self._user_id_cache = users[0]["Id"]
-                        return self._user_id_cache
+            client = self._client()
+            resp = await client.get(
+                f"{self._emby_url}/emby/Users",
+                params={"api_key": api_key}
+            )
+            if resp.status_code == 200:
+                users = resp.json()
+                if users:
+                    self._user_id_cache = users[0]["Id"]
+                    return self._user_id_cache
         except Exception as e:
             print(f"Error getting user ID: {e}")
         return ""
@@ -68,101 +96,297 @@ class EmbyService:
             if not api_key:
                 return {}
 
-            async with httpx.AsyncClient() as client:
-                resp = await client.get(
-                    f"{settings.EMBY_URL}/emby/Users/{user_id}",
-                    params={"api_key": api_key},
-                    timeout=10
-                )
-                if resp.status_code == 200:
-                    return resp.json()
+            client = self._client()
+            resp = await client.get(
+                f"{self._emby_url}/emby/Users/{user_id}",
+                params={"api_key": api_key}
+            )
+            if resp.status_code == 200:
+                return resp.json()
         except Exception as e:
             print(f"Error getting user info for {user_id}: {e}")
         return {}
 
     async def get_item_info(self, item_id: str) -> dict:
         """获取媒体项目信息（包含海报等）"""
-        if item_id in self._item_info_cache:
-            return self._item_info_cache[item_id]
+        item_id = str(item_id)
+        info = await self._item_info_cache.get_or_load(item_id, lambda: self._load_item_info(item_id))
+        return info or {}
 
+    async def _load_item_info(self, item_id: str):
+        """内存缓存未命中时的加载：先查磁盘缓存，再请求 Emby"""
+        stored = await self._read_item_store([item_id])
+        if item_id in stored:
+            return stored[item_id]
+        info = await self._fetch_item_info(item_id)
+        if info is not MISSING:
+            await self._write_item_store({item_id: info})
+        return info
+
+    async def _load_items_info(self, item_ids: list[str]) -> dict[str, dict | None]:
+        """批量加载：先查磁盘缓存，剩余的分批请求 Emby"""
+        result: dict[str, dict | None] = await self._read_item_store(item_ids)
+        missing = [item_id for item_id in item_ids if item_id not in result]
+        if missing:
+            fetched = await self._fetch_items_info(missing)
+            await self._write_item_store(fetched)
+            result.update(fetched)
+        return result
+
+    async def _read_item_store(self, item_ids: list[str]) -> dict[str, dict]:
+        """读取磁盘缓存，超过内存缓存有效期的条目照常返回并在后台重新获取"""
+        if self._item_store is None:
+            return {}
+        stored = await self._item_store.get_many(self._emby_url, item_ids)
+        now = time.time()
+        stale = [item_id for item_id, (_, updated_at) in stored.items() if now - updated_at > settings.ITEM_CACHE_TTL]
+        if stale:
+            self._spawn(self._revalidate_items(stale))
+        return {item_id: info for item_id, (info, _) in stored.items()}
+
+    async def _write_item_store(self, items: dict[str, dict | None]):
+        """写入磁盘缓存，已不存在的项目从磁盘删除
+
+        与磁盘中旧条目相比内容版本（DateModified / 图片标签）变化的项目，同时删除
+        其旧图片标签对应的图片缓存
+        """
+        if self._item_store is None:
+            return
+        changed = await self._item_store.put_many(
+            self._emby_url, {item_id: info for item_id, info in items.items() if info is not None}
+        )
+        for item_id, info in items.items():
+            if info is None:
+                await self._item_store.delete(self._emby_url, item_id)
+        removed = changed + [item_id for item_id, info in items.items() if info is None]
+        if removed:
+            # image_cache 依赖本模块，在这里导入避免循环引用
+            from services.image_cache import image_cache_service
+            await image_cache_service.invalidate_items(removed, self.server_id)
+
+    async def _revalidate_items(self, item_ids: list[str]):
+        """重新获取磁盘缓存中的旧条目，更新内存和磁盘缓存
+
+        内存条目总是替换为新获取的信息；内容版本变化的项目由 _write_item_store
+        清理旧图片缓存
+        """
+        item_ids = [item_id for item_id in item_ids if item_id not in self._revalidating]
+        if not item_ids:
+            return
+        self._revalidating.update(item_ids)
+        try:
+            fetched = await self._fetch_items_info(item_ids)
+            for item_id, info in fetched.items():
+                self._item_info_cache.set(item_id, info)
+            await self._write_item_store(fetched)
+        finally:
+            self._revalidating.difference_update(item_ids)
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    async def warm_item_cache(self):
+        """从磁盘缓存预热内存缓存（启动时在后台执行）"""
+        if self._item_store is None:
+            return
+        try:
+            stored = await self._item_store.recent(self._emby_url, settings.ITEM_CACHE_MAX_SIZE)
+            now = time.time()
+            stale = []
+            for item_id, (info, updated_at) in stored.items():
+                self._item_info_cache.set(item_id, info)
+                if now - updated_at > settings.ITEM_CACHE_TTL:
+                    stale.append(item_id)
+            print(f"[ItemCache] 已从磁盘预热 {len(stored)} 条项目信息，{len(stale)} 条需要重新获取")
+            if stale:
+                await self._revalidate_items(stale)
+        except Exception as e:
+            print(f"[ItemCache] 预热项目信息缓存失败: {e}")
+
+    def start_cache_warmup(self):
+        """在后台启动缓存预热"""
+        self._spawn(self.warm_item_cache())
+
+    async def close(self):
+        """取消后台任务（应用关闭时调用）"""
+        tasks = list(self._background_tasks)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _fetch_item_info(self, item_id: str):
+        """请求单个项目信息，项目不存在返回 None，请求失败返回 MISSING"""
         try:
             api_key = await self.get_api_key()
             user_id = await self.get_user_id()
             if not api_key or not user_id:
-                return {}
+                return MISSING
 
-            async with httpx.AsyncClient() as client:
-                resp = await client.get(
-                    f"{settings.EMBY_URL}/emby/Users/{user_id}/Items/{item_id}",
-                    params={
-                        "api_key": api_key,
-                        "Fields": "SeriesInfo,ImageTags,SeriesPrimaryImageTag,PrimaryImageAspectRatio,Overview,BackdropImageTags"
-                    },
-                    timeout=10
-                )
-                if resp.status_code == 200:
-                    info = resp.json()
-                    self._item_info_cache[item_id] = info
-                    # 限制缓存大小
-                    if len(self._item_info_cache) > settings.ITEM_CACHE_MAX_SIZE:
-                        keys = list(self._item_info_cache.keys())[:settings.ITEM_CACHE_EVICT_COUNT]
-                        for k in keys:
-                            del self._item_info_cache[k]
-                    return info
+            client = self._client()
+            resp = await client.get(
+                f"{self._emby_url}/emby/Users/{user_id}/Items/{item_id}",
+                params={
+                    "api_key": api_key,
+                    "Fields": ITEM_INFO_FIELDS
+                }
+            )
+            if resp.status_code == 200:
+                return resp.json()
+            if resp.status_code in (400, 404):
+                return None
         except Exception as e:
             print(f"Error getting item info for {item_id}: {e}")
-        return {}
+        return MISSING
+
+    def get_cache_stats(self) -> dict:
+        """获取项目信息缓存统计"""
+        stats = self._item_info_cache.stats()
+        if self._item_store is not None:
+            stats["disk"] = self._item_store.stats()
+        return stats
+
+    def clear_item_cache(self):
+        """清空项目信息缓存"""
+        self._item_info_cache.invalidate()
 
-    async def get_poster(self, item_id: str, max_height: int = 300, max_width: int = 200) -> tuple[bytes, str]:
-        """获取海报图片，返回 (图片数据, content_type)"""
+    async def get_items_info(self, item_ids: list[str], include_series: bool = True) -> dict[str, dict]:
+        """批量获取媒体项目信息
+
+        去重后先查缓存，未命中的通过 /Users/{id}/Items?Ids=... 分批并发获取；
+        include_series 为 True 时再批量获取单集所属剧集的信息。
+
+        Returns:
+            {item_id: info}，获取失败的项目不在结果中
+        """
+        ids = [str(i) for i in item_ids if i]
+        result = await self._item_info_cache.get_or_load_many(ids, self._load_items_info)
+
+        if include_series:
+            series_ids = [
+                info["SeriesId"] for info in result.values()
+                if info.get("SeriesId") and info["SeriesId"] not in result
+            ]
+            if series_ids:
+                result.update(await self.get_items_info(series_ids, include_series=False))
+
+        return result
+
+    async def _fetch_items_info(self, item_ids: list[str]) -> dict[str, dict | None]:
+        """分批并发请求项目信息
+
+        Returns:
+            {item_id: info}；请求成功但结果中没有的项目值为 None（视为不存在），
+            请求失败的批次不出现在结果中
+        """
+        api_key = await self.get_api_key()
+        user_id = await self.get_user_id()
+        if not api_key or not user_id:
+            return {}
+
+        batch_size = settings.EMBY_BATCH_SIZE
+        batches = [item_ids[i:i + batch_size] for i in range(0, len(item_ids), batch_size)]
+        semaphore = asyncio.Semaphore(settings.EMBY_BATCH_CONCURRENCY)
+        result = {}
+
+        client = self._client()
+
+        async def fetch_batch(batch: list[str]):
+            async with semaphore:
+                try:
+                    resp = await client.get(
+                        f"{self._emby_url}/emby/Users/{user_id}/Items",
+                        params={
+                            "api_key": api_key,
+                            "Ids": ",".join(batch),
+                            "Fields": ITEM_INFO_FIELDS
+                        }
+                    )
+                    if resp.status_code == 200:
+                        found = {}
+                        for info in resp.json().get("Items", []):
+                            item_id = str(info.get("Id", ""))
+                            if item_id:
+                                found[item_id] = info
+                        for item_id in batch:
+                            result[item_id] = found.get(item_id)
+                except Exception as e:
+                    print(f"Error getting items info ({len(batch)} items): {e}")
+
+        await asyncio.gather(*(fetch_batch(batch) for batch in batches))
+
+        return result
+
+    async def get_poster(self, item_id: str, max_height: int = 300, max_width: int = 200, tag: str | None = None) -> tuple[bytes, str]:
+        """获取海报图片，返回 (图片数据, content_type)；tag 为图片标签，可让 Emby 命中自身的图片缓存"""
         try:
             api_key = await self.get_api_key()
             if not api_key:
                 return b"", "image/jpeg"
 
-            async with httpx.AsyncClient() as client:
-                resp = await client.get(
-                    f"{settings.EMBY_URL}/emby/Items/{item_id}/Images/Primary",
-                    params={
-                        "api_key": api_key,
-                        "maxHeight": max_height,
-                        "maxWidth": max_width,
-                        "quality": 90
-                    },
-                    timeout=15
-                )
-                if resp.status_code == 200:
-                    return resp.content, resp.headers.get("content-type", "image/jpeg")
+            client = self._client()
+            resp = await client.get(
+                f"{self._emby_url}/emby/Items/{item_id}/Images/Primary",
+                params={
+                    "api_key": api_key,
+                    "maxHeight": max_height,
+                    "maxWidth": max_width,
+                    "quality": 90,
+                    **({"tag": tag} if tag else {})
+                }
+            )
+            if resp.status_code == 200:
+                return resp.content, resp.headers.get("content-type", "image/jpeg")
         except Exception as e:
             print(f"Error fetching poster for {item_id}: {e}")
 
         return b"", "image/jpeg"
 
-    async def get_backdrop(self, item_id: str, max_height: int = 720, max_width: int = 1280) -> tuple[bytes, str]:
+    async def get_backdrop(self, item_id: str, max_height: int = 720, max_width: int = 1280, tag: str | None = None) -> tuple[bytes, str]:
         """获取背景图(横版)，返回 (图片数据, content_type)"""
         try:
             api_key = await self.get_api_key()
             if not api_key:
                 return b"", "image/jpeg"
 
-            async with httpx.AsyncClient() as client:
-                resp = await client.get(
-                    f"{settings.EMBY_URL}/emby/Items/{item_id}/Images/Backdrop",
-                    params={
-                        "api_key": api_key,
-                        "maxHeight": max_height,
-                        "maxWidth": max_width,
-                        "quality": 90
-                    },
-                    timeout=15
-                )
-                if resp.status_code == 200:
-                    return resp.content, resp.headers.get("content-type", "image/jpeg")
+            client = self._client()
+            resp = await client.get(
+                f"{self._emby_url}/emby/Items/{item_id}/Images/Backdrop",
+                params={
+                    "api_key": api_key,
+                    "maxHeight": max_height,
+                    "maxWidth": max_width,
+                    "quality": 90,
+                    **({"tag": tag} if tag else {})
+                }
+            )
+            if resp.status_code == 200:
+                return resp.content, resp.headers.get("content-type", "image/jpeg")
         except Exception as e:
             print(f"Error fetching backdrop for {item_id}: {e}")
 
         return b"", "image/jpeg"
 
+    def image_url(self, kind: str, item_id: str, series: bool = False) -> str:
+        """本服务代理图片的 URL（kind 为 poster / backdrop），非默认服务器附带 server_id
+
+        series 为 True 时由代理接口在服务端把单集解析为所属剧集，无需事先获取项目信息。
+        """
+        query = {}
+        if series:
+            query["series"] = "1"
+        if self.server_id:
+            query["server_id"] = self.server_id
+        url = f"/api/{kind}/{item_id}"
+        return f"{url}?{urlencode(query)}" if query else url
+
+    async def resolve_image_item(self, item_id: str) -> str:
+        """单集返回所属剧集的 ID，其他项目返回自身（项目信息走缓存）"""
+        info = await self.get_item_info(item_id)
+        return info.get("SeriesId") or item_id
+
     def get_poster_url(self, item_id: str, item_type: str, item_info: dict) -> str | None:
         """根据媒体信息获取海报 URL"""
         if not item_info:
@@ -170,9 +394,9 @@ class EmbyService:
 
         # 对于剧集，使用剧集海报；对于电影，使用自身海报
         if item_type == "Episode" and item_info.get("SeriesId"):
-            return f"/api/poster/{item_info['SeriesId']}"
+            return self.image_url("poster", item_info['SeriesId'])
         elif item_info.get("ImageTags", {}).get("Primary"):
-            return f"/api/poster/{item_id}"
+            return self.image_url("poster", item_id)
 
         return None
 
@@ -202,31 +426,32 @@ class EmbyService:
             
             print(f"准备上传封面: content_type={content_type}, size={len(image_data)} bytes")
             
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                # Emby API: POST /Items/{Id}/Images/{Type}
-                # 使用正确的Content-Type确保动图能正常显示
-                response = await client.post(
-                    f"{settings.EMBY_URL}/emby/Items/{library_id}/Images/{image_type}",
-                    params={"api_key": api_key},
-                    data=image_base64,
-                    headers={
-                        "Content-Type": content_type
-                    }
-                )
-                
-                print(f"上传响应: status={response.status_code}, headers={dict(response.headers)}")
-                
-                if response.status_code in [200, 204]:
-                    print(f"成功上传封面到媒体库 {library_id}")
-                    if content_type in ["image/gif", "image/webp"]:
-                        print("⚠️ 动图上传成功！如果Emby中不动，请尝试：")
-                        print("   1. 清除浏览器缓存 (Ctrl+Shift+Delete)")
-                        print("   2. 在Emby中右键媒体库 -> 刷新元数据")
-                        print("   3. 检查Emby客户端是否支持GIF/WebP动画")
-                    return True
-                else:
-                    print(f"上传封面失败: {response.status_code}, {response.text}")
-                    return False
+            client = self._client()
+            # Emby API: POST /Items/{Id}/Images/{Type}
+            # 使用正确的Content-Type确保动图能正常显示
+            response = await client.post(
+                f"{self._emby_url}/emby/Items/{library_id}/Images/{image_type}",
+                params={"api_key": api_key},
+                data=image_base64,
+                headers={
+                    "Content-Type": content_type
+                },
+                timeout=60.0
+            )
+
+            print(f"上传响应: status={response.status_code}, headers={dict(response.headers)}")
+
+            if response.status_code in [200, 204]:
+                print(f"成功上传封面到媒体库 {library_id}")
+                if content_type in ["image/gif", "image/webp"]:
+                    print("⚠️ 动图上传成功！如果Emby中不动，请尝试：")
+                    print("   1. 清除浏览器缓存 (Ctrl+Shift+Delete)")
+                    print("   2. 在Emby中右键媒体库 -> 刷新元数据")
+                    print("   3. 检查Emby客户端是否支持GIF/WebP动画")
+                return True
+            else:
+                print(f"上传封面失败: {response.status_code}, {response.text}")
+                return False
                     
         except Exception as e:
             print(f"上传封面异常: {e}")
@@ -239,10 +464,10 @@ class EmbyService:
 
         # 对于剧集，使用剧集背景图
         if item_type == "Episode" and item_info.get("SeriesId"):
-            return f"/api/backdrop/{item_info['SeriesId']}"
+            return self.image_url("backdrop", item_info['SeriesId'])
         # 检查是否有 Backdrop 图片
         elif item_info.get("BackdropImageTags") and len(item_info.get("BackdropImageTags", [])) > 0:
-            return f"/api/backdrop/{item_id}"
+            return self.image_url("backdrop", item_id)
 
         return None
 
@@ -271,20 +496,19 @@ class EmbyService:
             if not api_key:
                 return []
 
-            async with httpx.AsyncClient() as client:
-                resp = await client.get(
-                    f"{settings.EMBY_URL}/emby/Sessions",
-                    params={"api_key": api_key},
-                    timeout=10
-                )
-                if resp.status_code == 200:
-                    sessions = resp.json()
-                    playing = []
-                    for session in sessions:
-                        # 只返回正在播放的会话
-                        if session.get("NowPlayingItem"):
-                            playing.append(session)
-                    return playing
+            client = self._client()
+            resp = await client.get(
+                f"{self._emby_url}/emby/Sessions",
+                params={"api_key": api_key}
+            )
+            if resp.status_code == 200:
+                sessions = resp.json()
+                playing = []
+                for session in sessions:
+                    # 只返回正在播放的会话
+                    if session.get("NowPlayingItem"):
+                        playing.append(session)
+                return playing
         except Exception as e:
             print(f"Error getting now playing: {e}")
         return []
@@ -295,27 +519,26 @@ class EmbyService:
         返回用户信息 dict 或 None（验证失败）
         """
         try:
-            async with httpx.AsyncClient() as client:
-                resp = await client.post(
-                    f"{settings.EMBY_URL}/emby/Users/AuthenticateByName",
-                    headers={
-                        "X-Emby-Authorization": 'MediaBrowser Client="Emby Stats", Device="Web", DeviceId="emby-stats", Version="1.0.0"',
-                        "Content-Type": "application/json"
-                    },
-                    json={
-                        "Username": username,
-                        "Pw": password
-                    },
-                    timeout=10
-                )
-                if resp.status_code == 200:
-                    data = resp.json()
-                    return {
-                        "user_id": data.get("User", {}).get("Id"),
-                        "username": data.get("User", {}).get("Name"),
-                        "access_token": data.get("AccessToken"),
-                        "is_admin": data.get("User", {}).get("Policy", {}).get("IsAdministrator", False)
-                    }
+            client = self._client()
+            resp = await client.post(
+                f"{self._emby_url}/emby/Users/AuthenticateByName",
+                headers={
+                    "X-Emby-Authorization": 'MediaBrowser Client="Emby Stats", Device="Web", DeviceId="emby-stats", Version="1.0.0"',
+                    "Content-Type": "application/json"
+                },
+                json={
+                    "Username": username,
+                    "Pw": password
+                }
+            )
+            if resp.status_code == 200:
+                data = resp.json()
+                return {
+                    "user_id": data.get("User", {}).get("Id"),
+                    "username": data.get("User", {}).get("Name"),
+                    "access_token": data.get("AccessToken"),
+                    "is_admin": data.get("User", {}).get("Policy", {}).get("IsAdministrator", False)
+                }
         except Exception as e:
             print(f"Error authenticating user: {e}")
         return None
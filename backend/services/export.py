@@ -0,0 +1,191 @@
+"""
+播放记录导出服务
+按筛选条件流式导出 PlaybackActivity 原始记录（NDJSON / CSV / Parquet）。
+
+记录以键集分页（keyset pagination）逐页读取：每页按上一页最后一行的
+(DateCreated, rowid) 继续，页与页之间归还连接池的连接。无论导出 1 千行还是
+1 千万行，内存中只保留一页数据，每页的查询代价也不随导出深度增长。
+
+播放记录库有 DateCreated 索引时按 (DateCreated, rowid) 排序；没有索引时按 rowid
+排序（Playback Reporting 按时间顺序插入，rowid 与时间顺序基本一致），避免每页都
+全表排序。
+"""
+import csv
+import io
+import json
+from typing import AsyncIterator, Optional
+
+from config import settings
+from database import get_playback_db, local_datetime
+from name_mappings import name_mapping_service
+from services.users import user_service
+
+# Parquet 需要 pyarrow，未安装时不支持该格式
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# 输出列（名称, SQL 表达式）
+BASE_COLUMNS = [
+    ("time", local_datetime("DateCreated")),
+    ("date_created", "DateCreated"),
+    ("user_id", "UserId"),
+    ("item_id", "ItemId"),
+    ("item_name", "ItemName"),
+    ("item_type", "ItemType"),
+    ("client", "ClientName"),
+    ("device", "DeviceName"),
+    ("playback_method", "PlaybackMethod"),
+    ("play_duration", "PlayDuration"),
+    ("pause_duration", "PauseDuration"),
+    ("remote_address", "RemoteAddress"),
+]
+# enrich 时追加的列
+ENRICH_COLUMNS = ["username", "client_display", "device_display"]
+
+
+def export_columns(enrich: bool) -> list[str]:
+    return [name for name, _ in BASE_COLUMNS] + (ENRICH_COLUMNS if enrich else [])
+
+
+async def has_date_index(server_id: Optional[str]) -> bool:
+    """播放记录表是否有以 DateCreated 开头的索引"""
+    async with get_playback_db(server_id) as db:
+        async with db.execute("PRAGMA index_list('PlaybackActivity')") as cursor:
+            indexes = [row[1] for row in await cursor.fetchall()]
+        for name in indexes:
+            async with db.execute(f"PRAGMA index_info('{name}')") as cursor:
+                columns = await cursor.fetchall()
+            if columns and columns[0][2] == "DateCreated":
+                return True
+    return False
+
+
+async def iter_playback_pages(
+    server_id: Optional[str],
+    where_clause: str,
+    params: list,
+    enrich: bool = False,
+    limit: Optional[int] = None,
+    page_size: Optional[int] = None,
+) -> AsyncIterator[list[dict]]:
+    """按时间顺序逐页产出匹配筛选条件的播放记录
+
+    Args:
+        where_clause / params: build_filter_conditions 的结果
+        enrich: 是否追加用户名和名称映射后的客户端 / 设备名
+        limit: 最多导出的行数，None 表示不限
+        page_size: 每页行数，默认 EXPORT_PAGE_SIZE
+    """
+    page_size = page_size or settings.EXPORT_PAGE_SIZE
+    by_date = await has_date_index(server_id)
+    user_map = await user_service.get_user_map(server_id) if enrich else None
+    select = ", ".join(expr for _, expr in BASE_COLUMNS)
+    order = "DateCreated, rowid" if by_date else "rowid"
+
+    last_key: Optional[tuple] = None
+    exported = 0
+    while limit is None or exported < limit:
+        size = page_size if limit is None else min(page_size, limit - exported)
+        if last_key is None:
+            keyset, keyset_params = "", []
+        elif by_date:
+            keyset, keyset_params = " AND (DateCreated, rowid) > (?, ?)", list(last_key)
+        else:
+            keyset, keyset_params = " AND rowid > ?", [last_key[1]]
+
+        # 每页单独借出连接，长时间的导出不会一直占用连接池
+        async with get_playback_db(server_id) as db:
+            async with db.execute(f"""
+                SELECT {select}, rowid
+                FROM PlaybackActivity
+                WHERE {where_clause}{keyset}
+                ORDER BY {order}
+                LIMIT ?
+            """, params + keyset_params + [size]) as cursor:
+                rows = await cursor.fetchall()
+        if not rows:
+            break
+
+        page = []
+        for row in rows:
+            record = {name: row[i] for i, (name, _) in enumerate(BASE_COLUMNS)}
+            if enrich:
+                record["username"] = user_service.match_username(record["user_id"] or "", user_map)
+                record["client_display"] = name_mapping_service.map_client_name(record["client"])
+                record["device_display"] = name_mapping_service.map_device_name(record["device"])
+            page.append(record)
+        yield page
+
+        exported += len(rows)
+        last_key = (rows[-1][1], rows[-1][-1])
+        if len(rows) < size:
+            break
+
+
+async def stream_ndjson(pages: AsyncIterator[list[dict]]) -> AsyncIterator[bytes]:
+    async for page in pages:
+        yield "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in page).encode("utf-8")
+
+
+async def stream_csv(pages: AsyncIterator[list[dict]], columns: list[str]) -> AsyncIterator[bytes]:
+    # 带 BOM，Excel 打开时能正确识别 UTF-8
+    buffer = io.StringIO()
+    buffer.write("\ufeff")
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    async for page in pages:
+        writer.writerows([record[name] for name in columns] for record in page)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """收集 ParquetWriter 写出的字节，每写完一页取走一次"""
+
+    def __init__(self):
+        self._chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _parquet_schema(columns: list[str]):
+    integer_columns = {"play_duration", "pause_duration"}
+    return pa.schema([(name, pa.int64() if name in integer_columns else pa.string()) for name in columns])
+
+
+async def stream_parquet(pages: AsyncIterator[list[dict]], columns: list[str]) -> AsyncIterator[bytes]:
+    """每页写成一个 row group"""
+    schema = _parquet_schema(columns)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    try:
+        async for page in pages:
+            table = pa.Table.from_pydict({name: [record[name] for record in page] for name in columns}, schema=schema)
+            writer.write_table(table)
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
@@ -0,0 +1,80 @@
+"""
+HTTP 客户端池
+按服务器地址复用长连接的 httpx.AsyncClient，避免每次请求都重新握手
+"""
+import asyncio
+import logging
+from typing import Optional
+
+import httpx
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+# HTTP/2 需要 h2 包，未安装时退回 HTTP/1.1 keep-alive
+try:
+    import h2  # noqa: F401
+    H2_AVAILABLE = True
+except ImportError:
+    H2_AVAILABLE = False
+
+
+class HttpClientPool:
+    """共享 AsyncClient 池
+
+    每个 base_url 对应一个客户端，连接数上限、keep-alive 和超时均来自配置。
+    客户端与创建它的事件循环绑定，循环变化（例如脚本中多次 asyncio.run）时重新创建。
+    """
+
+    def __init__(self):
+        self._clients: dict[str, tuple[httpx.AsyncClient, asyncio.AbstractEventLoop]] = {}
+
+    def _create_client(self, proxy: Optional[str] = None) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            http2=settings.EMBY_HTTP2 and H2_AVAILABLE,
+            proxies=proxy or None,
+            limits=httpx.Limits(
+                max_connections=settings.EMBY_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.EMBY_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=settings.EMBY_HTTP_KEEPALIVE_EXPIRY,
+            ),
+            timeout=httpx.Timeout(
+                settings.EMBY_HTTP_TIMEOUT,
+                connect=settings.EMBY_HTTP_CONNECT_TIMEOUT,
+            ),
+        )
+
+    def get(self, base_url: Optional[str] = None, proxy: Optional[str] = None) -> httpx.AsyncClient:
+        """获取指定服务器地址的共享客户端（默认使用 EMBY_URL），使用代理时按代理地址区分"""
+        key = (base_url or settings.EMBY_URL).rstrip("/")
+        if proxy:
+            key = f"{key}|{proxy}"
+        loop = asyncio.get_running_loop()
+
+        entry = self._clients.get(key)
+        if entry is not None:
+            client, client_loop = entry
+            if client_loop is loop and not client.is_closed:
+                return client
+
+        client = self._create_client(proxy)
+        self._clients[key] = (client, loop)
+        return client
+
+    async def close(self):
+        """关闭所有客户端（应用关闭时调用）"""
+        entries = list(self._clients.values())
+        self._clients.clear()
+        loop = asyncio.get_running_loop()
+        for client, client_loop in entries:
+            if client_loop is not loop:
+                continue
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"关闭 HTTP 客户端失败: {e}")
+
+
+# 单例实例
+http_client_pool = HttpClientPool()
@@ -0,0 +1,430 @@
+"""
+图片代理缓存服务
+缓存从 Emby 代理的海报和背景图，按 (项目ID, 图片类型, 图片标签, maxWidth, maxHeight, 输出格式)
+索引，图片文件按内容 SHA-256 存放（相同内容只存一份），总大小超过上限时按最近访问时间淘汰。
+
+图片标签来自项目信息缓存，Emby 中图片更新后标签变化，自然命中新的缓存键。
+可选地将图片转码为 WebP / AVIF（仅在浏览器 Accept 支持时），AVIF 需要 pillow-avif-plugin。
+"""
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from PIL import Image
+
+from config import settings
+from services.emby import EmbyService
+from services.server_registry import get_emby_service
+
+logger = logging.getLogger(__name__)
+
+# AVIF 编码需要 pillow-avif-plugin
+try:
+    import pillow_avif  # noqa: F401
+    AVIF_AVAILABLE = True
+except ImportError:
+    AVIF_AVAILABLE = False
+
+# 访问时间的最小更新间隔（秒），避免每次命中都写索引
+TOUCH_INTERVAL = 60
+
+FORMAT_MIME = {
+    "webp": "image/webp",
+    "avif": "image/avif",
+}
+
+
+@dataclass
+class CachedImage:
+    content: bytes
+    content_type: str
+    etag: str
+    cached: bool = True
+
+
+class ImageCache:
+    """磁盘图片缓存（SQLite 索引 + 按内容哈希命名的文件）"""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._disabled = False
+        self._total_bytes = 0
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self._conn is not None or self._disabled:
+            return self._conn
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            conn = sqlite3.connect(os.path.join(self.directory, "index.db"), check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS Images (
+                    cache_key TEXT PRIMARY KEY,
+                    sha256 TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    content_type TEXT NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_Images_sha256 ON Images(sha256)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_Images_accessed ON Images(accessed_at)")
+            conn.commit()
+            row = conn.execute("SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT sha256, size FROM Images)").fetchone()
+            self._total_bytes = row[0]
+            self._conn = conn
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"图片缓存不可用，直接代理 Emby 图片 ({self.directory}): {e}")
+            self._disabled = True
+        return self._conn
+
+    def _blob_path(self, sha256: str) -> str:
+        return os.path.join(self.directory, sha256[:2], sha256)
+
+    def get(self, cache_key: str) -> Optional[tuple[str, str, int]]:
+        """查询索引，返回 (sha256, content_type, size)，不读取文件"""
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return None
+            try:
+                row = conn.execute(
+                    "SELECT sha256, content_type, size, accessed_at FROM Images WHERE cache_key = ?",
+                    (cache_key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                now = time.time()
+                if now - row[3] > TOUCH_INTERVAL:
+                    conn.execute("UPDATE Images SET accessed_at = ? WHERE cache_key = ?", (now, cache_key))
+                    conn.commit()
+                return row[0], row[1], row[2]
+            except sqlite3.Error as e:
+                logger.warning(f"读取图片缓存索引失败: {e}")
+                return None
+
+    def read(self, sha256: str) -> Optional[bytes]:
+        """读取图片文件，文件丢失时删除对应索引"""
+        try:
+            with open(self._blob_path(sha256), "rb") as f:
+                return f.read()
+        except OSError:
+            self._forget(sha256)
+            return None
+
+    def _forget(self, sha256: str):
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return
+            try:
+                row = conn.execute("SELECT size FROM Images WHERE sha256 = ? LIMIT 1", (sha256,)).fetchone()
+                conn.execute("DELETE FROM Images WHERE sha256 = ?", (sha256,))
+                conn.commit()
+                if row:
+                    self._total_bytes -= row[0]
+            except sqlite3.Error as e:
+                logger.warning(f"删除图片缓存索引失败: {e}")
+
+    def put(self, cache_key: str, content: bytes, content_type: str) -> str:
+        """写入图片，返回内容哈希"""
+        sha256 = hashlib.sha256(content).hexdigest()
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return sha256
+            path = self._blob_path(sha256)
+            try:
+                is_new_blob = conn.execute(
+                    "SELECT 1 FROM Images WHERE sha256 = ? LIMIT 1", (sha256,)
+                ).fetchone() is None
+                if is_new_blob or not os.path.exists(path):
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    tmp_path = f"{path}.{os.getpid()}.tmp"
+                    with open(tmp_path, "wb") as f:
+                        f.write(content)
+                    os.replace(tmp_path, path)
+
+                old = conn.execute("SELECT sha256 FROM Images WHERE cache_key = ?", (cache_key,)).fetchone()
+                conn.execute(
+                    """
+                    INSERT INTO Images (cache_key, sha256, size, content_type, accessed_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(cache_key) DO UPDATE SET
+                        sha256 = excluded.sha256,
+                        size = excluded.size,
+                        content_type = excluded.content_type,
+                        accessed_at = excluded.accessed_at
+                    """,
+                    (cache_key, sha256, len(content), content_type, time.time())
+                )
+                conn.commit()
+                if is_new_blob:
+                    self._total_bytes += len(content)
+                if old and old[0] != sha256:
+                    self._release_blob(conn, old[0])
+                if self._total_bytes > self.max_bytes:
+                    self._evict(conn)
+            except (sqlite3.Error, OSError) as e:
+                logger.warning(f"写入图片缓存失败: {e}")
+        return sha256
+
+    def _release_blob(self, conn: sqlite3.Connection, sha256: str):
+        """没有索引引用的文件直接删除"""
+        if conn.execute("SELECT 1 FROM Images WHERE sha256 = ? LIMIT 1", (sha256,)).fetchone():
+            return
+        path = self._blob_path(sha256)
+        try:
+            self._total_bytes -= os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _evict(self, conn: sqlite3.Connection):
+        """按最近访问时间淘汰，直到总大小降到上限的 90%"""
+        target = self.max_bytes * 0.9
+        while self._total_bytes > target:
+            rows = conn.execute(
+                "SELECT cache_key, sha256 FROM Images ORDER BY accessed_at LIMIT 100"
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                break
+            conn.executemany("DELETE FROM Images WHERE cache_key = ?", [(row[0],) for row in rows])
+            conn.commit()
+            for sha256 in {row[1] for row in rows}:
+                self._release_blob(conn, sha256)
+
+    def delete_items(self, item_ids: list[str], server_id: Optional[str] = None):
+        """删除项目的所有图片缓存（缓存键以 item_key_prefix 开头）"""
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return
+            try:
+                released = set()
+                for item_id in item_ids:
+                    # ';' 是 ':' 的下一个字符，按主键范围查找该项目的全部缓存键
+                    prefix = item_key_prefix(item_id, server_id)
+                    bounds = (prefix, prefix[:-1] + ";")
+                    released.update(row[0] for row in conn.execute(
+                        "SELECT sha256 FROM Images WHERE cache_key >= ? AND cache_key < ?", bounds
+                    ))
+                    conn.execute("DELETE FROM Images WHERE cache_key >= ? AND cache_key < ?", bounds)
+                conn.commit()
+                for sha256 in released:
+                    self._release_blob(conn, sha256)
+            except sqlite3.Error as e:
+                logger.warning(f"删除图片缓存失败: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = 0
+            if self._conn is not None:
+                try:
+                    entries = self._conn.execute("SELECT COUNT(*) FROM Images").fetchone()[0]
+                except sqlite3.Error:
+                    pass
+        return {
+            "enabled": not self._disabled,
+            "entries": entries,
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._conn.close()
+                except sqlite3.Error:
+                    pass
+                self._conn = None
+
+
+def _transcode(content: bytes, fmt: str) -> Optional[bytes]:
+    """将图片转码为 WebP / AVIF，失败返回 None"""
+    try:
+        with Image.open(io.BytesIO(content)) as img:
+            if img.mode not in ("RGB", "RGBA"):
+                img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+            out = io.BytesIO()
+            img.save(out, format=fmt.upper(), quality=settings.IMAGE_CACHE_QUALITY)
+            return out.getvalue()
+    except Exception as e:
+        logger.warning(f"图片转码为 {fmt} 失败: {e}")
+        return None
+
+
+class ImageCacheService:
+    """海报 / 背景图代理缓存"""
+
+    def __init__(self):
+        self._cache: Optional[ImageCache] = None
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.transcoded = 0
+
+    @property
+    def cache(self) -> Optional[ImageCache]:
+        if not settings.IMAGE_CACHE_ENABLED:
+            return None
+        if self._cache is None:
+            self._cache = ImageCache(settings.IMAGE_CACHE_DIR, settings.IMAGE_CACHE_MAX_BYTES)
+        return self._cache
+
+    def negotiate_format(self, accept: str) -> Optional[str]:
+        """根据配置和 Accept 请求头决定输出格式，None 表示保持 Emby 原格式"""
+        fmt = settings.IMAGE_CACHE_TRANSCODE.lower()
+        if fmt == "avif" and not AVIF_AVAILABLE:
+            fmt = "webp"
+        if fmt not in FORMAT_MIME or FORMAT_MIME[fmt] not in (accept or ""):
+            return None
+        return fmt
+
+    @staticmethod
+    async def _image_tag(emby: EmbyService, item_id: str, image_type: str) -> Optional[str]:
+        info = await emby.get_item_info(item_id)
+        if image_type == "Backdrop":
+            tags = info.get("BackdropImageTags") or []
+            return tags[0] if tags else None
+        return (info.get("ImageTags") or {}).get(image_type)
+
+    async def get_image(
+        self,
+        item_id: str,
+        image_type: str,
+        max_width: int,
+        max_height: int,
+        accept: str = "",
+        server_id: Optional[str] = None,
+    ) -> Optional[CachedImage]:
+        """获取图片（优先使用磁盘缓存），图片不存在返回 None"""
+        emby = get_emby_service(server_id)
+        fmt = self.negotiate_format(accept)
+        cache = self.cache
+        tag = await self._image_tag(emby, item_id, image_type) if cache else None
+
+        # 没有图片标签时无法判断缓存是否过期，直接代理
+        if cache is None or not tag:
+            self.misses += 1
+            return await self._fetch(emby, item_id, image_type, max_width, max_height, tag, fmt, cached=False)
+
+        cache_key = f"{item_key_prefix(item_id, emby.server_id)}{image_type}:{tag}:{max_width}x{max_height}:{fmt or 'orig'}"
+        hit = await asyncio.to_thread(cache.get, cache_key)
+        if hit is not None:
+            sha256, content_type, _ = hit
+            content = await asyncio.to_thread(cache.read, sha256)
+            if content is not None:
+                self.hits += 1
+                return CachedImage(content, content_type, _etag(sha256))
+
+        future = self._inflight.get(cache_key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[cache_key] = future
+        try:
+            image = await self._fetch(emby, item_id, image_type, max_width, max_height, tag, fmt, cached=True)
+            if image is not None:
+                await asyncio.to_thread(cache.put, cache_key, image.content, image.content_type)
+            future.set_result(image)
+            return image
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(cache_key, None)
+
+    async def _fetch(
+        self,
+        emby: EmbyService,
+        item_id: str,
+        image_type: str,
+        max_width: int,
+        max_height: int,
+        tag: Optional[str],
+        fmt: Optional[str],
+        cached: bool,
+    ) -> Optional[CachedImage]:
+        if image_type == "Backdrop":
+            content, content_type = await emby.get_backdrop(item_id, max_height, max_width, tag=tag)
+        else:
+            content, content_type = await emby.get_poster(item_id, max_height, max_width, tag=tag)
+        if not content:
+            return None
+
+        if fmt:
+            converted = await asyncio.to_thread(_transcode, content, fmt)
+            if converted is not None and len(converted) < len(content):
+                content, content_type = converted, FORMAT_MIME[fmt]
+                self.transcoded += 1
+
+        return CachedImage(content, content_type, _etag(hashlib.sha256(content).hexdigest()), cached)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        stats = {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "not_modified": self.not_modified,
+            "transcoded": self.transcoded,
+            "transcode_format": self.negotiate_format(",".join(FORMAT_MIME.values())),
+        }
+        if self._cache is not None:
+            stats["disk"] = self._cache.stats()
+        return stats
+
+    async def invalidate_items(self, item_ids: list[str], server_id: Optional[str] = None):
+        """项目内容变化或已删除时删除其图片缓存（旧标签的缓存键不会再被使用）"""
+        cache = self.cache
+        if cache is not None and item_ids:
+            await asyncio.to_thread(cache.delete_items, item_ids, server_id)
+
+    def close(self):
+        if self._cache is not None:
+            self._cache.close()
+            self._cache = None
+
+
+def item_key_prefix(item_id: str, server_id: Optional[str] = None) -> str:
+    """项目图片缓存键的前缀，非默认服务器加上 server_id（不同服务器的项目 ID 可能重复）"""
+    if server_id:
+        return f"{server_id}:{item_id}:"
+    return f"{item_id}:"
+
+
+def _etag(sha256: str) -> str:
+    """强 ETag（内容哈希）"""
+    return f'"{sha256[:32]}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """判断 If-None-Match 是否命中"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    # 弱比较：W/ 前缀不影响匹配
+    return any(value.removeprefix("W/") == etag for value in candidates)
+
+
+# 单例实例
+image_cache_service = ImageCacheService()
@@ -0,0 +1,233 @@
+"""
+项目信息缓存模块
+LRU + TTL 内存缓存，支持未命中结果缓存、按字节数限制容量和并发请求合并
+"""
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+
+from config import settings
+
+# 用于区分“未缓存”和“已缓存的不存在结果”
+MISSING = object()
+
+
+class _Entry:
+    __slots__ = ("value", "expires_at", "size")
+
+    def __init__(self, value: Optional[dict], expires_at: float, size: int):
+        self.value = value
+        self.expires_at = expires_at
+        self.size = size
+
+
+class ItemInfoCache:
+    """项目信息缓存
+
+    - 按最近使用顺序淘汰（LRU），条目数和总字节数任一超限都会淘汰最旧条目
+    - 正常结果和不存在的结果（value 为 None）分别使用不同的 TTL
+    - 同一 key 的并发加载只发起一次请求（single-flight）
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        ttl: float,
+        negative_ttl: float,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._bytes = 0
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.coalesced = 0
+
+    @staticmethod
+    def _estimate_size(key: str, value: Optional[dict]) -> int:
+        """估算条目占用的字节数（按 JSON 序列化长度计算）"""
+        if value is None:
+            return len(key) + 64
+        try:
+            return len(key) + len(json.dumps(value, ensure_ascii=False, default=str).encode("utf-8"))
+        except (TypeError, ValueError):
+            return len(key) + 1024
+
+    def get(self, key: str) -> Any:
+        """读取缓存，未命中或已过期返回 MISSING，缓存的不存在结果返回 None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+        if entry.expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return MISSING
+
+        self._entries.move_to_end(key)
+        if entry.value is None:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+        return entry.value
+
+    def set(self, key: str, value: Optional[dict]):
+        """写入缓存，value 为 None 表示项目不存在"""
+        ttl = self.ttl if value is not None else self.negative_ttl
+        if ttl <= 0:
+            return
+        size = self._estimate_size(key, value)
+        if size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = _Entry(value, time.monotonic() + ttl, size)
+        self._bytes += size
+
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
+
+    def invalidate(self, key: Optional[str] = None):
+        """删除指定条目，key 为 None 时清空缓存"""
+        if key is None:
+            self._entries.clear()
+            self._bytes = 0
+        elif key in self._entries:
+            self._remove(key)
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Optional[dict]:
+        """读取缓存，未命中时调用 loader 加载
+
+        loader 返回 dict 表示成功，None 表示项目不存在（写入未命中缓存），
+        返回 MISSING 表示暂时失败（不缓存）。并发请求同一 key 时共享同一次加载。
+        """
+        value = self.get(key)
+        if value is not MISSING:
+            return value
+
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            value = await asyncio.shield(future)
+            return None if value is MISSING else value
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+            if value is not MISSING:
+                self.set(key, value)
+            future.set_result(value)
+        except BaseException as e:
+            future.set_exception(e)
+            # 没有其他等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        return None if value is MISSING else value
+
+    async def get_or_load_many(
+        self,
+        keys: list[str],
+        loader: Callable[[list[str]], Awaitable[dict[str, Any]]],
+    ) -> dict[str, dict]:
+        """批量读取缓存，未命中的 key 一次性交给 loader 加载
+
+        loader 返回 {key: dict 或 None}，None 表示确认不存在；没有出现在结果中的 key
+        视为暂时失败。正在被其他请求加载的 key 直接等待其结果。
+
+        Returns:
+            {key: info}，不存在或加载失败的 key 不在结果中
+        """
+        result: dict[str, dict] = {}
+        waiting: dict[str, asyncio.Future] = {}
+        owned: dict[str, asyncio.Future] = {}
+
+        for key in dict.fromkeys(keys):
+            value = self.get(key)
+            if value is not MISSING:
+                if value is not None:
+                    result[key] = value
+            elif key in self._inflight:
+                self.coalesced += 1
+                waiting[key] = self._inflight[key]
+            else:
+                future = asyncio.get_running_loop().create_future()
+                self._inflight[key] = future
+                owned[key] = future
+
+        if owned:
+            try:
+                loaded = await loader(list(owned))
+            except BaseException as e:
+                for future in owned.values():
+                    future.set_exception(e)
+                    future.exception()
+                raise
+            finally:
+                for key in owned:
+                    self._inflight.pop(key, None)
+
+            for key, future in owned.items():
+                value = loaded.get(key, MISSING)
+                if value is not MISSING:
+                    self.set(key, value)
+                    if value is not None:
+                        result[key] = value
+                future.set_result(value)
+
+        for key, future in waiting.items():
+            try:
+                value = await asyncio.shield(future)
+            except Exception:
+                continue
+            if value is not MISSING and value is not None:
+                result[key] = value
+
+        return result
+
+    def stats(self) -> dict:
+        """缓存统计信息"""
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "coalesced": self.coalesced,
+            "inflight": len(self._inflight),
+        }
+
+
+def create_item_cache() -> ItemInfoCache:
+    """按配置创建项目信息缓存"""
+    return ItemInfoCache(
+        max_entries=settings.ITEM_CACHE_MAX_SIZE,
+        max_bytes=settings.ITEM_CACHE_MAX_BYTES,
+        ttl=settings.ITEM_CACHE_TTL,
+        negative_ttl=settings.ITEM_CACHE_NEGATIVE_TTL,
+    )
@@ -0,0 +1,275 @@
+"""
+项目信息持久化缓存
+位于内存缓存之后的磁盘缓存层（/config 下的 SQLite 键值库），容器重启后不必重新
+向 Emby 请求所有项目信息。
+
+条目带格式版本号（请求字段变化时自动作废），并记录由 DateModified / ImageTags
+计算出的内容版本。重新获取到的信息版本变化时覆盖旧条目，并由 EmbyService
+清理该项目旧图片标签的图片缓存。磁盘读写失败只记录日志，不影响正常请求。
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+
+
+def content_version(info: dict) -> str:
+    """根据 DateModified 和图片标签计算项目信息的内容版本"""
+    parts = {
+        "modified": info.get("DateModified") or "",
+        "image_tags": info.get("ImageTags") or {},
+        "backdrop_tags": info.get("BackdropImageTags") or [],
+        "series_tag": info.get("SeriesPrimaryImageTag") or "",
+    }
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+class ItemInfoStore:
+    """SQLite 键值存储，按 (服务器地址, 项目ID) 保存项目信息"""
+
+    def __init__(self, path: str, fields: str):
+        self.path = path
+        # 请求字段不同，缓存内容也不同，一并计入格式版本
+        self.format_version = f"{FORMAT_VERSION}:{hashlib.sha1(fields.encode()).hexdigest()[:8]}"
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._disabled = False
+        self.hits = 0
+        self.misses = 0
+        self.changed = 0
+        self.errors = 0
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self._conn is not None or self._disabled:
+            return self._conn
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ItemInfo (
+                    server TEXT NOT NULL,
+                    item_id TEXT NOT NULL,
+                    format_version TEXT NOT NULL,
+                    content_version TEXT NOT NULL,
+                    data TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL,
+                    PRIMARY KEY (server, item_id)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_ItemInfo_accessed ON ItemInfo(server, accessed_at)")
+            conn.commit()
+            self._conn = conn
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"项目信息磁盘缓存不可用，仅使用内存缓存 ({self.path}): {e}")
+            self._disabled = True
+        return self._conn
+
+    def _run(self, func, default):
+        """在锁内执行数据库操作，失败时记录日志并返回默认值"""
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return default
+            try:
+                return func(conn)
+            except (sqlite3.Error, OSError, ValueError) as e:
+                self.errors += 1
+                logger.warning(f"项目信息磁盘缓存操作失败: {e}")
+                try:
+                    conn.rollback()
+                except sqlite3.Error:
+                    pass
+                return default
+
+    def _get_many_sync(self, server: str, item_ids: list[str]) -> dict[str, tuple[dict, float]]:
+        max_age = settings.ITEM_CACHE_DISK_TTL
+
+        def query(conn: sqlite3.Connection):
+            now = time.time()
+            result = {}
+            for i in range(0, len(item_ids), 500):
+                chunk = item_ids[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"""
+                    SELECT item_id, data, updated_at FROM ItemInfo
+                    WHERE server = ? AND item_id IN ({placeholders})
+                      AND format_version = ? AND updated_at >= ?
+                    """,
+                    [server, *chunk, self.format_version, now - max_age]
+                ).fetchall()
+                for item_id, data, updated_at in rows:
+                    result[item_id] = (json.loads(data), updated_at)
+            if result:
+                conn.executemany(
+                    "UPDATE ItemInfo SET accessed_at = ? WHERE server = ? AND item_id = ?",
+                    [(now, server, item_id) for item_id in result]
+                )
+                conn.commit()
+            return result
+
+        return self._run(query, {})
+
+    def _put_many_sync(self, server: str, items: dict[str, dict]) -> list[str]:
+        """写入条目，返回内容版本（DateModified / ImageTags）发生变化的项目ID"""
+        def write(conn: sqlite3.Connection):
+            now = time.time()
+            rows = [
+                (server, item_id, self.format_version, content_version(info),
+                 json.dumps(info, ensure_ascii=False), now, now)
+                for item_id, info in items.items()
+            ]
+            changed = []
+            for i in range(0, len(rows), 500):
+                chunk = rows[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                existing = dict(conn.execute(
+                    f"SELECT item_id, content_version FROM ItemInfo WHERE server = ? AND item_id IN ({placeholders})",
+                    [server, *(row[1] for row in chunk)]
+                ).fetchall())
+                changed.extend(
+                    row[1] for row in chunk
+                    if row[1] in existing and existing[row[1]] != row[3]
+                )
+            conn.executemany(
+                """
+                INSERT INTO ItemInfo (server, item_id, format_version, content_version, data, updated_at, accessed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(server, item_id) DO UPDATE SET
+                    format_version = excluded.format_version,
+                    content_version = excluded.content_version,
+                    data = excluded.data,
+                    updated_at = excluded.updated_at,
+                    accessed_at = excluded.accessed_at
+                """,
+                rows
+            )
+            conn.commit()
+            return changed
+
+        return self._run(write, [])
+
+    def _delete_sync(self, server: str, item_id: Optional[str]):
+        def delete(conn: sqlite3.Connection):
+            if item_id is None:
+                conn.execute("DELETE FROM ItemInfo WHERE server = ?", (server,))
+            else:
+                conn.execute("DELETE FROM ItemInfo WHERE server = ? AND item_id = ?", (server, item_id))
+            conn.commit()
+
+        self._run(delete, None)
+
+    def _recent_sync(self, server: str, limit: int) -> dict[str, tuple[dict, float]]:
+        """读取最近使用的条目，并清理过期、旧格式和超出容量的条目"""
+        max_age = settings.ITEM_CACHE_DISK_TTL
+        max_entries = settings.ITEM_CACHE_DISK_MAX_ENTRIES
+
+        def query(conn: sqlite3.Connection):
+            now = time.time()
+            conn.execute(
+                "DELETE FROM ItemInfo WHERE format_version != ? OR updated_at < ?",
+                (self.format_version, now - max_age)
+            )
+            conn.execute(
+                """
+                DELETE FROM ItemInfo WHERE server = ? AND item_id NOT IN (
+                    SELECT item_id FROM ItemInfo WHERE server = ?
+                    ORDER BY accessed_at DESC LIMIT ?
+                )
+                """,
+                (server, server, max_entries)
+            )
+            conn.commit()
+            rows = conn.execute(
+                "SELECT item_id, data, updated_at FROM ItemInfo WHERE server = ? ORDER BY accessed_at DESC LIMIT ?",
+                (server, limit)
+            ).fetchall()
+            return {item_id: (json.loads(data), updated_at) for item_id, data, updated_at in rows}
+
+        return self._run(query, {})
+
+    async def get_many(self, server: str, item_ids: list[str]) -> dict[str, tuple[dict, float]]:
+        """批量读取未过期的条目，返回 {item_id: (info, 写入时间戳)}"""
+        if self._disabled or not item_ids:
+            return {}
+        result = await asyncio.to_thread(self._get_many_sync, server, item_ids)
+        self.hits += len(result)
+        self.misses += len(item_ids) - len(result)
+        return result
+
+    async def put_many(self, server: str, items: dict[str, dict]) -> list[str]:
+        """批量写入条目，返回内容与磁盘中旧条目相比发生变化的项目ID"""
+        if self._disabled or not items:
+            return []
+        changed = await asyncio.to_thread(self._put_many_sync, server, items)
+        self.changed += len(changed)
+        return changed
+
+    async def delete(self, server: str, item_id: Optional[str] = None):
+        """删除指定条目，item_id 为 None 时删除该服务器的所有条目"""
+        if self._disabled:
+            return
+        await asyncio.to_thread(self._delete_sync, server, item_id)
+
+    async def recent(self, server: str, limit: int) -> dict[str, tuple[dict, float]]:
+        """读取最近使用的条目（用于启动预热），返回格式同 get_many"""
+        if self._disabled:
+            return {}
+        return await asyncio.to_thread(self._recent_sync, server, limit)
+
+    def stats(self) -> dict:
+        """磁盘缓存统计信息"""
+        return {
+            "enabled": not self._disabled,
+            "path": self.path,
+            "hits": self.hits,
+            "misses": self.misses,
+            "changed": self.changed,
+            "errors": self.errors,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._conn.close()
+                except sqlite3.Error:
+                    pass
+                self._conn = None
+
+
+_stores: dict[str, ItemInfoStore] = {}
+
+
+def get_item_store(fields: str) -> Optional[ItemInfoStore]:
+    """获取共享的磁盘缓存实例，未启用时返回 None"""
+    if not settings.ITEM_CACHE_PERSIST:
+        return None
+    store = _stores.get(fields)
+    if store is None:
+        store = ItemInfoStore(settings.ITEM_CACHE_DB, fields)
+        _stores[fields] = store
+    return store
+
+
+def close_item_stores():
+    """关闭所有磁盘缓存连接（应用关闭时调用）"""
+    stores = list(_stores.values())
+    _stores.clear()
+    for store in stores:
+        store.close()
@@ -0,0 +1,129 @@
+"""
+多服务器汇总查询
+统计接口的 server_id 传 "all" 时，对每个已配置服务器并发执行同一查询再合并结果。
+单个服务器有独立的超时，慢或不可用的服务器不会拖住整个请求，只在结果中标记状态。
+
+不同服务器的用户 ID 和项目 ID 带上服务器前缀（"服务器ID:用户ID"）区分，前端回传的
+用户筛选和项目 ID 也按前缀拆分到各服务器。
+"""
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from config import settings
+from config_storage import config_storage
+
+logger = logging.getLogger(__name__)
+
+# server_id 取此值时表示汇总全部服务器
+ALL_SERVERS = "all"
+# 未配置多服务器时，环境变量默认服务器的命名空间
+DEFAULT_NAMESPACE = "default"
+
+
+def is_all_servers(server_id: Optional[str]) -> bool:
+    """是否为全部服务器汇总模式"""
+    return server_id == ALL_SERVERS
+
+
+def list_servers() -> list[tuple[Optional[str], str]]:
+    """已配置的服务器 [(server_id, 名称)]，未配置时返回环境变量默认服务器"""
+    servers = config_storage.get("servers", {})
+    if not servers:
+        return [(None, "默认服务器")]
+    return [(server_id, server.get("name") or server_id[:8]) for server_id, server in servers.items()]
+
+
+def namespace(server_id: Optional[str]) -> str:
+    """服务器在用户 ID 前缀中使用的名字"""
+    return server_id or DEFAULT_NAMESPACE
+
+
+def namespaced_user_id(server_id: Optional[str], user_id: str) -> str:
+    return f"{namespace(server_id)}:{user_id}"
+
+
+def namespaced_item_id(server_id: Optional[str], item_id: str) -> str:
+    return f"{namespace(server_id)}:{item_id}"
+
+
+def split_item_ids(item_ids: list[str]) -> dict[Optional[str], list[str]]:
+    """把带服务器前缀的项目 ID 按服务器分组 {server_id: [项目ID]}，前缀不属于任何服务器的忽略"""
+    servers = {namespace(server_id): server_id for server_id, _ in list_servers()}
+    grouped: dict[Optional[str], list[str]] = {}
+    for value in item_ids:
+        prefix, _, item_id = value.partition(":")
+        if item_id and prefix in servers:
+            grouped.setdefault(servers[prefix], []).append(item_id)
+    return grouped
+
+
+def namespaced_username(server_name: str, username: str) -> str:
+    return f"{username}@{server_name}"
+
+
+def split_user_filter(users: Optional[list[str]], server_id: Optional[str]) -> tuple[Optional[list[str]], bool]:
+    """把带服务器前缀的用户筛选拆到单个服务器
+
+    Returns:
+        (该服务器的用户列表, 是否需要查询该服务器)；没有用户筛选时返回 (None, True)，
+        筛选的用户都不属于该服务器时返回 (None, False)
+    """
+    if not users:
+        return None, True
+    prefix = namespace(server_id) + ":"
+    own = [u[len(prefix):] for u in users if u.startswith(prefix)]
+    return (own, True) if own else (None, False)
+
+
+async def fan_out(
+    func: Callable[[Optional[str]], Awaitable[Any]],
+    timeout: Optional[float] = None,
+) -> tuple[dict[Optional[str], Any], dict[str, dict]]:
+    """对每个服务器并发执行 func(server_id)
+
+    Args:
+        func: 单个服务器的查询，返回 None 表示该服务器被跳过
+        timeout: 单个服务器的超时（秒），默认 AGGREGATE_SERVER_TIMEOUT
+
+    Returns:
+        (成功的结果 {server_id: 结果}, 各服务器状态 {命名空间: {name, status, elapsed_ms[, error]}})，
+        status 为 ok / skipped / timeout / error
+    """
+    timeout = settings.AGGREGATE_SERVER_TIMEOUT if timeout is None else timeout
+    servers = list_servers()
+
+    async def run(server_id: Optional[str]):
+        started = time.perf_counter()
+        result, error = None, None
+        try:
+            result = await asyncio.wait_for(func(server_id), timeout)
+            status = "ok" if result is not None else "skipped"
+        except asyncio.TimeoutError:
+            logger.warning(f"服务器 {namespace(server_id)} 查询超时（{timeout}s），结果中不包含该服务器")
+            status = "timeout"
+        except Exception as e:
+            logger.warning(f"服务器 {namespace(server_id)} 查询失败: {e}")
+            status, error = "error", str(e)
+        return result, status, error, (time.perf_counter() - started) * 1000
+
+    outcomes = await asyncio.gather(*(run(server_id) for server_id, _ in servers))
+
+    results = {}
+    statuses = {}
+    for (server_id, name), (result, status, error, elapsed_ms) in zip(servers, outcomes):
+        if status == "ok":
+            results[server_id] = result
+        statuses[namespace(server_id)] = {
+            "name": name,
+            "status": status,
+            "elapsed_ms": round(elapsed_ms, 1),
+            **({"error": error} if error else {}),
+        }
+    return results, statuses
+
+
+def is_partial(statuses: dict[str, dict]) -> bool:
+    """是否有服务器超时或失败（部分结果）"""
+    return any(s["status"] in ("timeout", "error") for s in statuses.values())
@@ -1,78 +1,183 @@
-"""多平台通知服务"""
+"""多平台通知服务
+
+所有渠道都通过共享的 httpx.AsyncClient 异步发送，不阻塞事件循环。
+多个渠道、同一渠道的多个接收者并发发送：进程内所有通知（webhook worker、报告等）
+共享 NOTIFY_CONCURRENCY 的并发限制，每个渠道的总耗时受 NOTIFY_CHANNEL_TIMEOUT 限制，
+一个渠道卡住不影响其他渠道。
+"""
+import asyncio
+import base64
+import hashlib
+import json
 import logging
-from typing import Optional
-import requests
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Optional
+
 import httpx
 from jinja2 import Template
-import tempfile
-import os
-import json
-from pathlib import Path
+from jinja2.sandbox import SandboxedEnvironment
+
+from config import settings
+from services.http_client import http_client_pool
 
 logger = logging.getLogger(__name__)
 
+# 通知请求使用的共享客户端在连接池中的键（各平台地址不同，不设置 base_url）
+NOTIFY_CLIENT_KEY = "notification"
+
+# 所有 NotificationService 实例共享的并发限制 (信号量, 所属事件循环)
+_semaphore: Optional[tuple[asyncio.Semaphore, asyncio.AbstractEventLoop]] = None
+
+
+def _notify_semaphore() -> asyncio.Semaphore:
+    """获取共享信号量，事件循环变化（例如脚本中多次 asyncio.run）时重新创建"""
+    global _semaphore
+    loop = asyncio.get_running_loop()
+    if _semaphore is None or _semaphore[1] is not loop:
+        _semaphore = (asyncio.Semaphore(settings.NOTIFY_CONCURRENCY), loop)
+    return _semaphore[0]
+
 
 class NotificationService:
-    """统一通知服务（支持Telegram/企业微信/Discord）"""
-    
+    """统一通知服务（支持Telegram/企业微信/Discord/OneBot）"""
+
     def __init__(self, config: dict):
         self.config = config
         self.telegram_config = config.get("telegram", {})
         self.wecom_config = config.get("wecom", {})
         self.discord_config = config.get("discord", {})
         self.onebot_config = config.get("onebot", {})
-    
-    async def send_all(self, title: str, message: str, image_url: Optional[str] = None):
-        """发送到所有配置的平台"""
-        if self.telegram_config.get("token"):
-            await self.send_telegram(title, message, image_url)
-        
-        if self.wecom_config.get("corp_id"):
-            await self.send_wecom(title, message, image_url)
-        
-        if self.discord_config.get("webhook_url"):
-            await self.send_discord(title, message, image_url)
-        
-        if self.onebot_config.get("http_url"):
-            await self.send_onebot(title, message, image_url)
-    
-    async def send_telegram(self, title: str, message: str, image_url: Optional[str] = None):
-        """发送Telegram通知"""
+
+    def _client(self) -> httpx.AsyncClient:
+        """获取通知共享的 HTTP 客户端（由应用生命周期负责关闭）"""
+        return http_client_pool.get(NOTIFY_CLIENT_KEY)
+
+    async def _post(self, url: str, **kwargs) -> httpx.Response:
+        async with _notify_semaphore():
+            return await self._client().post(url, **kwargs)
+
+    async def _get(self, url: str, **kwargs) -> httpx.Response:
+        async with _notify_semaphore():
+            return await self._client().get(url, **kwargs)
+
+    async def _run_channel(self, name: str, coro: Awaitable) -> bool:
+        """执行单个渠道的发送，超时或异常时记录日志并返回 False"""
+        timeout = settings.NOTIFY_CHANNEL_TIMEOUT
+        try:
+            return bool(await asyncio.wait_for(coro, timeout))
+        except asyncio.TimeoutError:
+            logger.error(f"{name} 通知发送超时（{timeout}s）")
+        except Exception as e:
+            logger.error(f"{name} 通知发送失败: {str(e)}")
+        return False
+
+    async def _dispatch(self, jobs: list[tuple[str, Awaitable]]) -> int:
+        """并发执行各渠道的发送，返回发送成功的渠道数"""
+        if not jobs:
+            return 0
+        results = await asyncio.gather(*(self._run_channel(name, coro) for name, coro in jobs))
+        return sum(results)
+
+    def _enabled_channels(self, channels: Optional[dict]) -> dict[str, bool]:
+        """已配置且在 channels 中启用的渠道（channels 为 None 时表示全部）"""
+        configured = {
+            "telegram": bool(self.telegram_config.get("token")),
+            "wecom": bool(self.wecom_config.get("corp_id")),
+            "discord": bool(self.discord_config.get("webhook_url")),
+            "onebot": bool(self.onebot_config.get("http_url")),
+        }
+        return {
+            name: ok and (channels is None or bool(channels.get(name)))
+            for name, ok in configured.items()
+        }
+
+    async def send_all(
+        self, title: str, message: str, image_url: Optional[str] = None, channels: Optional[dict] = None
+    ) -> int:
+        """并发发送到所有配置的平台，返回发送成功的渠道数
+
+        Args:
+            channels: 渠道开关，如 {"telegram": True}；None 表示所有已配置的渠道
+        """
+        enabled = self._enabled_channels(channels)
+        jobs = []
+        if enabled["telegram"]:
+            jobs.append(("Telegram", self.send_telegram(title, message, image_url)))
+        if enabled["wecom"]:
+            jobs.append(("企业微信", self.send_wecom(title, message, image_url)))
+        if enabled["discord"]:
+            jobs.append(("Discord", self.send_discord(title, message, image_url)))
+        if enabled["onebot"]:
+            jobs.append(("OneBot", self.send_onebot(title, message, image_url)))
+        return await self._dispatch(jobs)
+
+    async def send_photo_all(self, photo_bytes: bytes, caption: str, channels: Optional[dict] = None) -> int:
+        """并发发送图片到所有配置的平台，返回发送成功的渠道数"""
+        enabled = self._enabled_channels(channels)
+        jobs = []
+        if enabled["telegram"]:
+            jobs.append(("Telegram", self.send_telegram_photo(photo_bytes, caption)))
+        if enabled["wecom"]:
+            jobs.append(("企业微信", self._send_wecom_photo_bytes(photo_bytes, caption)))
+        if enabled["discord"]:
+            jobs.append(("Discord", self._send_discord_photo_bytes(photo_bytes, caption)))
+        if enabled["onebot"]:
+            jobs.append(("OneBot", self._send_onebot_photo_bytes(photo_bytes, caption)))
+        return await self._dispatch(jobs)
+
+    def _telegram_recipients(self) -> list:
+        return self.telegram_config.get("admins", []) + self.telegram_config.get("users", [])
+
+    async def send_telegram(self, title: str, message: str, image_url: Optional[str] = None) -> bool:
+        """发送Telegram通知（并发发送给所有接收者，任一成功即返回 True）"""
         token = self.telegram_config.get("token")
         if not token:
-            return
-        
-        admins = self.telegram_config.get("admins", [])
-        users = self.telegram_config.get("users", [])
-        all_recipients = admins + users
-        
+            return False
+
+        all_recipients = self._telegram_recipients()
         if not all_recipients:
             logger.warning("Telegram未配置接收者")
-            return
-        
+            return False
+
         full_message = f"<b>{title}</b>\n{message}"
-        
-        for chat_id in all_recipients:
+
+        async def send_one(chat_id) -> bool:
             try:
                 if image_url:
                     # 尝试使用URL直接发送
                     success = await self._send_telegram_photo_url(token, chat_id, image_url, full_message)
-                    
+
                     # 如果URL发送失败，尝试下载后上传文件
                     if not success:
                         logger.info(f"URL发送失败，尝试下载图片后上传")
                         success = await self._send_telegram_photo_file(token, chat_id, image_url, full_message)
-                    
+
                     # 如果都失败，发送纯文本
                     if not success:
                         logger.warning(f"图片发送失败，改为发送纯文本")
-                        await self._send_telegram_text(token, chat_id, full_message)
-                else:
-                    await self._send_telegram_text(token, chat_id, full_message)
-            
+                        success = await self._send_telegram_text(token, chat_id, full_message)
+                    return success
+                return await self._send_telegram_text(token, chat_id, full_message)
+
             except Exception as e:
                 logger.error(f"Telegram通知发送失败: {str(e)}")
-    
+                return False
+
+        results = await asyncio.gather(*(send_one(chat_id) for chat_id in all_recipients))
+        return any(results)
+
+    async def send_telegram_photo(self, photo_bytes: bytes, caption: str) -> bool:
+        """发送图片字节到所有 Telegram 接收者（并发，任一成功即返回 True）"""
+        token = self.telegram_config.get("token")
+        recipients = self._telegram_recipients()
+        if not token or not recipients:
+            return False
+        results = await asyncio.gather(
+            *(self._send_telegram_photo_bytes(token, chat_id, photo_bytes, caption) for chat_id in recipients)
+        )
+        return any(results)
+
     async def _send_telegram_photo_url(self, token: str, chat_id: str, photo_url: str, caption: str) -> bool:
         """通过URL发送Telegram图片"""
         try:
@@ -83,34 +188,31 @@ class NotificationService:
                 "caption": caption,
                 "parse_mode": "HTML",
             }
-            
-            async with httpx.AsyncClient() as client:
-                resp = await client.post(url, data=data, timeout=15)
-            
+
+            resp = await self._post(url, data=data, timeout=15)
+
             if resp.status_code == 200 and resp.json().get("ok"):
                 logger.info(f"Telegram图片(URL)发送成功至 {chat_id}")
                 return True
             else:
                 logger.warning(f"Telegram URL发送失败: {resp.text}")
                 return False
-        
+
         except Exception as e:
             logger.warning(f"Telegram URL发送异常: {str(e)}")
             return False
-    
+
     async def _send_telegram_photo_file(self, token: str, chat_id: str, photo_url: str, caption: str) -> bool:
         """下载图片后通过文件上传方式发送"""
-        temp_file = None
         try:
             # 下载图片
             logger.info(f"开始下载图片: {photo_url}")
-            async with httpx.AsyncClient() as client:
-                resp = await client.get(photo_url, timeout=30)
-            
+            resp = await self._get(photo_url, timeout=30)
+
             if resp.status_code != 200:
                 logger.warning(f"图片下载失败: HTTP {resp.status_code}")
                 return False
-            
+
             # 获取文件扩展名
             content_type = resp.headers.get('Content-Type', '')
             ext = '.jpg'
@@ -120,47 +222,29 @@ class NotificationService:
                 ext = '.jpg'
             elif 'webp' in content_type:
                 ext = '.webp'
-            
-            # 创建临时文件
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=ext)
-            
-            # 写入图片数据
-            temp_file.write(resp.content)
-            temp_file.close()
-            
-            # 通过文件上传发送
+
+            # 直接上传下载到的图片数据
             url = f"https://api.telegram.org/bot{token}/sendPhoto"
-            with open(temp_file.name, 'rb') as photo:
-                files = {'photo': photo}
-                data = {
-                    'chat_id': chat_id,
-                    'caption': caption,
-                    'parse_mode': 'HTML'
-                }
-                
-                async with httpx.AsyncClient() as client:
-                    resp = await client.post(url, data=data, files=files, timeout=30)
-                
-                if resp.status_code == 200 and resp.json().get("ok"):
-                    logger.info(f"Telegram图片(文件)发送成功至 {chat_id}")
-                    return True
-                else:
-                    logger.error(f"Telegram文件上传失败: {resp.text}")
-                    return False
-        
+            files = {'photo': (f"photo{ext}", resp.content, content_type or 'image/jpeg')}
+            data = {
+                'chat_id': chat_id,
+                'caption': caption,
+                'parse_mode': 'HTML'
+            }
+
+            resp = await self._post(url, data=data, files=files, timeout=30)
+
+            if resp.status_code == 200 and resp.json().get("ok"):
+                logger.info(f"Telegram图片(文件)发送成功至 {chat_id}")
+                return True
+            else:
+                logger.error(f"Telegram文件上传失败: {resp.text}")
+                return False
+
         except Exception as e:
             logger.error(f"Telegram文件上传异常: {str(e)}")
             return False
-        
-        finally:
-            # 清理临时文件
-            if temp_file and os.path.exists(temp_file.name):
-                try:
-                    os.unlink(temp_file.name)
-                    logger.debug(f"临时文件已删除: {temp_file.name}")
-                except Exception as e:
-                    logger.warning(f"临时文件删除失败: {str(e)}")
-    
+
     async def _send_telegram_text(self, token: str, chat_id: str, text: str) -> bool:
         """发送Telegram纯文本消息"""
         try:
@@ -171,21 +255,20 @@ class NotificationService:
                 "parse_mode": "HTML",
                 "disable_web_page_preview": True
             }
-            
-            async with httpx.AsyncClient() as client:
-                resp = await client.post(url, data=data, timeout=15)
-            
+
+            resp = await self._post(url, data=data, timeout=15)
+
             if resp.status_code == 200 and resp.json().get("ok"):
                 logger.info(f"Telegram文本发送成功至 {chat_id}")
                 return True
             else:
                 logger.error(f"Telegram文本发送失败: {resp.text}")
                 return False
-        
+
         except Exception as e:
             logger.error(f"Telegram文本发送异常: {str(e)}")
             return False
-    
+
     async def _send_telegram_photo_bytes(self, token: str, chat_id: str, photo_bytes: bytes, caption: str) -> bool:
         """发送图片字节数据到Telegram"""
         try:
@@ -195,67 +278,50 @@ class NotificationService:
                 'chat_id': chat_id,
                 'caption': caption,
             }
-            
-            async with httpx.AsyncClient(timeout=30) as client:
-                resp = await client.post(url, data=data, files=files)
-            
+
+            resp = await self._post(url, data=data, files=files, timeout=30)
+
             if resp.status_code == 200 and resp.json().get("ok"):
                 logger.info(f"Telegram图片发送成功至 {chat_id}")
                 return True
             else:
                 logger.error(f"Telegram图片发送失败: {resp.text}")
                 return False
-        
+
         except Exception as e:
             logger.error(f"Telegram图片发送异常: {str(e)}")
             return False
-    
-    def _send_telegram_photo_file_direct(self, token: str, chat_ids: list, photo_bytes: bytes, caption: str):
-        """直接发送图片字节到多个chat_id"""
-        for chat_id in chat_ids:
-            try:
-                url = f"https://api.telegram.org/bot{token}/sendPhoto"
-                files = {'photo': ('report.png', photo_bytes, 'image/png')}
-                data = {
-                    'chat_id': chat_id,
-                    'caption': caption,
-                }
-                
-                resp = requests.post(url, data=data, files=files, timeout=30)
-                
-                if resp.status_code == 200 and resp.json().get("ok"):
-                    logger.info(f"Telegram图片发送成功至 {chat_id}")
-                else:
-                    logger.error(f"Telegram图片发送失败: {resp.text}")
-            
-            except Exception as e:
-                logger.error(f"Telegram图片发送异常: {str(e)}")
-    
-    def _send_wecom_photo_bytes(self, photo_bytes: bytes, caption: str):
+
+    async def _get_wecom_token(self, proxy_url: str) -> Optional[str]:
+        """获取企业微信 access_token，失败返回 None"""
+        token_res = await self._get(
+            f"{proxy_url}/cgi-bin/gettoken",
+            params={
+                "corpid": self.wecom_config["corp_id"],
+                "corpsecret": self.wecom_config["secret"]
+            },
+            timeout=10
+        )
+        token_data = token_res.json()
+
+        if token_data.get("errcode") != 0:
+            logger.error(f"获取企业微信token失败: {token_data}")
+            return None
+        return token_data["access_token"]
+
+    async def _send_wecom_photo_bytes(self, photo_bytes: bytes, caption: str) -> bool:
         """发送企业微信图片（从字节）"""
         required_fields = ["corp_id", "secret", "agent_id"]
         if not all(self.wecom_config.get(field) for field in required_fields):
             logger.warning("企业微信配置不完整，跳过发送")
             return False
-        
+
         try:
-            # 获取access_token
             proxy_url = self.wecom_config.get("proxy_url", "https://qyapi.weixin.qq.com")
-            token_url = f"{proxy_url}/cgi-bin/gettoken"
-            params = {
-                "corpid": self.wecom_config["corp_id"],
-                "corpsecret": self.wecom_config["secret"]
-            }
-            
-            token_res = requests.get(token_url, params=params, timeout=10)
-            token_data = token_res.json()
-            
-            if token_data.get("errcode") != 0:
-                logger.error(f"获取企业微信token失败: {token_data}")
+            access_token = await self._get_wecom_token(proxy_url)
+            if not access_token:
                 return False
-            
-            access_token = token_data["access_token"]
-            
+
             # 上传图片获取media_id
             upload_url = f"{proxy_url}/cgi-bin/media/upload"
             files = {'media': ('report.png', photo_bytes, 'image/png')}
@@ -263,20 +329,20 @@ class NotificationService:
                 "access_token": access_token,
                 "type": "image"
             }
-            
-            upload_res = requests.post(upload_url, params=upload_params, files=files, timeout=30)
+
+            upload_res = await self._post(upload_url, params=upload_params, files=files, timeout=30)
             upload_data = upload_res.json()
-            
+
             if upload_data.get("errcode") != 0 and "media_id" not in upload_data:
                 logger.error(f"企业微信图片上传失败: {upload_data}")
                 return False
-            
+
             media_id = upload_data["media_id"]
-            
+
             # 发送图片消息
             send_url = f"{proxy_url}/cgi-bin/message/send"
             to_user = self.wecom_config.get("to_user", "@all")
-            
+
             data = {
                 "touser": to_user,
                 "msgtype": "image",
@@ -285,18 +351,18 @@ class NotificationService:
                     "media_id": media_id
                 }
             }
-            
-            send_res = requests.post(
+
+            send_res = await self._post(
                 send_url,
                 params={"access_token": access_token},
                 json=data,
                 timeout=10
             )
-            
+
             send_data = send_res.json()
             if send_data.get("errcode") == 0:
                 logger.info("企业微信图片发送成功")
-                
+
                 # 如果有标题，再发送一条文本消息
                 if caption:
                     text_data = {
@@ -307,84 +373,71 @@ class NotificationService:
                             "content": caption
                         }
                     }
-                    requests.post(
+                    await self._post(
                         send_url,
                         params={"access_token": access_token},
                         json=text_data,
                         timeout=10
                     )
-                
+
                 return True
             else:
                 logger.error(f"企业微信图片消息发送失败: {send_data}")
                 return False
-        
+
         except Exception as e:
             logger.error(f"企业微信图片发送异常: {str(e)}")
             return False
-    
-    def _send_discord_photo_bytes(self, photo_bytes: bytes, caption: str):
+
+    async def _send_discord_photo_bytes(self, photo_bytes: bytes, caption: str) -> bool:
         """发送Discord图片（从字节）"""
         webhook_url = self.discord_config.get("webhook_url")
         if not webhook_url:
             logger.warning("Discord webhook未配置，跳过发送")
             return False
-        
+
         try:
             files = {'file': ('report.png', photo_bytes, 'image/png')}
             payload = {
                 "username": self.discord_config.get("username", "New Emby Stats"),
                 "content": caption
             }
-            
+
             # Discord webhook支持multipart/form-data上传文件
-            response = requests.post(
+            response = await self._post(
                 webhook_url,
                 data={"payload_json": json.dumps(payload)},
                 files=files,
                 timeout=30
             )
-            
+
             if response.status_code in (200, 204):
                 logger.info("Discord图片发送成功")
                 return True
             else:
                 logger.error(f"Discord图片发送失败: {response.status_code} - {response.text}")
                 return False
-        
+
         except Exception as e:
             logger.error(f"Discord图片发送异常: {str(e)}")
             return False
 
-    
-    async def send_wecom(self, title: str, message: str, image_url: Optional[str] = None):
+    async def send_wecom(self, title: str, message: str, image_url: Optional[str] = None) -> bool:
         """发送企业微信通知"""
         required_fields = ["corp_id", "secret", "agent_id"]
         if not all(self.wecom_config.get(field) for field in required_fields):
-            return
-        
+            return False
+
         try:
-            # 获取access_token
             proxy_url = self.wecom_config.get("proxy_url", "https://qyapi.weixin.qq.com")
-            token_url = f"{proxy_url}/cgi-bin/gettoken"
-            params = {
-                "corpid": self.wecom_config["corp_id"],
-                "corpsecret": self.wecom_config["secret"]
-            }
-            
-            async with httpx.AsyncClient() as client:
-                token_res = await client.get(token_url, params=params, timeout=10)
-            token_data = token_res.json()
-            
-            if token_data.get("errcode") != 0:
-                logger.error(f"获取企业微信token失败: {token_data}")
-                return
-            
-            access_token = token_data["access_token"]
+            access_token = await self._get_wecom_token(proxy_url)
+            if not access_token:
+                return False
+
             send_url = f"{proxy_url}/cgi-bin/message/send"
-            
+
             to_user = self.wecom_config.get("to_user", "@all")
-            
+
             # 构建消息
             if image_url:
                 # 图文消息
@@ -414,224 +467,169 @@ class NotificationService:
                         "btntxt": "详情"
                     }
                 }
-            
-            async with httpx.AsyncClient() as client:
-                send_res = await client.post(
-                    send_url,
-                    params={"access_token": access_token},
-                    json=data,
-                    timeout=10
-                )
-            
+
+            send_res = await self._post(
+                send_url,
+                params={"access_token": access_token},
+                json=data,
+                timeout=10
+            )
+
             if send_res.json().get("errcode") == 0:
                 logger.info("企业微信通知发送成功")
-            else:
-                logger.error(f"企业微信消息发送失败: {send_res.json()}")
-        
+                return True
+            logger.error(f"企业微信消息发送失败: {send_res.json()}")
+
         except Exception as e:
             logger.error(f"企业微信通知异常: {str(e)}")
-    
-    async def send_discord(self, title: str, message: str, image_url: Optional[str] = None):
+        return False
+
+    async def send_discord(self, title: str, message: str, image_url: Optional[str] = None) -> bool:
         """发送Discord通知"""
         webhook_url = self.discord_config.get("webhook_url")
         if not webhook_url:
-            return
-        
+            return False
+
         try:
             payload = {
                 "username": self.discord_config.get("username", "Emby通知"),
                 "content": f"**{title}**\n{message}",
                 "avatar_url": self.discord_config.get("avatar_url")
             }
-            
+
             if image_url:
                 payload["embeds"] = [{
                     "image": {"url": image_url},
                     "color": 0x00ff00
                 }]
-            
-            async with httpx.AsyncClient() as client:
-                response = await client.post(webhook_url, json=payload, timeout=10)
-            
+
+            response = await self._post(webhook_url, json=payload, timeout=10)
+
             if response.status_code == 204:
                 logger.info("Discord通知发送成功")
-            else:
-                logger.error(f"Discord通知发送失败: {response.status_code}")
-        
+                return True
+            logger.error(f"Discord通知发送失败: {response.status_code}")
+
         except Exception as e:
             logger.error(f"Discord通知异常: {str(e)}")
-    
-    async def send_onebot(self, title: str, message: str, image_url: Optional[str] = None):
-        """发送OneBot通知（QQ机器人）"""
+        return False
+
+    async def _send_onebot_messages(self, messages: list[tuple[str, dict]], timeout: float) -> bool:
+        """并发发送 OneBot 消息
+
+        Args:
+            messages: [(接口名 send_group_msg / send_private_msg, 请求体)]
+
+        Returns:
+            是否至少有一条发送成功
+        """
         http_url = self.onebot_config.get("http_url")
-        if not http_url:
-            return
-        
         access_token = self.onebot_config.get("access_token", "")
+        headers = {}
+        if access_token:
+            headers["Authorization"] = f"Bearer {access_token}"
+
+        async def send_one(action: str, data: dict) -> bool:
+            target = f"群 {data['group_id']}" if "group_id" in data else f"用户 {data['user_id']}"
+            try:
+                resp = await self._post(f"{http_url}/{action}", json=data, headers=headers, timeout=timeout)
+                if resp.status_code == 200:
+                    logger.info(f"OneBot消息发送成功至{target}")
+                    return True
+                logger.error(f"OneBot消息发送失败（{target}）: {resp.text}")
+            except Exception as e:
+                logger.error(f"OneBot消息发送异常（{target}）: {str(e)}")
+            return False
+
+        results = await asyncio.gather(*(send_one(action, data) for action, data in messages))
+        return any(results)
+
+    def _onebot_targets(self, message) -> list[tuple[str, dict]]:
+        """为每个群和用户构建请求"""
         group_ids = self.onebot_config.get("group_ids", [])
         user_ids = self.onebot_config.get("user_ids", [])
-        
-        if not group_ids and not user_ids:
+        return (
+            [("send_group_msg", {"group_id": group_id, "message": message}) for group_id in group_ids]
+            + [("send_private_msg", {"user_id": user_id, "message": message}) for user_id in user_ids]
+        )
+
+    async def send_onebot(self, title: str, message: str, image_url: Optional[str] = None) -> bool:
+        """发送OneBot通知（QQ机器人）"""
+        if not self.onebot_config.get("http_url"):
+            return False
+
+        # 构建消息内容
+        full_message = f"{title}\n{message}"
+        if image_url:
+            content = [
+                {"type": "text", "data": {"text": full_message}},
+                {"type": "image", "data": {"file": image_url}}
+            ]
+        else:
+            content = full_message
+
+        targets = self._onebot_targets(content)
+        if not targets:
             logger.warning("OneBot未配置接收者")
-            return
-        
-        try:
-            headers = {}
-            if access_token:
-                headers["Authorization"] = f"Bearer {access_token}"
-            
-            # 构建消息内容
-            full_message = f"{title}\n{message}"
-            
-            async with httpx.AsyncClient() as client:
-                # 发送到群组
-                for group_id in group_ids:
-                    try:
-                        if image_url:
-                            # 发送图片
-                            data = {
-                                "group_id": group_id,
-                                "message": [
-                                    {"type": "text", "data": {"text": full_message}},
-                                    {"type": "image", "data": {"file": image_url}}
-                                ]
-                            }
-                        else:
-                            data = {
-                                "group_id": group_id,
-                                "message": full_message
-                            }
-                        
-                        resp = await client.post(
-                            f"{http_url}/send_group_msg",
-                            json=data,
-                            headers=headers,
-                            timeout=15
-                        )
-                        
-                        if resp.status_code == 200:
-                            logger.info(f"OneBot群消息发送成功至群 {group_id}")
-                        else:
-                            logger.error(f"OneBot群消息发送失败: {resp.text}")
-                    
-                    except Exception as e:
-                        logger.error(f"OneBot群消息发送异常: {str(e)}")
-                
-                # 发送到私聊
-                for user_id in user_ids:
-                    try:
-                        if image_url:
-                            data = {
-                                "user_id": user_id,
-                                "message": [
-                                    {"type": "text", "data": {"text": full_message}},
-                                    {"type": "image", "data": {"file": image_url}}
-                                ]
-                            }
-                        else:
-                            data = {
-                                "user_id": user_id,
-                                "message": full_message
-                            }
-                        
-                        resp = await client.post(
-                            f"{http_url}/send_private_msg",
-                            json=data,
-                            headers=headers,
-                            timeout=15
-                        )
-                        
-                        if resp.status_code == 200:
-                            logger.info(f"OneBot私聊消息发送成功至用户 {user_id}")
-                        else:
-                            logger.error(f"OneBot私聊消息发送失败: {resp.text}")
-                    
-                    except Exception as e:
-                        logger.error(f"OneBot私聊消息发送异常: {str(e)}")
-        
-        except Exception as e:
-            logger.error(f"OneBot通知异常: {str(e)}")
-    
-    def _send_onebot_photo_bytes(self, photo_bytes: bytes, caption: str):
+            return False
+        return await self._send_onebot_messages(targets, timeout=15)
+
+    async def _send_onebot_photo_bytes(self, photo_bytes: bytes, caption: str) -> bool:
         """发送OneBot图片（从字节）"""
-        http_url = self.onebot_config.get("http_url")
-        if not http_url:
+        if not self.onebot_config.get("http_url"):
             logger.warning("OneBot HTTP URL未配置，跳过发送")
             return False
-        
-        access_token = self.onebot_config.get("access_token", "")
-        group_ids = self.onebot_config.get("group_ids", [])
-        user_ids = self.onebot_config.get("user_ids", [])
-        
-        try:
-            headers = {}
-            if access_token:
-                headers["Authorization"] = f"Bearer {access_token}"
-            
-            # 将图片转为base64
-            import base64
-            image_base64 = base64.b64encode(photo_bytes).decode('utf-8')
-            
-            # 发送到群组
-            for group_id in group_ids:
-                try:
-                    data = {
-                        "group_id": group_id,
-                        "message": [
-                            {"type": "text", "data": {"text": caption}} if caption else None,
-                            {"type": "image", "data": {"file": f"base64://{image_base64}"}}
-                        ]
-                    }
-                    # 移除 None 项
-                    data["message"] = [m for m in data["message"] if m]
-                    
-                    resp = requests.post(
-                        f"{http_url}/send_group_msg",
-                        json=data,
-                        headers=headers,
-                        timeout=30
-                    )
-                    
-                    if resp.status_code == 200:
-                        logger.info(f"OneBot群图片发送成功至群 {group_id}")
-                    else:
-                        logger.error(f"OneBot群图片发送失败: {resp.text}")
-                
-                except Exception as e:
-                    logger.error(f"OneBot群图片发送异常: {str(e)}")
-            
-            # 发送到私聊
-            for user_id in user_ids:
-                try:
-                    data = {
-                        "user_id": user_id,
-                        "message": [
-                            {"type": "text", "data": {"text": caption}} if caption else None,
-                            {"type": "image", "data": {"file": f"base64://{image_base64}"}}
-                        ]
-                    }
-                    data["message"] = [m for m in data["message"] if m]
-                    
-                    resp = requests.post(
-                        f"{http_url}/send_private_msg",
-                        json=data,
-                        headers=headers,
-                        timeout=30
-                    )
-                    
-                    if resp.status_code == 200:
-                        logger.info(f"OneBot私聊图片发送成功至用户 {user_id}")
-                    else:
-                        logger.error(f"OneBot私聊图片发送失败: {resp.text}")
-                
-                except Exception as e:
-                    logger.error(f"OneBot私聊图片发送异常: {str(e)}")
-            
-            return True
-        
-        except Exception as e:
-            logger.error(f"OneBot图片发送异常: {str(e)}")
-            return False
+
+        # 将图片转为base64
+        image_base64 = base64.b64encode(photo_bytes).decode('utf-8')
+        content = [{"type": "image", "data": {"file": f"base64://{image_base64}"}}]
+        if caption:
+            content.insert(0, {"type": "text", "data": {"text": caption}})
+
+        return await self._send_onebot_messages(self._onebot_targets(content), timeout=30)
+
+
+class TemplateCache:
+    """编译后的通知模板缓存
+
+    所有模板共用一个沙箱环境（模板由用户编辑，禁止访问对象内部属性），
+    按模板源码的哈希缓存编译结果，同一模板只解析编译一次。
+    """
+
+    def __init__(self, max_entries: int = 64):
+        self.env = SandboxedEnvironment()
+        self.max_entries = max_entries
+        self._templates: OrderedDict[str, Template] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, source: str) -> Template:
+        """获取编译后的模板"""
+        key = hashlib.sha1(source.encode("utf-8")).hexdigest()
+        with self._lock:
+            template = self._templates.get(key)
+            if template is not None:
+                self._templates.move_to_end(key)
+                self.hits += 1
+                return template
+        # 编译失败时抛出异常，不写入缓存
+        template = self.env.from_string(source)
+        with self._lock:
+            self.misses += 1
+            self._templates[key] = template
+            while len(self._templates) > self.max_entries:
+                self._templates.popitem(last=False)
+        return template
+
+    def invalidate(self):
+        """清空缓存（模板保存后调用，释放旧模板）"""
+        with self._lock:
+            self._templates.clear()
+
+
+# 单例实例
+template_cache = TemplateCache()
 
 
 class NotificationTemplateService:
@@ -648,8 +646,8 @@ class NotificationTemplateService:
             return context.get("action", "通知"), str(context)
         
         try:
-            title_template = Template(template.get("title", "{{ action }}"))
-            message_template = Template(template.get("text", ""))
+            title_template = template_cache.get(template.get("title", "{{ action }}"))
+            message_template = template_cache.get(template.get("text", ""))
             
             title = title_template.render(context)
             message = message_template.render(context)
@@ -4,7 +4,7 @@
 """
 from datetime import datetime, timedelta
 from typing import Dict, Any, List, Optional
-from database import get_playback_db, get_count_expr
+from database import get_playback_db, get_count_expr, date_range_conditions
 from services.users import user_service
 from services.emby import EmbyService
 import logging
@@ -57,6 +57,10 @@ class ReportService:
         period: str
     ) -> Dict[str, Any]:
         """生成报告核心逻辑"""
+        # 报告按 UTC 日期统计，边界换算成 DateCreated 范围比较以便走索引
+        date_conditions, date_params = date_range_conditions(start_date, end_date, offset=0)
+        date_where = " AND ".join(date_conditions)
+
         async with get_playback_db() as db:
             count_expr = get_count_expr()
             
@@ -66,10 +70,10 @@ class ReportService:
                     {count_expr} as play_count,
                     COALESCE(SUM(PlayDuration), 0) as total_duration
                 FROM PlaybackActivity
-                WHERE date(DateCreated) >= date(?) AND date(DateCreated) <= date(?)
+                WHERE {date_where}
             """
             
-            async with db.execute(total_query, [start_date, end_date]) as cursor:
+            async with db.execute(total_query, date_params) as cursor:
                 row = await cursor.fetchone()
                 total_plays = int(row[0] or 0)
                 total_duration = int(row[1] or 0)
@@ -84,7 +88,7 @@ class ReportService:
                     {count_expr} as play_count,
                     COALESCE(SUM(PlayDuration), 0) / 3600.0 as hours
                 FROM PlaybackActivity
-                WHERE date(DateCreated) >= date(?) AND date(DateCreated) <= date(?)
+                WHERE {date_where}
                 GROUP BY ItemId
                 ORDER BY play_count DESC
                 LIMIT 5
@@ -92,7 +96,7 @@ class ReportService:
             
             top_content = []
             emby_service = EmbyService()
-            async with db.execute(top_content_query, [start_date, end_date]) as cursor:
+            async with db.execute(top_content_query, date_params) as cursor:
                 async for row in cursor:
                     item_id = row[2]
                     item_type = row[1] or "未知"
@@ -134,7 +138,7 @@ class ReportService:
                     {count_expr} as play_count,
                     COALESCE(SUM(PlayDuration), 0) / 3600.0 as hours
                 FROM PlaybackActivity
-                WHERE date(DateCreated) >= date(?) AND date(DateCreated) <= date(?)
+                WHERE {date_where}
                   AND UserId IS NOT NULL
                 GROUP BY UserId
                 ORDER BY play_count DESC
@@ -143,7 +147,7 @@ class ReportService:
             
             top_users = []
             user_map = await user_service.get_user_map()
-            async with db.execute(top_users_query, [start_date, end_date]) as cursor:
+            async with db.execute(top_users_query, date_params) as cursor:
                 async for row in cursor:
                     user_id = row[0]
                     username = user_service.match_username(user_id, user_map)
@@ -159,14 +163,14 @@ class ReportService:
                     ItemType,
                     {count_expr} as play_count
                 FROM PlaybackActivity
-                WHERE date(DateCreated) >= date(?) AND date(DateCreated) <= date(?)
+                WHERE {date_where}
                   AND ItemType IS NOT NULL
                 GROUP BY ItemType
                 ORDER BY play_count DESC
             """
             
             type_stats = []
-            async with db.execute(type_stats_query, [start_date, end_date]) as cursor:
+            async with db.execute(type_stats_query, date_params) as cursor:
                 async for row in cursor:
                     type_stats.append({
                         "type": row[0] or "未知",
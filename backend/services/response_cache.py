@@ -0,0 +1,242 @@
+"""
+统计接口响应缓存
+同样的筛选条件（如"最近 30 天，全部用户"）在多个标签页和刷新时会重复计算，
+这里按 (接口, 规范化后的查询参数, 服务器) 缓存接口返回值。
+
+每个条目记录计算时的数据版本（PlaybackActivity 的最大 rowid、数据库和 WAL 文件的
+修改时间、用户库修改时间）。版本变化时同步重新计算，新播放记录立即体现在响应中；
+版本未变但超过有效期不久的条目仍会直接返回，同时在后台重新计算
+（stale-while-revalidate）。
+
+多服务器汇总（server_id=all）的数据版本由各服务器的版本组成，超时或出错的服务器
+在版本中记为不可用，恢复后版本随之变化。部分结果（返回值中 partial 为 True）只在
+版本中记录了不可用的服务器时写入缓存，否则说明版本正常而查询失败，不缓存。
+"""
+import asyncio
+import functools
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Optional
+
+from config import settings
+from database import get_server_config, get_playback_db
+from services.multi_server import is_all_servers, list_servers
+
+logger = logging.getLogger(__name__)
+
+# 逗号分隔的列表参数，顺序和重复项不影响结果
+LIST_PARAMS = {"users", "clients", "devices", "item_types", "playback_methods"}
+
+# 汇总模式下无法获取版本的服务器在版本中的标记
+VERSION_UNAVAILABLE = "unavailable"
+
+
+def _file_version(path: str) -> tuple:
+    try:
+        st = os.stat(path)
+        return st.st_mtime_ns, st.st_size
+    except OSError:
+        return ()
+
+
+async def data_version(server_id: Optional[str]) -> tuple:
+    """计算服务器播放数据的版本，任一部分变化都会使缓存的响应失效"""
+    if is_all_servers(server_id):
+        # 单个服务器使用较短的超时，超时或出错时记为不可用，不影响其他服务器
+        versions = await asyncio.gather(*(
+            asyncio.wait_for(data_version(sid), settings.AGGREGATE_VERSION_TIMEOUT) for sid, _ in list_servers()
+        ), return_exceptions=True)
+        return tuple(
+            (VERSION_UNAVAILABLE, type(v).__name__) if isinstance(v, BaseException) else v
+            for v in versions
+        )
+    config = get_server_config(server_id)
+    playback_db = config["playback_db"]
+    async with get_playback_db(server_id) as db:
+        async with db.execute("SELECT MAX(rowid) FROM PlaybackActivity") as cursor:
+            max_rowid = (await cursor.fetchone())[0]
+    return (
+        max_rowid,
+        _file_version(playback_db),
+        # Playback Reporting 以 WAL 模式写入，更新已有记录时只有 -wal 文件变化
+        _file_version(playback_db + "-wal"),
+        _file_version(config["users_db"]),
+    )
+
+
+def normalize_params(params: dict) -> dict:
+    """规范化查询参数：去掉空值，列表参数去重排序"""
+    normalized = {}
+    for name, value in params.items():
+        if value is None or value == "":
+            continue
+        if name in LIST_PARAMS and isinstance(value, str):
+            value = sorted({v.strip() for v in value.split(",") if v.strip()})
+            if not value:
+                continue
+        normalized[name] = value
+    return normalized
+
+
+def _has_unavailable(version: tuple) -> bool:
+    """汇总模式的版本中是否有不可用的服务器"""
+    return any(isinstance(v, tuple) and v[:1] == (VERSION_UNAVAILABLE,) for v in version)
+
+
+class _Entry:
+    __slots__ = ("value", "version", "created_at")
+
+    def __init__(self, value: Any, version: tuple, created_at: float):
+        self.value = value
+        self.version = version
+        self.created_at = created_at
+
+
+class ResponseCache:
+    """带数据版本校验的 LRU 响应缓存"""
+
+    def __init__(self, max_entries: int, ttl: float, stale_ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries: OrderedDict[str, _Entry] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._background_tasks: set[asyncio.Task] = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.refreshes = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def _set(self, key: str, value: Any, version: tuple, created_at: float):
+        self._entries[key] = _Entry(value, version, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def _compute(self, key: str, version: tuple, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """计算并写入缓存，同一 key 的并发计算只执行一次"""
+        future = self._inflight.get(key)
+        if future is not None:
+            self.coalesced += 1
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            started = time.monotonic()
+            value = await compute()
+            if not (isinstance(value, dict) and value.get("partial")) or _has_unavailable(version):
+                self._set(key, value, version, started)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            # 没有其他等待者时避免 "exception was never retrieved" 警告
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def _refresh(self, key: str, version: tuple, compute: Callable[[], Awaitable[Any]]):
+        try:
+            await self._compute(key, version, compute)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"后台刷新响应缓存失败 ({key}): {e}")
+
+    async def get_or_compute(self, key: str, version: tuple, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """读取缓存
+
+        数据版本变化时同步计算；版本未变但超过有效期时在 stale_ttl 内返回旧值并在后台刷新
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            age = time.monotonic() - entry.created_at
+            if entry.version == version and age <= self.ttl:
+                self.hits += 1
+                return entry.value
+            if entry.version == version and age <= self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                if key not in self._inflight:
+                    self.refreshes += 1
+                    task = asyncio.create_task(self._refresh(key, version, compute))
+                    self._background_tasks.add(task)
+                    task.add_done_callback(self._background_tasks.discard)
+                return entry.value
+
+        self.misses += 1
+        return await self._compute(key, version, compute)
+
+    def invalidate(self):
+        """清空缓存（名称映射等影响输出的配置变化时调用）"""
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """缓存统计信息"""
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "enabled": settings.RESPONSE_CACHE_ENABLED,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+            "coalesced": self.coalesced,
+            "refreshes": self.refreshes,
+            "evictions": self.evictions,
+            "errors": self.errors,
+        }
+
+
+response_cache = ResponseCache(
+    max_entries=settings.RESPONSE_CACHE_MAX_SIZE,
+    ttl=settings.RESPONSE_CACHE_TTL,
+    stale_ttl=settings.RESPONSE_CACHE_STALE,
+)
+
+
+async def cached_call(key_parts: list, server_id: Optional[str], compute: Callable[[], Awaitable[Any]]) -> Any:
+    """按 key_parts 和当天日期缓存 compute() 的结果，数据版本取自 server_id 对应的服务器"""
+    if not settings.RESPONSE_CACHE_ENABLED:
+        return await compute()
+    try:
+        version = await data_version(server_id)
+    except Exception as e:
+        logger.debug(f"无法获取数据版本，跳过响应缓存: {e}")
+        return await compute()
+
+    key = json.dumps(
+        [*key_parts, datetime.now().strftime("%Y-%m-%d")],
+        sort_keys=True, ensure_ascii=False, default=str
+    )
+    return await response_cache.get_or_compute(key, version, compute)
+
+
+def cached_response(func):
+    """缓存 GET 接口返回值的装饰器（放在 @router.get 之下）
+
+    缓存键包含接口名、规范化后的查询参数和当天日期（days 参数按当前日期计算起点）。
+    server_id 为 all 时不在这一层缓存：汇总查询在内部按服务器缓存，避免在这里再等待一次
+    全部服务器的数据版本。
+    """
+    @functools.wraps(func)
+    async def wrapper(**kwargs):
+        if is_all_servers(kwargs.get("server_id")):
+            return await func(**kwargs)
+        return await cached_call(
+            [func.__module__, func.__name__, normalize_params(kwargs)],
+            kwargs.get("server_id"),
+            lambda: func(**kwargs),
+        )
+
+    return wrapper
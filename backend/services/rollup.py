@@ -0,0 +1,371 @@
+"""
+播放记录汇总服务
+在 /config 下维护 PlaybackActivity 的预聚合汇总库，按
+（本地日期, 小时, 用户, 客户端, 设备, 媒体类型, 播放方式）统计播放次数和时长。
+
+汇总库从 rowid 高水位增量更新，只收录已经"沉淀"（早于 ROLLUP_SETTLE_HOURS）
+的记录，因为 Playback Reporting 会在播放过程中持续更新最近记录的 PlayDuration。
+查询时再合并高水位之后的新增记录，因此结果与直接查询原表一致。
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from typing import Optional, List, Dict, Any
+from urllib.parse import quote
+
+from config import settings
+from database import (
+    SQLitePool,
+    get_server_config,
+    get_playback_db,
+    get_count_expr,
+    local_date,
+    local_datetime,
+    date_range_conditions,
+)
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION = "1"
+
+# 每次增量写入处理的 rowid 区间大小
+CHUNK_ROWS = 200_000
+
+# 汇总表中的维度列（空值统一存为 ''）
+DIMENSION_COLUMNS = ["UserId", "ClientName", "DeviceName", "ItemType", "PlaybackMethod"]
+
+# 查询维度 -> (汇总表表达式, 原始表表达式)
+_local_dt = local_datetime("DateCreated")
+DIMENSIONS = {
+    "date": ("day", local_date("DateCreated")),
+    "hour": ("hour", f"CAST(strftime('%H', {_local_dt}) AS INTEGER)"),
+    "dow": ("CAST(strftime('%w', day) AS INTEGER)", f"CAST(strftime('%w', {_local_dt}) AS INTEGER)"),
+    **{col: (col, f"COALESCE({col}, '')") for col in DIMENSION_COLUMNS},
+}
+
+# 筛选参数 -> 维度列
+FILTER_COLUMNS = {
+    "users": "UserId",
+    "clients": "ClientName",
+    "devices": "DeviceName",
+    "item_types": "ItemType",
+    "playback_methods": "PlaybackMethod",
+}
+
+
+def _fingerprint(source_path: str) -> Dict[str, str]:
+    """影响汇总结果的参数，任一变化都需要重建"""
+    return {
+        "schema": SCHEMA_VERSION,
+        "source": source_path,
+        "tz_offset": str(settings.TZ_OFFSET),
+        "min_duration": str(settings.MIN_PLAY_DURATION),
+    }
+
+
+class RollupStore:
+    """单个服务器的汇总库"""
+
+    def __init__(self, server_id: Optional[str], source_path: str, path: str):
+        self.server_id = server_id
+        self.source_path = source_path
+        self.path = path
+        self._writer: Optional[sqlite3.Connection] = None
+        self._pool = SQLitePool(path, 2)
+        self._lock = asyncio.Lock()
+        self._inflight: Optional[asyncio.Future] = None
+        self._built = False
+        self._closing = False
+
+    # ==================== 写入（在线程中执行） ====================
+
+    def _get_writer(self) -> sqlite3.Connection:
+        if self._writer is None:
+            conn = sqlite3.connect(f"file:{quote(self.path)}", uri=True, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            cols = ", ".join(f"{c} TEXT NOT NULL DEFAULT ''" for c in DIMENSION_COLUMNS)
+            conn.executescript(f"""
+                CREATE TABLE IF NOT EXISTS PlaybackRollup (
+                    day TEXT NOT NULL,
+                    hour INTEGER NOT NULL,
+                    {cols},
+                    plays INTEGER NOT NULL DEFAULT 0,
+                    duration INTEGER NOT NULL DEFAULT 0,
+                    last_play TEXT,
+                    PRIMARY KEY (day, hour, {", ".join(DIMENSION_COLUMNS)})
+                );
+                CREATE TABLE IF NOT EXISTS RollupState (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+            """)
+            conn.commit()
+            self._writer = conn
+        return self._writer
+
+    def _reset(self, conn: sqlite3.Connection, fingerprint: Dict[str, str]):
+        conn.execute("DELETE FROM PlaybackRollup")
+        conn.execute("DELETE FROM RollupState")
+        state = {**fingerprint, "hwm": "0", "rows": "0", "ready": "0"}
+        conn.executemany("INSERT INTO RollupState (key, value) VALUES (?, ?)", state.items())
+        conn.commit()
+
+    def _refresh_sync(self):
+        conn = self._get_writer()
+        state = dict(conn.execute("SELECT key, value FROM RollupState").fetchall())
+        fingerprint = _fingerprint(self.source_path)
+        if any(state.get(k) != v for k, v in fingerprint.items()):
+            logger.info(f"汇总库参数变化，重建: {self.path}")
+            self._reset(conn, fingerprint)
+            state = {"hwm": "0", "rows": "0", "ready": "0"}
+
+        conn.execute("ATTACH DATABASE ? AS src", (f"file:{quote(self.source_path)}?mode=ro",))
+        try:
+            hwm = int(state["hwm"])
+            rolled = int(state["rows"])
+
+            # 高水位以下的记录数变化（Emby 清理了旧数据或数据库被替换）时全部重建
+            if hwm > 0:
+                current = conn.execute(
+                    "SELECT COUNT(*) FROM src.PlaybackActivity WHERE rowid <= ?", (hwm,)
+                ).fetchone()[0]
+                if current != rolled:
+                    logger.info(f"汇总库与原表不一致（{rolled} -> {current}），重建: {self.path}")
+                    self._reset(conn, fingerprint)
+                    hwm = rolled = 0
+
+            # 只汇总早于沉淀时间的记录；从最新记录倒序查找，只会扫描最近的少量行
+            cutoff = (datetime.utcnow() - timedelta(hours=settings.ROLLUP_SETTLE_HOURS)).strftime("%Y-%m-%d %H:%M:%S")
+            row = conn.execute(
+                "SELECT rowid FROM src.PlaybackActivity WHERE rowid > ? AND DateCreated < ? ORDER BY rowid DESC LIMIT 1",
+                (hwm, cutoff),
+            ).fetchone()
+            target = row[0] if row else hwm
+
+            dims_raw = ", ".join(DIMENSIONS[c][1] for c in DIMENSION_COLUMNS)
+            updates = ", ".join(
+                ["plays = plays + excluded.plays", "duration = duration + excluded.duration",
+                 "last_play = MAX(COALESCE(last_play, ''), COALESCE(excluded.last_play, ''))"]
+            )
+            insert_sql = f"""
+                INSERT INTO PlaybackRollup (day, hour, {", ".join(DIMENSION_COLUMNS)}, plays, duration, last_play)
+                SELECT
+                    {DIMENSIONS["date"][1]},
+                    {DIMENSIONS["hour"][1]},
+                    {dims_raw},
+                    {get_count_expr()},
+                    COALESCE(SUM(PlayDuration), 0),
+                    MAX({_local_dt})
+                FROM src.PlaybackActivity
+                WHERE rowid > ? AND rowid <= ?
+                GROUP BY 1, 2, {", ".join(str(i) for i in range(3, 3 + len(DIMENSION_COLUMNS)))}
+                ON CONFLICT (day, hour, {", ".join(DIMENSION_COLUMNS)}) DO UPDATE SET {updates}
+            """
+
+            while hwm < target:
+                if self._closing:
+                    return
+                upper = min(hwm + CHUNK_ROWS, target)
+                conn.execute(insert_sql, (hwm, upper))
+                added = conn.execute(
+                    "SELECT COUNT(*) FROM src.PlaybackActivity WHERE rowid > ? AND rowid <= ?", (hwm, upper)
+                ).fetchone()[0]
+                hwm, rolled = upper, rolled + added
+                conn.executemany(
+                    "INSERT OR REPLACE INTO RollupState (key, value) VALUES (?, ?)",
+                    [("hwm", str(hwm)), ("rows", str(rolled))],
+                )
+                conn.commit()
+
+            conn.execute("INSERT OR REPLACE INTO RollupState (key, value) VALUES ('ready', '1')")
+            conn.commit()
+        finally:
+            conn.rollback()
+            conn.execute("DETACH DATABASE src")
+
+    async def refresh(self):
+        """增量更新汇总库"""
+        async with self._lock:
+            if self._closing:
+                return
+            # 写入在线程中进行；shield 保证任务被取消时 close() 仍能等待线程结束
+            self._inflight = asyncio.ensure_future(asyncio.to_thread(self._refresh_sync))
+            try:
+                await asyncio.shield(self._inflight)
+                self._built = True
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"更新汇总库失败 ({self.path}): {e}")
+
+    # ==================== 查询 ====================
+
+    async def aggregate(self, group_by: List[str], filters: Dict[str, Any]) -> Optional[List[tuple]]:
+        """按维度聚合，返回 [(维度..., 播放次数, 时长, 最后播放时间)]；汇总库未就绪时返回 None"""
+        if not self._built:
+            return None
+        start_date = filters.get("start_date")
+        end_date = filters.get("end_date")
+        if not (start_date or end_date) and filters.get("days"):
+            start_date = (datetime.now() - timedelta(days=filters["days"])).strftime("%Y-%m-%d")
+
+        dim_conditions = []
+        dim_params = []
+        for key, col in FILTER_COLUMNS.items():
+            values = filters.get(key)
+            if values:
+                dim_conditions.append(f"{col} IN ({','.join('?' for _ in values)})")
+                dim_params.extend(values)
+
+        # 1. 汇总库部分：在同一个读事务中读取高水位和汇总数据，避免与增量写入交错
+        rollup_conditions = []
+        rollup_params = []
+        if start_date:
+            rollup_conditions.append("day >= date(?)")
+            rollup_params.append(start_date)
+        if end_date:
+            rollup_conditions.append("day <= date(?)")
+            rollup_params.append(end_date)
+        rollup_where = " AND ".join(rollup_conditions + dim_conditions) or "1=1"
+        rollup_dims = ", ".join(DIMENSIONS[d][0] for d in group_by)
+
+        async with self._pool.connection() as db:
+            await db.execute("BEGIN")
+            try:
+                async with db.execute("SELECT key, value FROM RollupState") as cursor:
+                    state = dict(await cursor.fetchall())
+                fingerprint = _fingerprint(self.source_path)
+                if state.get("ready") != "1" or any(state.get(k) != v for k, v in fingerprint.items()):
+                    return None
+                hwm = int(state["hwm"])
+                async with db.execute(f"""
+                    SELECT {rollup_dims}, SUM(plays), SUM(duration), NULLIF(MAX(COALESCE(last_play, '')), '')
+                    FROM PlaybackRollup
+                    WHERE {rollup_where}
+                    GROUP BY {rollup_dims}
+                """, rollup_params + dim_params) as cursor:
+                    rollup_rows = await cursor.fetchall()
+            finally:
+                await db.execute("COMMIT")
+
+        # 2. 高水位之后的新增记录直接查原表（按 rowid 范围，只扫描少量行）
+        raw_dims = ", ".join(DIMENSIONS[d][1] for d in group_by)
+        date_conditions, date_params = date_range_conditions(start_date, end_date)
+        raw_where = " AND ".join(["rowid > ?"] + date_conditions + dim_conditions)
+        async with get_playback_db(self.server_id) as db:
+            async with db.execute(f"""
+                SELECT {raw_dims}, {get_count_expr()}, COALESCE(SUM(PlayDuration), 0), MAX({_local_dt})
+                FROM PlaybackActivity
+                WHERE {raw_where}
+                GROUP BY {raw_dims}
+            """, [hwm] + date_params + dim_params) as cursor:
+                tail_rows = await cursor.fetchall()
+
+        # 3. 合并
+        n = len(group_by)
+        merged: Dict[tuple, list] = {}
+        for row in list(rollup_rows) + list(tail_rows):
+            key = tuple(row[:n])
+            plays, duration, last_play = int(row[n] or 0), row[n + 1] or 0, row[n + 2]
+            if key in merged:
+                entry = merged[key]
+                entry[0] += plays
+                entry[1] += duration
+                if last_play and (not entry[2] or last_play > entry[2]):
+                    entry[2] = last_play
+            else:
+                merged[key] = [plays, duration, last_play]
+
+        rows = [key + tuple(values) for key, values in merged.items()]
+        rows.sort(key=lambda r: r[n], reverse=True)
+        return rows
+
+    async def close(self):
+        """关闭汇总库（等待进行中的写入在当前批次结束后退出）"""
+        self._closing = True
+        if self._inflight is not None:
+            await asyncio.wait([self._inflight])
+            if not self._inflight.cancelled():
+                self._inflight.exception()
+        await self._pool.close()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class RollupService:
+    """汇总库管理：按服务器创建汇总库并定期增量更新"""
+
+    def __init__(self):
+        self._stores: Dict[str, RollupStore] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._pending: set = set()
+
+    def _get_store(self, server_id: Optional[str]) -> Optional[RollupStore]:
+        config = get_server_config(server_id)
+        key = config["server_id"] or "default"
+        store = self._stores.get(key)
+        if store is not None and store.source_path == config["playback_db"]:
+            return store
+
+        try:
+            os.makedirs(settings.ROLLUP_DIR, exist_ok=True)
+        except OSError as e:
+            logger.warning(f"无法创建汇总库目录 {settings.ROLLUP_DIR}: {e}")
+            return None
+
+        if store is not None:
+            self._schedule(store.close())
+        store = RollupStore(config["server_id"], config["playback_db"], os.path.join(settings.ROLLUP_DIR, f"rollup_{key}.db"))
+        self._stores[key] = store
+        # 首次使用时在后台构建，构建完成前查询回退到原表
+        self._schedule(store.refresh())
+        return store
+
+    def _schedule(self, coro):
+        task = asyncio.create_task(coro)
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def aggregate(self, server_id: Optional[str], group_by: List[str], filters: Dict[str, Any]) -> Optional[List[tuple]]:
+        """从汇总库查询聚合结果；不可用时返回 None，调用方应回退到直接查询原表"""
+        if not settings.ROLLUP_ENABLED:
+            return None
+        store = self._get_store(server_id)
+        if store is None:
+            return None
+        try:
+            return await store.aggregate(group_by, filters)
+        except Exception as e:
+            logger.warning(f"汇总库查询失败，回退到原表: {e}")
+            return None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.ROLLUP_REFRESH_INTERVAL)
+            for store in list(self._stores.values()):
+                await store.refresh()
+
+    def start(self):
+        """启动定期增量更新任务"""
+        if settings.ROLLUP_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止更新任务并关闭所有汇总库"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        for task in list(self._pending):
+            task.cancel()
+        stores = list(self._stores.values())
+        self._stores.clear()
+        for store in stores:
+            await store.close()
+
+
+# 单例实例
+rollup_service = RollupService()
@@ -180,52 +180,11 @@ class ReportScheduler:
             "onebot": onebot_config
         }
         
+        # 各渠道并发发送，单个渠道超时不影响其他渠道
         notification_service = NotificationService(notification_config)
-        sent_count = 0
-        
-        # Telegram
-        if channels.get("telegram") and tg_config.get("bot_token"):
-            try:
-                token = tg_config.get("bot_token")
-                recipients = tg_config.get("admins", []) + tg_config.get("users", [])
-                
-                for chat_id in recipients:
-                    success = await notification_service._send_telegram_photo_bytes(
-                        token, chat_id, image_bytes, report_title
-                    )
-                    if success:
-                        sent_count += 1
-                        logger.info(f"报告图片已通过 Telegram 发送至 {chat_id}")
-            except Exception as e:
-                logger.error(f"Telegram 发送失败: {e}")
-        
-        # 企业微信
-        if channels.get("wecom") and wecom_config.get("corp_id"):
-            try:
-                if notification_service._send_wecom_photo_bytes(image_bytes, report_title):
-                    sent_count += 1
-                    logger.info("报告图片已通过企业微信发送")
-            except Exception as e:
-                logger.error(f"企业微信发送失败: {e}")
-        
-        # Discord
-        if channels.get("discord") and discord_config.get("webhook_url"):
-            try:
-                if notification_service._send_discord_photo_bytes(image_bytes, report_title):
-                    sent_count += 1
-                    logger.info("报告图片已通过 Discord 发送")
-            except Exception as e:
-                logger.error(f"Discord 发送失败: {e}")
-        
-        # OneBot
-        if channels.get("onebot") and onebot_config.get("http_url"):
-            try:
-                if notification_service._send_onebot_photo_bytes(image_bytes, report_title):
-                    sent_count += 1
-                    logger.info("报告图片已通过 OneBot 发送")
-            except Exception as e:
-                logger.error(f"OneBot 发送失败: {e}")
-        
+        sent_count = await notification_service.send_photo_all(image_bytes, report_title, channels)
+        logger.info(f"报告图片已发送到 {sent_count} 个渠道")
+
         if sent_count == 0:
             logger.warning("没有成功发送到任何渠道")
     
@@ -249,34 +208,8 @@ class ReportScheduler:
         }
         
         notification_service = NotificationService(notification_config)
-        
-        if channels.get("telegram") and tg_config.get("bot_token"):
-            try:
-                await notification_service.send_telegram(report_title, report_text)
-                logger.info("报告文本已通过 Telegram 发送")
-            except Exception as e:
-                logger.error(f"Telegram 发送失败: {e}")
-        
-        if channels.get("wecom") and wecom_config.get("corp_id"):
-            try:
-                await notification_service.send_wecom(report_title, report_text)
-                logger.info("报告文本已通过企业微信发送")
-            except Exception as e:
-                logger.error(f"企业微信发送失败: {e}")
-        
-        if channels.get("discord") and discord_config.get("webhook_url"):
-            try:
-                await notification_service.send_discord(report_title, report_text)
-                logger.info("报告文本已通过 Discord 发送")
-            except Exception as e:
-                logger.error(f"Discord 发送失败: {e}")
-        
-        if channels.get("onebot") and onebot_config.get("http_url"):
-            try:
-                await notification_service.send_onebot(report_title, report_text)
-                logger.info("报告文本已通过 OneBot 发送")
-            except Exception as e:
-                logger.error(f"OneBot 发送失败: {e}")
+        sent_count = await notification_service.send_all(report_title, report_text, channels=channels)
+        logger.info(f"报告文本已发送到 {sent_count} 个渠道")
 
 
 # 全局调度器实例
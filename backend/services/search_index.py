@@ -0,0 +1,274 @@
+"""
+播放记录搜索索引
+在 /config 下为 PlaybackActivity.ItemName 维护 FTS5 全文索引（trigram 分词，中文标题
+也能按任意子串匹配），供最近播放的搜索框使用，避免每次搜索都对整表做 LIKE '%...%'。
+
+索引是 contentless 表，只保存分词结果，rowid 与原表一致。和汇总库一样从 rowid 高水位
+增量写入；查询时先用索引选出候选 rowid，高水位之后的新记录仍逐行匹配，原有的 LIKE
+条件保留用于最终确认，因此结果与直接查询原表一致。
+"""
+import asyncio
+import logging
+import os
+import sqlite3
+from typing import Dict, Optional
+from urllib.parse import quote
+
+from config import settings
+from database import SQLitePool, get_server_config
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VERSION = "1"
+
+# 每次增量写入处理的 rowid 区间大小
+CHUNK_ROWS = 200_000
+
+# trigram 分词只能匹配至少 3 个字符的关键词
+MIN_QUERY_CHARS = 3
+
+
+def _fingerprint(source_path: str) -> Dict[str, str]:
+    """影响索引内容的参数，任一变化都需要重建"""
+    return {"schema": SCHEMA_VERSION, "source": source_path}
+
+
+def _match_expression(text: str) -> Optional[str]:
+    """把搜索关键词转为 FTS5 短语查询；索引无法等价匹配时返回 None"""
+    # LIKE 中 % 和 _ 是通配符，短语查询无法表达，交给 LIKE 处理
+    if len(text) < MIN_QUERY_CHARS or "%" in text or "_" in text:
+        return None
+    return '"' + text.replace('"', '""') + '"'
+
+
+class SearchIndexStore:
+    """单个服务器的搜索索引"""
+
+    def __init__(self, server_id: Optional[str], source_path: str, path: str):
+        self.server_id = server_id
+        self.source_path = source_path
+        self.path = path
+        self._writer: Optional[sqlite3.Connection] = None
+        self._pool = SQLitePool(path, 2)
+        self._lock = asyncio.Lock()
+        self._inflight: Optional[asyncio.Future] = None
+        self._built = False
+        self._closing = False
+
+    # ==================== 写入（在线程中执行） ====================
+
+    def _get_writer(self) -> sqlite3.Connection:
+        if self._writer is None:
+            conn = sqlite3.connect(f"file:{quote(self.path)}", uri=True, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.executescript("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS ItemNameIndex
+                    USING fts5(ItemName, tokenize = 'trigram', content = '');
+                CREATE TABLE IF NOT EXISTS IndexState (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+            """)
+            conn.commit()
+            self._writer = conn
+        return self._writer
+
+    def _reset(self, conn: sqlite3.Connection, fingerprint: Dict[str, str]):
+        # contentless 表不能逐行删除，用 delete-all 清空
+        conn.execute("INSERT INTO ItemNameIndex (ItemNameIndex) VALUES ('delete-all')")
+        conn.execute("DELETE FROM IndexState")
+        state = {**fingerprint, "hwm": "0", "rows": "0", "ready": "0"}
+        conn.executemany("INSERT INTO IndexState (key, value) VALUES (?, ?)", state.items())
+        conn.commit()
+
+    def _refresh_sync(self):
+        conn = self._get_writer()
+        state = dict(conn.execute("SELECT key, value FROM IndexState").fetchall())
+        fingerprint = _fingerprint(self.source_path)
+        if any(state.get(k) != v for k, v in fingerprint.items()):
+            logger.info(f"搜索索引参数变化，重建: {self.path}")
+            self._reset(conn, fingerprint)
+            state = {"hwm": "0", "rows": "0", "ready": "0"}
+
+        conn.execute("ATTACH DATABASE ? AS src", (f"file:{quote(self.source_path)}?mode=ro",))
+        try:
+            hwm = int(state["hwm"])
+            indexed = int(state["rows"])
+
+            # 高水位以下的记录数变化（Emby 清理了旧数据或数据库被替换）时全部重建
+            if hwm > 0:
+                current = conn.execute(
+                    "SELECT COUNT(*) FROM src.PlaybackActivity WHERE rowid <= ?", (hwm,)
+                ).fetchone()[0]
+                if current != indexed:
+                    logger.info(f"搜索索引与原表不一致（{indexed} -> {current}），重建: {self.path}")
+                    self._reset(conn, fingerprint)
+                    hwm = indexed = 0
+
+            # ItemName 写入后不再变化，无需像汇总库那样等待记录沉淀
+            target = conn.execute("SELECT MAX(rowid) FROM src.PlaybackActivity").fetchone()[0] or 0
+
+            while hwm < target:
+                if self._closing:
+                    return
+                upper = min(hwm + CHUNK_ROWS, target)
+                conn.execute("""
+                    INSERT INTO ItemNameIndex (rowid, ItemName)
+                    SELECT rowid, ItemName FROM src.PlaybackActivity
+                    WHERE rowid > ? AND rowid <= ? AND ItemName IS NOT NULL
+                """, (hwm, upper))
+                added = conn.execute(
+                    "SELECT COUNT(*) FROM src.PlaybackActivity WHERE rowid > ? AND rowid <= ?", (hwm, upper)
+                ).fetchone()[0]
+                hwm, indexed = upper, indexed + added
+                conn.executemany(
+                    "INSERT OR REPLACE INTO IndexState (key, value) VALUES (?, ?)",
+                    [("hwm", str(hwm)), ("rows", str(indexed))],
+                )
+                conn.commit()
+
+            conn.execute("INSERT OR REPLACE INTO IndexState (key, value) VALUES ('ready', '1')")
+            conn.commit()
+        finally:
+            conn.rollback()
+            conn.execute("DETACH DATABASE src")
+
+    async def refresh(self):
+        """增量更新搜索索引"""
+        async with self._lock:
+            if self._closing:
+                return
+            # 写入在线程中进行；shield 保证任务被取消时 close() 仍能等待线程结束
+            self._inflight = asyncio.ensure_future(asyncio.to_thread(self._refresh_sync))
+            try:
+                await asyncio.shield(self._inflight)
+                self._built = True
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"更新搜索索引失败 ({self.path}): {e}")
+
+    # ==================== 查询 ====================
+
+    async def match(self, text: str) -> Optional[tuple[list[int], int]]:
+        """查找 ItemName 包含关键词的记录
+
+        Returns:
+            (匹配的 rowid 列表, 索引高水位)；索引未就绪、关键词无法用索引匹配或匹配过多时返回 None
+        """
+        expression = _match_expression(text)
+        if expression is None or not self._built:
+            return None
+
+        limit = settings.SEARCH_INDEX_MAX_MATCHES
+        async with self._pool.connection() as db:
+            # 在同一个读事务中读取高水位和匹配结果，避免与增量写入交错
+            await db.execute("BEGIN")
+            try:
+                async with db.execute("SELECT key, value FROM IndexState") as cursor:
+                    state = dict(await cursor.fetchall())
+                fingerprint = _fingerprint(self.source_path)
+                if state.get("ready") != "1" or any(state.get(k) != v for k, v in fingerprint.items()):
+                    return None
+                async with db.execute(
+                    "SELECT rowid FROM ItemNameIndex WHERE ItemNameIndex MATCH ? LIMIT ?",
+                    (expression, limit + 1),
+                ) as cursor:
+                    rowids = [row[0] for row in await cursor.fetchall()]
+            finally:
+                await db.execute("COMMIT")
+
+        # 匹配过多时候选列表本身的开销超过逐行匹配，交给 LIKE
+        if len(rowids) > limit:
+            return None
+        return rowids, int(state["hwm"])
+
+    async def close(self):
+        """关闭搜索索引（等待进行中的写入在当前批次结束后退出）"""
+        self._closing = True
+        if self._inflight is not None:
+            await asyncio.wait([self._inflight])
+            if not self._inflight.cancelled():
+                self._inflight.exception()
+        await self._pool.close()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class SearchIndexService:
+    """搜索索引管理：按服务器创建索引并定期增量更新"""
+
+    def __init__(self):
+        self._stores: Dict[str, SearchIndexStore] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._pending: set = set()
+
+    def _get_store(self, server_id: Optional[str]) -> Optional[SearchIndexStore]:
+        config = get_server_config(server_id)
+        key = config["server_id"] or "default"
+        store = self._stores.get(key)
+        if store is not None and store.source_path == config["playback_db"]:
+            return store
+
+        try:
+            os.makedirs(settings.SEARCH_INDEX_DIR, exist_ok=True)
+        except OSError as e:
+            logger.warning(f"无法创建搜索索引目录 {settings.SEARCH_INDEX_DIR}: {e}")
+            return None
+
+        if store is not None:
+            self._schedule(store.close())
+        store = SearchIndexStore(
+            config["server_id"], config["playback_db"], os.path.join(settings.SEARCH_INDEX_DIR, f"search_{key}.db")
+        )
+        self._stores[key] = store
+        # 首次使用时在后台构建，构建完成前搜索回退到 LIKE
+        self._schedule(store.refresh())
+        return store
+
+    def _schedule(self, coro):
+        task = asyncio.create_task(coro)
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def match(self, server_id: Optional[str], text: Optional[str]) -> Optional[tuple[list[int], int]]:
+        """用索引查找匹配关键词的记录；不可用时返回 None，调用方只用 LIKE 匹配"""
+        if not settings.SEARCH_INDEX_ENABLED or not text or not text.strip():
+            return None
+        store = self._get_store(server_id)
+        if store is None:
+            return None
+        try:
+            return await store.match(text.strip())
+        except Exception as e:
+            logger.warning(f"搜索索引查询失败，回退到 LIKE: {e}")
+            return None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.SEARCH_INDEX_REFRESH_INTERVAL)
+            for store in list(self._stores.values()):
+                await store.refresh()
+
+    def start(self):
+        """启动定期增量更新任务"""
+        if settings.SEARCH_INDEX_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止更新任务并关闭所有索引"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        for task in list(self._pending):
+            task.cancel()
+        stores = list(self._stores.values())
+        self._stores.clear()
+        for store in stores:
+            await store.close()
+
+
+# 单例实例
+search_index_service = SearchIndexService()
@@ -0,0 +1,91 @@
+"""
+多服务器服务实例注册表
+每个服务器使用独立的 EmbyService（各自的 HTTP 连接池、项目信息缓存和 API Key 缓存）
+和 CoverGeneratorService。默认服务器（server_id 为 None 或不存在）直接使用模块单例。
+
+实例按需创建；服务器的地址或 API Key 被修改时自动重建，路由层在更新 / 删除服务器后
+调用 evict() 立即淘汰。
+"""
+import logging
+from typing import Optional
+
+from database import get_server_config
+from services.cover_generator import CoverGeneratorService, cover_service
+from services.emby import EmbyService, emby_service
+from services.users import user_service
+
+logger = logging.getLogger(__name__)
+
+
+class ServerServiceRegistry:
+    """按 server_id 缓存服务实例"""
+
+    def __init__(self):
+        self._emby: dict[str, EmbyService] = {}
+        self._cover: dict[str, CoverGeneratorService] = {}
+
+    def get_emby_service(self, server_id: Optional[str] = None) -> EmbyService:
+        """获取服务器对应的 EmbyService"""
+        config = get_server_config(server_id)
+        key = config['server_id']
+        if key is None:
+            return emby_service
+
+        service = self._emby.get(key)
+        if service is not None and (
+            service.emby_url != config['emby_url'] or service._configured_api_key != config['emby_api_key']
+        ):
+            # 服务器配置已变化，旧实例的缓存不再可用（后台任务随旧实例一起丢弃）
+            self._drop(key)
+            service = None
+        if service is None:
+            service = EmbyService(key)
+            self._emby[key] = service
+        return service
+
+    def get_cover_service(self, server_id: Optional[str] = None) -> CoverGeneratorService:
+        """获取服务器对应的封面生成服务"""
+        emby = self.get_emby_service(server_id)
+        if emby.server_id is None:
+            return cover_service
+
+        service = self._cover.get(emby.server_id)
+        if service is None or service.emby_service is not emby:
+            service = CoverGeneratorService(emby)
+            self._cover[emby.server_id] = service
+        return service
+
+    def _drop(self, server_id: str) -> Optional[EmbyService]:
+        self._cover.pop(server_id, None)
+        return self._emby.pop(server_id, None)
+
+    async def evict(self, server_id: str):
+        """淘汰服务器的全部服务实例和用户映射缓存（服务器更新或删除后调用）"""
+        service = self._drop(server_id)
+        user_service.invalidate(server_id)
+        if service is not None:
+            await service.close()
+            logger.info(f"已淘汰服务器 {server_id} 的服务实例")
+
+    async def close(self):
+        """关闭全部非默认服务器的实例（应用关闭时调用）"""
+        for server_id in list(self._emby):
+            await self.evict(server_id)
+
+    def stats(self) -> dict:
+        """各服务器的项目信息缓存统计"""
+        return {server_id: service.get_cache_stats() for server_id, service in self._emby.items()}
+
+
+# 单例实例
+server_registry = ServerServiceRegistry()
+
+
+def get_emby_service(server_id: Optional[str] = None) -> EmbyService:
+    """获取服务器对应的 EmbyService"""
+    return server_registry.get_emby_service(server_id)
+
+
+def get_cover_service(server_id: Optional[str] = None) -> CoverGeneratorService:
+    """获取服务器对应的封面生成服务"""
+    return server_registry.get_cover_service(server_id)
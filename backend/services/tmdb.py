@@ -1,21 +1,173 @@
-"""TMDB电影数据库服务"""
+"""TMDB电影数据库服务
+
+请求通过共享的 httpx.AsyncClient 异步发送。查询结果（剧名/年份 -> TMDB ID、
+TMDB ID -> 图片路径）先经过内存 LRU 缓存，再经过 /config 下的 SQLite 持久化缓存，
+未找到的结果使用较短的有效期缓存；同一查询的并发请求只发起一次。
+TMDB 返回 429 时所有请求按 Retry-After 暂停后重试。
+"""
+import asyncio
+import json
 import logging
-from typing import Optional, Dict, Any
-import requests
-from urllib.parse import quote
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Optional, Dict
+
+import httpx
+
+from config import settings
+from services.http_client import http_client_pool
+from services.item_cache import MISSING, ItemInfoCache
 
 logger = logging.getLogger(__name__)
 
+TMDB_API_URL = "https://api.themoviedb.org/3"
+
+
+class TMDBCacheStore:
+    """TMDB 查询结果的 SQLite 持久化缓存，data 为 NULL 表示确认未找到"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._disabled = False
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self._conn is not None or self._disabled:
+            return self._conn
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS TmdbCache (
+                    key TEXT PRIMARY KEY,
+                    data TEXT,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            # 启动时清理过期条目
+            conn.execute("DELETE FROM TmdbCache WHERE expires_at < ?", (time.time(),))
+            conn.commit()
+            self._conn = conn
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"TMDB 磁盘缓存不可用，仅使用内存缓存 ({self.path}): {e}")
+            self._disabled = True
+        return self._conn
+
+    def get(self, key: str) -> Any:
+        """读取缓存，未命中或已过期返回 MISSING，确认未找到返回 None"""
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return MISSING
+            try:
+                row = conn.execute(
+                    "SELECT data, expires_at FROM TmdbCache WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.warning(f"读取 TMDB 磁盘缓存失败: {e}")
+                return MISSING
+        if row is None or row[1] < time.time():
+            return MISSING
+        return json.loads(row[0]) if row[0] is not None else None
+
+    def set(self, key: str, value: Optional[dict]):
+        ttl = settings.TMDB_CACHE_TTL if value is not None else settings.TMDB_CACHE_NEGATIVE_TTL
+        if ttl <= 0:
+            return
+        data = json.dumps(value, ensure_ascii=False) if value is not None else None
+        with self._lock:
+            conn = self._connect()
+            if conn is None:
+                return
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO TmdbCache (key, data, expires_at) VALUES (?, ?, ?)",
+                    (key, data, time.time() + ttl),
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"写入 TMDB 磁盘缓存失败: {e}")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+class TMDBLookupCache:
+    """TMDB 查询缓存：内存 LRU（含并发请求合并）+ 磁盘持久化"""
+
+    def __init__(self, path: str):
+        self.memory = ItemInfoCache(
+            max_entries=settings.TMDB_CACHE_MAX_SIZE,
+            max_bytes=4 * 1024 * 1024,
+            ttl=settings.TMDB_CACHE_TTL,
+            negative_ttl=settings.TMDB_CACHE_NEGATIVE_TTL,
+        )
+        self.store = TMDBCacheStore(path)
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Optional[dict]:
+        """读取缓存，未命中时调用 loader 请求 TMDB
+
+        loader 返回 dict 表示找到，None 表示确认未找到，MISSING 表示暂时失败（不缓存）
+        """
+        async def load():
+            stored = await asyncio.to_thread(self.store.get, key)
+            if stored is not MISSING:
+                return stored
+            value = await loader()
+            if value is not MISSING:
+                await asyncio.to_thread(self.store.set, key, value)
+            return value
+
+        return await self.memory.get_or_load(key, load)
+
+    def close(self):
+        self.store.close()
+
+
+class _RateLimiter:
+    """TMDB 限流状态（所有 TMDBService 实例共享）"""
+
+    def __init__(self):
+        self._until = 0.0
+
+    async def wait(self):
+        delay = self._until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def penalize(self, delay: float):
+        self._until = max(self._until, time.monotonic() + delay)
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    try:
+        return float(response.headers["Retry-After"])
+    except (KeyError, ValueError):
+        return None
+
+
+# 单例实例
+tmdb_cache = TMDBLookupCache(settings.TMDB_CACHE_DB)
+_rate_limiter = _RateLimiter()
+
 
 class TMDBService:
     """TMDB图片和信息获取服务"""
-    
+
     def __init__(self, api_key: str, image_base_url: str = "https://image.tmdb.org/t/p/original", emby_server: str = "", proxy: str = ""):
         self.api_key = api_key
         self.image_base_url = image_base_url
         self.emby_server = emby_server
         self.proxy = proxy
-        
+
         # 配置代理
         self.proxies = None
         if proxy:
@@ -24,170 +176,191 @@ class TMDBService:
                 'https': proxy
             }
             logger.info(f"TMDB 服务使用代理: {proxy}")
-    
-    def get_image_url(self, item: Dict[str, Any]) -> Optional[str]:
+
+    async def _request(self, path: str, params: Optional[dict] = None) -> Any:
+        """请求 TMDB API
+
+        Returns:
+            JSON 数据；404 返回 None；其他失败返回 MISSING
+        """
+        client = http_client_pool.get(TMDB_API_URL, self.proxy)
+        params = {"api_key": self.api_key, "language": "zh-CN", **(params or {})}
+        for attempt in range(settings.TMDB_MAX_RETRIES + 1):
+            await _rate_limiter.wait()
+            try:
+                response = await client.get(f"{TMDB_API_URL}{path}", params=params, timeout=10)
+            except httpx.HTTPError as e:
+                logger.error(f"TMDB请求失败 {path}: {str(e)}")
+                return MISSING
+
+            if response.status_code == 429:
+                delay = _retry_after(response) or settings.TMDB_RETRY_AFTER * (2 ** attempt)
+                _rate_limiter.penalize(delay)
+                logger.warning(f"TMDB请求被限流，{delay:.1f}s 后重试: {path}")
+                continue
+            if response.status_code == 404:
+                return None
+            if response.status_code != 200:
+                logger.error(f"TMDB请求失败 {path}: HTTP {response.status_code}")
+                return MISSING
+            return response.json()
+
+        logger.error(f"TMDB请求多次被限流，放弃: {path}")
+        return MISSING
+
+    @staticmethod
+    def _image_paths(data: Optional[dict]) -> Optional[dict]:
+        """详情数据中的图片路径，两者都没有时视为未找到"""
+        if data is None or data is MISSING:
+            return data
+        paths = {"backdrop_path": data.get("backdrop_path"), "poster_path": data.get("poster_path")}
+        return paths if any(paths.values()) else None
+
+    async def _tv_images(self, tmdb_id) -> Optional[dict]:
+        """剧集的图片路径（按 TMDB ID 缓存）"""
+        async def load():
+            return self._image_paths(await self._request(f"/tv/{tmdb_id}"))
+        return await tmdb_cache.get_or_load(f"tv:{tmdb_id}", load)
+
+    async def _movie_images(self, tmdb_id) -> Optional[dict]:
+        """电影的图片路径（按 TMDB ID 缓存）"""
+        async def load():
+            return self._image_paths(await self._request(f"/movie/{tmdb_id}"))
+        return await tmdb_cache.get_or_load(f"movie:{tmdb_id}", load)
+
+    async def _search_tv(self, series_name: str, year) -> Optional[str]:
+        """按剧名和年份搜索剧集的 TMDB ID（按剧名/年份缓存）"""
+        async def load():
+            params = {"query": series_name, "include_adult": "false"}
+            if year:
+                params["first_air_date_year"] = year
+            logger.info(f"搜索TMDB剧集: {series_name} ({year or '无年份'})")
+            data = await self._request("/search/tv", params)
+            if data is None or data is MISSING:
+                return data
+            results = data.get("results", [])
+            if not results:
+                logger.debug("TMDB无匹配结果")
+                return None
+            # 选择最受欢迎的结果
+            best_match = max(results, key=lambda x: x.get("popularity", 0))
+            return {"id": best_match.get("id")}
+
+        found = await tmdb_cache.get_or_load(f"tv-search:{series_name.lower()}|{year or ''}", load)
+        return found.get("id") if found else None
+
+    def _image_from_paths(self, paths: Optional[dict]) -> Optional[str]:
+        """优先背景图，回退海报图（使用weserv转横图）"""
+        if not paths:
+            return None
+        backdrop_path = paths.get("backdrop_path")
+        if backdrop_path:
+            return f"{self.image_base_url}{backdrop_path}"
+        poster_path = paths.get("poster_path")
+        if poster_path:
+            encoded_path = f"{self.image_base_url[8:]}{poster_path}"
+            return (
+                f"https://images.weserv.nl/"
+                f"?url={encoded_path}"
+                f"&fit=contain&width=1280&height=720&bg=000000"
+            )
+        return None
+
+    async def get_image_url(self, item: Dict[str, Any]) -> Optional[str]:
         """获取媒体项的图片URL（优先TMDB，回退Emby本地）"""
         if not self.api_key:
             logger.warning("TMDB API密钥未配置，使用Emby本地图片")
-            return self.get_emby_local_image(item)
-        
+            return await self.get_emby_local_image(item)
+
         try:
             if item.get("Type") == "Episode":
-                return self.get_episode_image(item)
+                return await self.get_episode_image(item)
             elif item.get("Type") == "Movie":
-                return self.get_movie_image(item)
+                return await self.get_movie_image(item)
             else:
-                return self.get_emby_local_image(item)
+                return await self.get_emby_local_image(item)
         except Exception as e:
             logger.error(f"获取TMDB图片失败: {str(e)}")
-            return self.get_emby_local_image(item)
-    
-    def get_episode_image(self, item: Dict[str, Any]) -> Optional[str]:
-        """获取剧集图片（优先背景图）"""
-        series_name = item.get("SeriesName", "").strip()
-        if not series_name:
-            return self.get_emby_local_image(item)
-        
-        year = item.get("ProductionYear")
-        logger.info(f"搜索TMDB剧集: {series_name} ({year or '无年份'})")
-        
-        try:
-            params = {
-                "api_key": self.api_key,
-                "query": quote(series_name),
-                "language": "zh-CN",
-                "include_adult": "false"
-            }
-            if year:
-                params["first_air_date_year"] = year
-            
-            search_url = "https://api.themoviedb.org/3/search/tv"
-            resp = requests.get(search_url, params=params, timeout=10, proxies=self.proxies)
-            
-            if resp.status_code != 200:
-                logger.error(f"TMDB搜索失败: HTTP {resp.status_code}")
-                return self.get_emby_local_image(item)
-            
-            results = resp.json().get("results", [])
-            if not results:
-                logger.debug("TMDB无匹配结果")
-                return self.get_emby_local_image(item)
-            
-            # 选择最受欢迎的结果
-            best_match = max(results, key=lambda x: x.get("popularity", 0))
-            series_id = best_match.get("id")
-            
-            # 获取详细信息
-            detail_url = f"https://api.themoviedb.org/3/tv/{series_id}"
-            detail_resp = requests.get(detail_url, params={"api_key": self.api_key, "language": "zh-CN"}, timeout=10, proxies=self.proxies)
-            
-            if detail_resp.status_code == 200:
-                data = detail_resp.json()
-                
-                # 优先背景图
-                backdrop_path = data.get("backdrop_path")
-                if backdrop_path:
-                    return f"{self.image_base_url}{backdrop_path}"
-                
-                # 回退海报图（使用weserv转横图）
-                poster_path = data.get("poster_path")
-                if poster_path:
-                    encoded_path = f"{self.image_base_url[8:]}{poster_path}"
-                    return (
-                        f"https://images.weserv.nl/"
-                        f"?url={encoded_path}"
-                        f"&fit=contain&width=1280&height=720&bg=000000"
-                    )
-        
-        except Exception as e:
-            logger.error(f"TMDB剧集处理异常: {str(e)}")
-        
-        return self.get_emby_local_image(item)
-    
-    def get_movie_image(self, item: Dict[str, Any]) -> Optional[str]:
+            return await self.get_emby_local_image(item)
+
+    async def get_episode_image(self, item: Dict[str, Any]) -> Optional[str]:
+        """获取剧集图片（优先背景图）
+
+        item 的 ProviderIds.Tmdb 为剧集（Series）的 TMDB ID 时直接使用，否则按剧名搜索
+        """
+        tmdb_id = (item.get("ProviderIds") or {}).get("Tmdb")
+        if not tmdb_id:
+            series_name = (item.get("SeriesName") or "").strip()
+            if not series_name:
+                return await self.get_emby_local_image(item)
+            tmdb_id = await self._search_tv(series_name, item.get("ProductionYear"))
+
+        if tmdb_id:
+            image_url = self._image_from_paths(await self._tv_images(tmdb_id))
+            if image_url:
+                return image_url
+
+        return await self.get_emby_local_image(item)
+
+    async def get_movie_image(self, item: Dict[str, Any]) -> Optional[str]:
         """获取电影图片（优先背景图）"""
-        tmdb_id = item.get("ProviderIds", {}).get("Tmdb")
+        tmdb_id = (item.get("ProviderIds") or {}).get("Tmdb")
         if not tmdb_id:
             logger.debug("电影缺少TMDB ID")
-            return self.get_emby_local_image(item)
-        
-        url = f"https://api.themoviedb.org/3/movie/{tmdb_id}?api_key={self.api_key}&language=zh-CN"
-        
-        try:
-            response = requests.get(url, timeout=10, proxies=self.proxies)
-            if response.status_code == 200:
-                data = response.json()
-                
-                # 优先背景图
-                backdrop_path = data.get("backdrop_path")
-                if backdrop_path:
-                    return f"{self.image_base_url}{backdrop_path}"
-                
-                # 回退海报图（使用weserv转横图）
-                poster_path = data.get("poster_path")
-                if poster_path:
-                    encoded_path = f"{self.image_base_url[8:]}{poster_path}"
-                    return (
-                        f"https://images.weserv.nl/"
-                        f"?url={encoded_path}"
-                        f"&fit=contain&width=1280&height=720&bg=000000"
-                    )
-        except Exception as e:
-            logger.warning(f"获取电影图片失败: {str(e)}")
-        
-        return self.get_emby_local_image(item)
-    
-    def get_emby_local_image(self, item: Dict[str, Any]) -> Optional[str]:
+            return await self.get_emby_local_image(item)
+
+        image_url = self._image_from_paths(await self._movie_images(tmdb_id))
+        if image_url:
+            return image_url
+
+        return await self.get_emby_local_image(item)
+
+    async def get_emby_local_image(self, item: Dict[str, Any]) -> Optional[str]:
         """获取Emby本地图片（优先背景图）"""
         if not self.emby_server:
             logger.debug("Emby服务器地址未配置")
             return None
-        
+
         try:
             item_id = item.get("Id")
             if not item_id:
                 logger.debug("媒体项缺少ID")
                 return None
-            
+
             # 尝试背景图
             image_url = f"{self.emby_server}/Items/{item_id}/Images/Backdrop?fillWidth=1280&fillHeight=720&quality=90"
-            if self.verify_image_url(image_url):
+            if await self.verify_image_url(image_url):
                 logger.info(f"使用Emby背景图: {image_url}")
                 return image_url
-            
+
             # 回退主图（海报）
             image_url = f"{self.emby_server}/Items/{item_id}/Images/Primary?fillWidth=800&quality=90"
-            if self.verify_image_url(image_url):
+            if await self.verify_image_url(image_url):
                 logger.info(f"使用Emby海报图: {image_url}")
                 return image_url
-            
+
             logger.debug(f"未找到有效的Emby图片: {item_id}")
-        
+
         except Exception as e:
             logger.error(f"获取Emby本地图片失败: {str(e)}")
-        
+
         return None
-    
-    def verify_image_url(self, url: str) -> bool:
+
+    async def verify_image_url(self, url: str) -> bool:
         """验证图片URL是否有效"""
         try:
-            response = requests.head(url, timeout=5)
+            response = await http_client_pool.get(self.emby_server).head(url, timeout=5)
             return response.status_code == 200
         except Exception:
             return False
-    
-    def get_movie_info(self, tmdb_id: str) -> Optional[Dict[str, Any]]:
+
+    async def get_movie_info(self, tmdb_id: str) -> Optional[Dict[str, Any]]:
         """获取电影详细信息"""
         if not self.api_key or not tmdb_id:
             return None
-        
-        url = f"https://api.themoviedb.org/3/movie/{tmdb_id}?api_key={self.api_key}&language=zh-CN"
-        
-        try:
-            response = requests.get(url, timeout=10)
-            if response.status_code == 200:
-                return response.json()
-        except Exception as e:
-            logger.error(f"获取电影信息失败: {str(e)}")
-        
-        return None
+
+        data = await self._request(f"/movie/{tmdb_id}")
+        if data is MISSING:
+            logger.error(f"获取电影信息失败: {tmdb_id}")
+            return None
+        return data
@@ -1,21 +1,88 @@
 """
 用户服务模块
 处理用户相关的数据获取和匹配
+
+用户映射按服务器缓存在内存中，users.db（及其 -wal 文件）的修改时间或大小变化时
+才重新读取 LocalUsersv2。加载时预先计算每个用户 ID 的各种写法（带 / 不带连字符、
+.NET GUID 字节序），匹配用户名只需一次字典查找。
 """
+import asyncio
 import json
-import aiosqlite
-from config import settings
-from database import convert_guid_bytes_to_standard
+import os
+import uuid
+from typing import Optional
+
+from database import get_users_db, convert_guid_bytes_to_standard, get_server_config
+
+
+def normalize_user_id(user_id: str) -> str:
+    """规范化用户ID：去掉连字符和花括号并转为小写"""
+    return user_id.strip().strip("{}").replace("-", "").lower()
+
+
+def _swap_guid_byte_order(hex_id: str) -> Optional[str]:
+    """在标准 GUID 和 .NET 字节序之间转换（32 位十六进制，两个方向的变换相同）"""
+    try:
+        return uuid.UUID(hex=hex_id).bytes_le.hex()
+    except ValueError:
+        return None
+
+
+class UserMap(dict):
+    """用户ID到用户名的映射
+
+    字典本身保存标准格式（小写无连字符）的 ID，另外维护一个包含各种写法的反向索引。
+    """
+
+    def __init__(self, users: dict[str, str]):
+        super().__init__(users)
+        self._index: dict[str, str] = {}
+        for guid, name in users.items():
+            self._index[guid] = name
+            swapped = _swap_guid_byte_order(guid)
+            # 标准写法优先，.NET 字节序的写法不覆盖其他用户的标准写法
+            if swapped and swapped not in users:
+                self._index.setdefault(swapped, name)
+
+    def lookup(self, user_id: str) -> Optional[str]:
+        """按任意写法查找用户名，找不到返回 None"""
+        return self._index.get(normalize_user_id(user_id))
+
+
+class _CachedUsers:
+    __slots__ = ("path", "version", "user_map")
+
+    def __init__(self, path: str, version: tuple, user_map: UserMap):
+        self.path = path
+        self.version = version
+        self.user_map = user_map
+
+
+def _users_db_version(path: str) -> tuple:
+    version = []
+    for suffix in ("", "-wal"):
+        try:
+            st = os.stat(path + suffix)
+            version.append((st.st_mtime_ns, st.st_size))
+        except OSError:
+            version.append(None)
+    return tuple(version)
 
 
 class UserService:
     """用户服务类"""
 
-    async def get_user_map(self) -> dict[str, str]:
-        """获取用户ID到用户名的映射"""
-        user_map = {}
+    def __init__(self):
+        # 键为 get_server_config 解析出的 server_id
+        self._cache: dict[Optional[str], _CachedUsers] = {}
+        self._locks: dict[Optional[str], asyncio.Lock] = {}
+        self.loads = 0
+
+    async def _load_user_map(self, server_id: Optional[str]) -> UserMap:
+        """从 users.db 读取全部用户"""
+        users = {}
         try:
-            async with aiosqlite.connect(settings.USERS_DB) as db:
+            async with get_users_db(server_id) as db:
                 async with db.execute("SELECT guid, data FROM LocalUsersv2") as cursor:
                     async for row in cursor:
                         guid_bytes = row[0]
@@ -25,18 +92,60 @@ class UserService:
                             if isinstance(guid_bytes, bytes):
                                 guid = convert_guid_bytes_to_standard(guid_bytes)
                             else:
-                                guid = str(guid_bytes).lower().replace("-", "")
+                                guid = normalize_user_id(str(guid_bytes))
                             # data 是 JSON
                             if isinstance(data_bytes, bytes):
                                 data = json.loads(data_bytes.decode('utf-8', errors='ignore'))
                             else:
                                 data = json.loads(data_bytes)
-                            user_map[guid] = data.get("Name", "Unknown")
+                            users[guid] = data.get("Name", "Unknown")
                         except:
                             continue
         except Exception as e:
             print(f"Error loading users: {e}")
-        return user_map
+            raise
+        self.loads += 1
+        return UserMap(users)
+
+    async def get_user_map(self, server_id: Optional[str] = None) -> UserMap:
+        """获取用户ID到用户名的映射（users.db 未变化时直接返回缓存）"""
+        config = get_server_config(server_id)
+        key = config['server_id']
+        path = config['users_db']
+
+        cached = self._cache.get(key)
+        version = _users_db_version(path)
+        if cached is not None and cached.path == path and cached.version == version:
+            return cached.user_map
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # 等待锁期间可能已被其他请求重新加载
+            cached = self._cache.get(key)
+            if cached is not None and cached.path == path and cached.version == version:
+                return cached.user_map
+            try:
+                user_map = await self._load_user_map(key)
+            except Exception:
+                # 读取失败时沿用旧数据，不缓存空结果以便下次重试
+                return cached.user_map if cached is not None else UserMap({})
+            self._cache[key] = _CachedUsers(path, version, user_map)
+            return user_map
+
+    def invalidate(self, server_id: Optional[str] = None):
+        """丢弃缓存的用户映射，server_id 为 None 时清空全部"""
+        if server_id is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(server_id, None)
+
+    def stats(self) -> dict:
+        """用户映射缓存统计信息"""
+        return {
+            "servers": len(self._cache),
+            "users": sum(len(c.user_map) for c in self._cache.values()),
+            "loads": self.loads,
+        }
 
     def match_username(self, user_id: str, user_map: dict[str, str]) -> str:
         """根据用户ID匹配用户名"""
@@ -48,11 +157,17 @@ class UserService:
         if username:
             return username
 
-        # 尝试不同格式匹配
-        user_id_normalized = user_id.replace("-", "").lower()
-        for uid, name in user_map.items():
-            if user_id_normalized in uid.lower() or uid.lower() in user_id_normalized:
-                return name
+        # 尝试不同格式匹配（带连字符、大写、.NET 字节序）
+        if isinstance(user_map, UserMap):
+            username = user_map.lookup(user_id)
+        else:
+            user_id_normalized = normalize_user_id(user_id)
+            username = user_map.get(user_id_normalized)
+            if not username:
+                swapped = _swap_guid_byte_order(user_id_normalized)
+                username = user_map.get(swapped) if swapped else None
+        if username:
+            return username
 
         # 无法匹配，返回截断的ID
         return user_id[:8] + "..." if len(user_id) > 8 else user_id
@@ -109,6 +109,64 @@ class WebhookService:
         else:
             return f"{size_bytes / (1024 ** 3):.2f} GB"
     
+    def format_episode_range(self, episodes: list) -> str:
+        """把 [(季, 集)] 格式化为集数范围，如 S1E1-E3, E5 / S2E1"""
+        parts = []
+        for season in sorted({s for s, _ in episodes}):
+            numbers = sorted({e for s, e in episodes if s == season})
+            ranges = []
+            start = prev = numbers[0]
+            for n in numbers[1:] + [None]:
+                if n is not None and n == prev + 1:
+                    prev = n
+                    continue
+                ranges.append(f"E{start}" if start == prev else f"E{start}-E{prev}")
+                if n is not None:
+                    start = prev = n
+            parts.append(f"S{season}" + ", ".join(ranges))
+        return " ".join(parts)
+
+    async def build_library_digest_context(self, events: list) -> Optional[Dict[str, Any]]:
+        """把同一剧集的多个 library.new 事件合并为一个上下文
+
+        只为第一个事件查询剧集信息，item_name 为 "剧名 S1E1-E10"，另外提供
+        episode_count（集数）和 episodes（每集的 "S1E2 - 标题"）
+        """
+        items = [e.get("Item") or {} for e in events]
+        items = [item for item in items if item]
+        if not items:
+            return None
+        items.sort(key=lambda item: (item.get("ParentIndexNumber") or 0, item.get("IndexNumber") or 0))
+
+        context = await self.build_event_context({**events[0], "Item": items[0]})
+        if not context or len(items) == 1:
+            return context
+
+        series_name = items[0].get("SeriesName", "未知剧集")
+        numbers = [(item.get("ParentIndexNumber") or 0, item.get("IndexNumber") or 0) for item in items]
+        total_size = sum(item.get("Size") or 0 for item in items)
+
+        overview = ""
+        series_id = items[0].get("SeriesId")
+        if series_id:
+            try:
+                # build_event_context 已查询过，这里命中缓存
+                series_info = await self.emby_service.get_item_info(series_id)
+                overview = series_info.get("Overview", "")
+            except Exception as e:
+                logger.warning(f"获取剧集简介失败: {e}")
+
+        context.update({
+            "item_name": f"{series_name} {self.format_episode_range(numbers)}",
+            "overview": overview or context.get("overview", ""),
+            "size": self.format_size(total_size) if total_size else None,
+            "episode_count": len(items),
+            "episodes": [
+                f"S{s}E{e} - {item.get('Name', '')}" for (s, e), item in zip(numbers, items)
+            ],
+        })
+        return context
+
     async def build_event_context(self, response: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """构建事件上下文数据"""
         event = response.get("Event")
@@ -0,0 +1,503 @@
+"""
+Webhook 持久化队列
+Emby webhook 先写入 /config 下的 SQLite 队列并立即响应，再由后台 worker 构建上下文、
+获取图片、渲染模板并发送通知。通知渠道慢或不可用时，Emby 不会因为等待超时而重发。
+
+- 幂等键：请求头 Idempotency-Key / X-Request-Id，没有时使用请求体的 SHA-256。
+  同一事件在队列中或已处理（WEBHOOK_DEDUP_HOURS 内）时不会重复入队
+- 失败按指数退避重试（WEBHOOK_RETRY_BASE * 2^(n-1)，上限 WEBHOOK_RETRY_MAX，带抖动），
+  超过 WEBHOOK_MAX_ATTEMPTS 次后移入死信表，可通过接口重新入队
+- worker 领取任务时设置租约，进程在处理中途退出时，租约到期后任务会被重新领取
+- 分组暂存：同一分组的事件（如同一剧集的 library.new）先写入暂存表，从第一个事件起
+  经过时间窗口或达到批次上限后合并为一个批量事件入队，暂存同样持久化
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], Awaitable[Any]]
+
+# UPDATE ... RETURNING 需要 SQLite 3.35+，更早的版本先查询再带条件更新
+_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+
+def idempotency_key(body: bytes, header_key: Optional[str] = None) -> str:
+    """计算 webhook 的幂等键"""
+    if header_key:
+        return f"h:{header_key}"
+    return "b:" + hashlib.sha256(body).hexdigest()
+
+
+def retry_delay(attempts: int) -> float:
+    """第 attempts 次失败后的等待时间（秒）"""
+    delay = min(settings.WEBHOOK_RETRY_BASE * (2 ** (attempts - 1)), settings.WEBHOOK_RETRY_MAX)
+    # 抖动避免大量任务同时重试
+    return delay * random.uniform(0.8, 1.2)
+
+
+class WebhookQueue:
+    """SQLite 队列，所有数据库操作在线程中串行执行"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._handler: Optional[Handler] = None
+        self._workers: list[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self.enqueued = 0
+        self.duplicates = 0
+        self.processed = 0
+        self.retried = 0
+        self.dead = 0
+
+    # ==================== 数据库（在线程中执行） ====================
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS WebhookQueue (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    idempotency_key TEXT NOT NULL UNIQUE,
+                    event TEXT,
+                    payload TEXT NOT NULL,
+                    received_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    locked_until REAL,
+                    last_error TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_WebhookQueue_due ON WebhookQueue(next_attempt_at);
+                CREATE TABLE IF NOT EXISTS WebhookDone (
+                    idempotency_key TEXT PRIMARY KEY,
+                    finished_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS WebhookDeadLetter (
+                    id INTEGER PRIMARY KEY,
+                    idempotency_key TEXT NOT NULL,
+                    event TEXT,
+                    payload TEXT NOT NULL,
+                    received_at REAL NOT NULL,
+                    attempts INTEGER NOT NULL,
+                    last_error TEXT,
+                    failed_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS WebhookHold (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    group_key TEXT NOT NULL,
+                    batch INTEGER,
+                    batch_event TEXT NOT NULL,
+                    idempotency_key TEXT NOT NULL UNIQUE,
+                    payload TEXT NOT NULL,
+                    received_at REAL NOT NULL,
+                    flush_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_WebhookHold_group ON WebhookHold(group_key, batch);
+            """)
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _run(self, func):
+        with self._lock:
+            conn = self._connect()
+            try:
+                return func(conn)
+            except Exception:
+                conn.rollback()
+                raise
+
+    @staticmethod
+    def _seen(conn: sqlite3.Connection, key: str) -> bool:
+        """事件已处理、在队列中或在暂存中"""
+        return conn.execute(
+            """
+            SELECT 1 FROM WebhookDone WHERE idempotency_key = ?1
+            UNION ALL SELECT 1 FROM WebhookQueue WHERE idempotency_key = ?1
+            UNION ALL SELECT 1 FROM WebhookHold WHERE idempotency_key = ?1
+            """,
+            (key,),
+        ).fetchone() is not None
+
+    def _enqueue_sync(self, key: str, event: Optional[str], payload: str) -> Optional[int]:
+        def write(conn: sqlite3.Connection):
+            if self._seen(conn, key):
+                return None
+            now = time.time()
+            cursor = conn.execute(
+                """
+                INSERT OR IGNORE INTO WebhookQueue (idempotency_key, event, payload, received_at, next_attempt_at)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (key, event, payload, now, now),
+            )
+            conn.commit()
+            return cursor.lastrowid if cursor.rowcount else None
+
+        return self._run(write)
+
+    def _hold_sync(
+        self, group_key: str, batch_event: str, key: str, payload: str, window: float, max_batch: int
+    ) -> Optional[int]:
+        def write(conn: sqlite3.Connection):
+            if self._seen(conn, key):
+                return None
+            now = time.time()
+            # 加入分组中最新且未满的批次；窗口从批次的第一个事件开始计算，
+            # 持续到达的事件不会无限推迟发送
+            row = conn.execute(
+                """
+                SELECT batch, MIN(flush_at), COUNT(*) FROM WebhookHold
+                WHERE group_key = ? GROUP BY batch ORDER BY batch DESC LIMIT 1
+                """,
+                (group_key,),
+            ).fetchone()
+            if row is not None and row[2] < max_batch:
+                batch, flush_at, count = row
+            else:
+                batch, flush_at, count = None, now + window, 0
+            cursor = conn.execute(
+                """
+                INSERT INTO WebhookHold (group_key, batch, batch_event, idempotency_key, payload, received_at, flush_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (group_key, batch, batch_event, key, payload, now, flush_at),
+            )
+            hold_id = cursor.lastrowid
+            if batch is None:
+                batch = hold_id
+                conn.execute("UPDATE WebhookHold SET batch = ? WHERE id = ?", (batch, hold_id))
+            # 批次已满，立即发送
+            if count + 1 >= max_batch:
+                conn.execute("UPDATE WebhookHold SET flush_at = ? WHERE batch = ?", (now, batch))
+            conn.commit()
+            return hold_id
+
+        return self._run(write)
+
+    @staticmethod
+    def _flush_holds(conn: sqlite3.Connection, now: float):
+        """把到期的暂存批次合并为批量事件写入队列（与领取任务在同一事务中）"""
+        batches = conn.execute(
+            "SELECT batch, group_key FROM WebhookHold GROUP BY batch HAVING MIN(flush_at) <= ?", (now,)
+        ).fetchall()
+        for batch, group_key in batches:
+            rows = conn.execute(
+                """
+                SELECT id, batch_event, idempotency_key, payload, received_at
+                FROM WebhookHold WHERE batch = ? ORDER BY id
+                """,
+                (batch,),
+            ).fetchall()
+            keys = [r[2] for r in rows]
+            payload = json.dumps({
+                "Event": rows[0][1],
+                "Group": group_key,
+                "Events": [json.loads(r[3]) for r in rows],
+            }, ensure_ascii=False)
+            batch_key = "g:" + hashlib.sha256("\n".join(keys).encode()).hexdigest()
+            conn.execute(
+                """
+                INSERT OR IGNORE INTO WebhookQueue (idempotency_key, event, payload, received_at, next_attempt_at)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (batch_key, rows[0][1], payload, rows[0][4], now),
+            )
+            # 合并进批量事件后，单个事件按已处理去重
+            conn.executemany(
+                "INSERT OR REPLACE INTO WebhookDone (idempotency_key, finished_at) VALUES (?, ?)",
+                [(k, now) for k in keys],
+            )
+            conn.execute("DELETE FROM WebhookHold WHERE batch = ?", (batch,))
+
+    def _claim_sync(self) -> Optional[tuple]:
+        """领取一个到期的任务并设置租约"""
+        def claim(conn: sqlite3.Connection):
+            now = time.time()
+            lease = now + settings.WEBHOOK_LEASE_SECONDS
+            self._flush_holds(conn, now)
+            if _RETURNING:
+                row = conn.execute(
+                    """
+                    UPDATE WebhookQueue
+                    SET attempts = attempts + 1, locked_until = ?
+                    WHERE id = (
+                        SELECT id FROM WebhookQueue
+                        WHERE next_attempt_at <= ? AND (locked_until IS NULL OR locked_until < ?)
+                        ORDER BY id LIMIT 1
+                    )
+                    RETURNING id, idempotency_key, event, payload, attempts
+                    """,
+                    (lease, now, now),
+                ).fetchone()
+            else:
+                row = conn.execute(
+                    """
+                    SELECT id, idempotency_key, event, payload, attempts FROM WebhookQueue
+                    WHERE next_attempt_at <= ? AND (locked_until IS NULL OR locked_until < ?)
+                    ORDER BY id LIMIT 1
+                    """,
+                    (now, now),
+                ).fetchone()
+                if row is not None:
+                    # 更新时再次检查租约，任务已被其他进程领取时本次不领取
+                    cursor = conn.execute(
+                        """
+                        UPDATE WebhookQueue SET attempts = attempts + 1, locked_until = ?
+                        WHERE id = ? AND (locked_until IS NULL OR locked_until < ?)
+                        """,
+                        (lease, row[0], now),
+                    )
+                    row = (*row[:4], row[4] + 1) if cursor.rowcount else None
+            conn.commit()
+            return row
+
+        return self._run(claim)
+
+    def _next_due_sync(self) -> Optional[float]:
+        def query(conn: sqlite3.Connection):
+            row = conn.execute(
+                """
+                SELECT MIN(due) FROM (
+                    SELECT MIN(MAX(next_attempt_at, COALESCE(locked_until, 0))) AS due FROM WebhookQueue
+                    UNION ALL SELECT MIN(flush_at) FROM WebhookHold
+                )
+                """
+            ).fetchone()
+            return row[0]
+
+        return self._run(query)
+
+    def _complete_sync(self, job_id: int, key: str):
+        def write(conn: sqlite3.Connection):
+            now = time.time()
+            conn.execute("DELETE FROM WebhookQueue WHERE id = ?", (job_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO WebhookDone (idempotency_key, finished_at) VALUES (?, ?)", (key, now)
+            )
+            conn.execute(
+                "DELETE FROM WebhookDone WHERE finished_at < ?", (now - settings.WEBHOOK_DEDUP_HOURS * 3600,)
+            )
+            conn.commit()
+
+        self._run(write)
+
+    def _fail_sync(self, job_id: int, attempts: int, error: str) -> bool:
+        """记录失败；超过最大次数时移入死信表并返回 True"""
+        def write(conn: sqlite3.Connection):
+            now = time.time()
+            if attempts >= settings.WEBHOOK_MAX_ATTEMPTS:
+                conn.execute(
+                    """
+                    INSERT INTO WebhookDeadLetter
+                        (id, idempotency_key, event, payload, received_at, attempts, last_error, failed_at)
+                    SELECT id, idempotency_key, event, payload, received_at, attempts, ?, ?
+                    FROM WebhookQueue WHERE id = ?
+                    """,
+                    (error, now, job_id),
+                )
+                conn.execute("DELETE FROM WebhookQueue WHERE id = ?", (job_id,))
+                conn.commit()
+                return True
+            conn.execute(
+                "UPDATE WebhookQueue SET next_attempt_at = ?, locked_until = NULL, last_error = ? WHERE id = ?",
+                (now + retry_delay(attempts), error, job_id),
+            )
+            conn.commit()
+            return False
+
+        return self._run(write)
+
+    def _requeue_dead_sync(self, dead_id: Optional[int]) -> int:
+        def write(conn: sqlite3.Connection):
+            where, params = ("WHERE id = ?", (dead_id,)) if dead_id is not None else ("", ())
+            now = time.time()
+            cursor = conn.execute(
+                f"""
+                INSERT OR IGNORE INTO WebhookQueue (idempotency_key, event, payload, received_at, next_attempt_at)
+                SELECT idempotency_key, event, payload, received_at, ? FROM WebhookDeadLetter {where}
+                """,
+                (now, *params),
+            )
+            conn.execute(f"DELETE FROM WebhookDeadLetter {where}", params)
+            conn.commit()
+            return cursor.rowcount
+
+        return self._run(write)
+
+    def _stats_sync(self, dead_limit: int) -> dict:
+        def query(conn: sqlite3.Connection):
+            pending, retrying = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(attempts > 0), 0) FROM WebhookQueue"
+            ).fetchone()
+            held, held_batches = conn.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT batch) FROM WebhookHold"
+            ).fetchone()
+            dead_total = conn.execute("SELECT COUNT(*) FROM WebhookDeadLetter").fetchone()[0]
+            dead = conn.execute(
+                """
+                SELECT id, event, received_at, attempts, last_error, failed_at
+                FROM WebhookDeadLetter ORDER BY failed_at DESC LIMIT ?
+                """,
+                (dead_limit,),
+            ).fetchall()
+            return {
+                "pending": pending,
+                "retrying": retrying,
+                "held": held,
+                "held_batches": held_batches,
+                "dead_letters": dead_total,
+                "recent_dead_letters": [
+                    {"id": r[0], "event": r[1], "received_at": r[2], "attempts": r[3],
+                     "last_error": r[4], "failed_at": r[5]}
+                    for r in dead
+                ],
+            }
+
+        return self._run(query)
+
+    # ==================== 入队 ====================
+
+    async def enqueue(self, body: bytes, data: dict, header_key: Optional[str] = None) -> Optional[int]:
+        """写入队列，返回任务 ID；重复的事件返回 None"""
+        key = idempotency_key(body, header_key)
+        payload = json.dumps(data, ensure_ascii=False)
+        job_id = await asyncio.to_thread(self._enqueue_sync, key, data.get("Event"), payload)
+        if job_id is None:
+            self.duplicates += 1
+            return None
+        self.enqueued += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    async def hold(
+        self,
+        group_key: str,
+        batch_event: str,
+        body: bytes,
+        data: dict,
+        header_key: Optional[str] = None,
+        window: float = 60,
+        max_batch: int = 50,
+    ) -> Optional[int]:
+        """暂存到分组，窗口结束或达到 max_batch 后合并为一个事件入队
+
+        合并后的事件为 {"Event": batch_event, "Group": group_key, "Events": [原始事件...]}，
+        由同一个 handler 处理。返回暂存 ID；重复的事件返回 None
+        """
+        key = idempotency_key(body, header_key)
+        payload = json.dumps(data, ensure_ascii=False)
+        hold_id = await asyncio.to_thread(
+            self._hold_sync, group_key, batch_event, key, payload, window, max_batch
+        )
+        if hold_id is None:
+            self.duplicates += 1
+            return None
+        self.enqueued += 1
+        if self._wakeup is not None:
+            # 唤醒 worker 按新的到期时间等待
+            self._wakeup.set()
+        return hold_id
+
+    # ==================== worker ====================
+
+    async def _process(self, job: tuple):
+        job_id, key, event, payload, attempts = job
+        try:
+            await asyncio.wait_for(self._handler(json.loads(payload)), settings.WEBHOOK_PROCESS_TIMEOUT)
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            if await asyncio.to_thread(self._fail_sync, job_id, attempts, error):
+                self.dead += 1
+                logger.error(f"Webhook 事件 {event} (#{job_id}) 处理失败 {attempts} 次，已移入死信表: {error}")
+            else:
+                self.retried += 1
+                logger.warning(f"Webhook 事件 {event} (#{job_id}) 第 {attempts} 次处理失败，稍后重试: {error}")
+            return
+        await asyncio.to_thread(self._complete_sync, job_id, key)
+        self.processed += 1
+
+    async def _worker(self):
+        while True:
+            try:
+                job = await asyncio.to_thread(self._claim_sync)
+                if job is not None:
+                    await self._process(job)
+                    continue
+
+                # 没有到期任务：等待新任务入队或下一个重试时间
+                next_due = await asyncio.to_thread(self._next_due_sync)
+                timeout = settings.WEBHOOK_POLL_INTERVAL
+                if next_due is not None:
+                    timeout = min(timeout, max(next_due - time.time(), 0.05))
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Webhook 队列 worker 异常: {e}")
+                await asyncio.sleep(settings.WEBHOOK_POLL_INTERVAL)
+
+    def start(self, handler: Handler):
+        """启动 worker（handler 处理单个 webhook 请求体，抛出异常表示需要重试）"""
+        if self._workers:
+            return
+        self._handler = handler
+        self._wakeup = asyncio.Event()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(max(settings.WEBHOOK_WORKERS, 1))]
+
+    async def stop(self):
+        """停止 worker（处理中的任务租约到期后由下次启动重新领取）"""
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ==================== 管理 ====================
+
+    async def requeue_dead_letters(self, dead_id: Optional[int] = None) -> int:
+        """把死信重新放回队列（dead_id 为 None 时全部），返回重新入队的数量"""
+        count = await asyncio.to_thread(self._requeue_dead_sync, dead_id)
+        if count and self._wakeup is not None:
+            self._wakeup.set()
+        return count
+
+    async def stats(self, dead_limit: int = 20) -> dict:
+        """队列状态和最近的死信"""
+        stats = await asyncio.to_thread(self._stats_sync, dead_limit)
+        stats.update({
+            "workers": len(self._workers),
+            "enqueued": self.enqueued,
+            "duplicates": self.duplicates,
+            "processed": self.processed,
+            "retried": self.retried,
+            "dead": self.dead,
+        })
+        return stats
+
+
+# 单例实例
+webhook_queue = WebhookQueue(settings.WEBHOOK_QUEUE_DB)
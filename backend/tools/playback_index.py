@@ -0,0 +1,108 @@
+"""
+播放记录索引工具
+在 playback_reporting.db 的副本（sidecar）上创建 DateCreated 索引
+
+Emby 的 Playback Reporting 插件默认不为 DateCreated 建索引，日期范围筛选
+只能全表扫描。本工具不修改原库，而是通过 SQLite 在线备份生成一份副本并
+在副本上建索引，之后可将 PLAYBACK_DB（或服务器配置中的 playback_db）指向副本。
+
+用法:
+    python tools/playback_index.py --source /data/playback_reporting.db \\
+        --sidecar /config/playback_reporting.indexed.db [--explain]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+INDEXES = {
+    "idx_PlaybackActivity_DateCreated": "PlaybackActivity(DateCreated)",
+}
+
+
+def copy_database(source: str, sidecar: str) -> None:
+    """使用在线备份 API 复制数据库（兼容 WAL 模式且不阻塞 Emby 写入）"""
+    tmp_path = f"{sidecar}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    src = sqlite3.connect(f"file:{source}?mode=ro", uri=True)
+    dst = sqlite3.connect(tmp_path)
+    try:
+        src.backup(dst, pages=4096)
+    finally:
+        dst.close()
+        src.close()
+    os.replace(tmp_path, sidecar)
+
+
+def create_indexes(db_path: str) -> None:
+    """创建索引并更新统计信息"""
+    conn = sqlite3.connect(db_path)
+    try:
+        for name, target in INDEXES.items():
+            conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {target}")
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def explain(db_path: str, start_date: str, end_date: str) -> None:
+    """打印换算前后的查询计划"""
+    from database import local_date, date_range_conditions
+
+    date_col = local_date("DateCreated")
+    legacy_sql = f"SELECT COUNT(*) FROM PlaybackActivity WHERE {date_col} >= date(?) AND {date_col} <= date(?)"
+    legacy_params = [start_date, end_date]
+
+    conditions, params = date_range_conditions(start_date, end_date)
+    range_sql = f"SELECT COUNT(*) FROM PlaybackActivity WHERE {' AND '.join(conditions)}"
+
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        for label, sql, sql_params in (
+            ("local_date()", legacy_sql, legacy_params),
+            ("UTC 范围", range_sql, params),
+        ):
+            plan = conn.execute(f"EXPLAIN QUERY PLAN {sql}", sql_params).fetchall()
+            start = time.perf_counter()
+            count = conn.execute(sql, sql_params).fetchone()[0]
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f"[{label}] {count} 行, {elapsed:.1f} ms")
+            for row in plan:
+                print(f"    {row[-1]}")
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="在播放记录数据库副本上创建 DateCreated 索引")
+    parser.add_argument("--source", required=True, help="原始 playback_reporting.db 路径")
+    parser.add_argument("--sidecar", required=True, help="副本输出路径")
+    parser.add_argument("--explain", action="store_true", help="建索引后打印查询计划对比")
+    parser.add_argument("--start-date", default="2024-01-01", help="查询计划对比使用的开始日期")
+    parser.add_argument("--end-date", default="2024-01-31", help="查询计划对比使用的结束日期")
+    args = parser.parse_args()
+
+    if os.path.abspath(args.source) == os.path.abspath(args.sidecar):
+        parser.error("sidecar 路径不能与原始数据库相同")
+
+    start = time.perf_counter()
+    copy_database(args.source, args.sidecar)
+    print(f"✓ 已复制数据库: {args.sidecar} ({time.perf_counter() - start:.1f}s)")
+
+    start = time.perf_counter()
+    create_indexes(args.sidecar)
+    print(f"✓ 已创建索引: {', '.join(INDEXES)} ({time.perf_counter() - start:.1f}s)")
+
+    if args.explain:
+        explain(args.sidecar, args.start_date, args.end_date)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,8 @@ import { Overview, Content, Users, Devices, History, Login, Notifications, Notif
 import { AnimatePresence, motion } from 'framer-motion'
 import { useAuth } from '@/contexts/AuthContext'
 import { useFilter } from '@/contexts/FilterContext'
+import { useServer, ALL_SERVERS_ID } from '@/contexts/ServerContext'
+import { Card } from '@/components/ui'
 import { Loader2 } from 'lucide-react'
 
 const pageVariants = {
@@ -22,6 +24,8 @@ const pageTransition = {
 function App() {
   const { isAuthenticated, isLoading } = useAuth()
   const { buildQueryParams } = useFilter()
+  const { currentServer } = useServer()
+  const isAllServers = currentServer?.id === ALL_SERVERS_ID
 
   // 加载中显示
   if (isLoading) {
@@ -44,7 +48,7 @@ function App() {
       {({ activeTab, refreshKey }) => (
         <>
           {/* Now Playing - shown on all tabs */}
-          <NowPlaying />
+          <NowPlaying key={currentServer?.id} />
 
           {/* Tab Content with Animation */}
           <AnimatePresence mode="wait">
@@ -61,7 +65,13 @@ function App() {
               {activeTab === 'favorites' && <Favorites filterParams={filterParams} />}
               {activeTab === 'users' && <Users filterParams={filterParams} />}
               {activeTab === 'devices' && <Devices filterParams={filterParams} />}
-              {activeTab === 'history' && <History filterParams={filterParams} />}
+              {activeTab === 'history' && (isAllServers ? (
+                <Card className="p-5 text-center text-sm text-[var(--color-text-muted)]">
+                  播放记录不支持全部服务器汇总，请在服务器管理中选择具体服务器
+                </Card>
+              ) : (
+                <History filterParams={filterParams} />
+              ))}
               {activeTab === 'covers' && <Covers />}
               {activeTab === 'notifications' && <Notifications />}
               {activeTab === 'report' && <NotificationTemplates />}
@@ -2,7 +2,7 @@ import { useState, useEffect } from 'react'
 import { motion, AnimatePresence } from 'framer-motion'
 import { X, Plus, Trash2, Edit2, Server as ServerIcon, Loader2, Check, FolderOpen } from 'lucide-react'
 import { api } from '@/services/api'
-import { useServer, type Server } from '@/contexts/ServerContext'
+import { useServer, ALL_SERVERS, type Server } from '@/contexts/ServerContext'
 import { FilePickerModal } from './FilePickerModal'
 
 interface ServerManagementPanelProps {
@@ -106,7 +106,8 @@ export function ServerManagementPanel({ isOpen, onClose }: ServerManagementPanel
     setError('')
     try {
       await api.deleteServer(serverId)
-      if (currentServer?.id === serverId) {
+      // 删除当前服务器，或删除后只剩一个服务器时不再汇总
+      if (currentServer?.id === serverId || (currentServer?.id === ALL_SERVERS.id && servers.length <= 2)) {
         const remainingServers = servers.filter(s => s.id !== serverId)
         if (remainingServers.length > 0) {
           const defaultServer = remainingServers.find(s => s.is_default) || remainingServers[0]
@@ -209,10 +210,34 @@ export function ServerManagementPanel({ isOpen, onClose }: ServerManagementPanel
                   </div>
 
                   <div className="space-y-2">
+                    {/* 多个服务器时可选择汇总全部服务器 */}
+                    {servers.length > 1 && (
+                      <div
+                        onClick={() => setCurrentServer(ALL_SERVERS)}
+                        className={`p-3 rounded-lg border cursor-pointer ${
+                          currentServer?.id === ALL_SERVERS.id
+                            ? 'border-primary bg-primary/5'
+                            : 'border-[var(--color-border)] bg-content1'
+                        }`}
+                      >
+                        <div className="flex items-center gap-2">
+                          <h4 className="font-medium truncate">{ALL_SERVERS.name}</h4>
+                          {currentServer?.id === ALL_SERVERS.id && (
+                            <span className="px-2 py-0.5 text-xs rounded bg-success/20 text-success">
+                              当前
+                            </span>
+                          )}
+                        </div>
+                        <p className="text-sm text-[var(--color-text-muted)] mt-1 truncate">
+                          合并 {servers.length} 个服务器的统计和排行
+                        </p>
+                      </div>
+                    )}
                     {servers.map((server) => (
                       <div
                         key={server.id}
-                        className={`p-3 rounded-lg border ${
+                        onClick={() => setCurrentServer(server)}
+                        className={`p-3 rounded-lg border cursor-pointer ${
                           currentServer?.id === server.id
                             ? 'border-primary bg-primary/5'
                             : 'border-[var(--color-border)] bg-content1'
@@ -239,7 +264,10 @@ export function ServerManagementPanel({ isOpen, onClose }: ServerManagementPanel
                           </div>
                           <div className="flex items-center gap-1 ml-2">
                             <button
-                              onClick={() => handleEdit(server)}
+                              onClick={(e) => {
+                                e.stopPropagation()
+                                handleEdit(server)
+                              }}
                               className="p-1.5 rounded hover:bg-[var(--color-hover-overlay)] transition-colors"
                               title="编辑"
                             >
@@ -247,7 +275,10 @@ export function ServerManagementPanel({ isOpen, onClose }: ServerManagementPanel
                             </button>
                             {servers.length > 1 && (
                               <button
-                                onClick={() => handleDelete(server.id)}
+                                onClick={(e) => {
+                                  e.stopPropagation()
+                                  handleDelete(server.id)
+                                }}
                                 className="p-1.5 rounded hover:bg-danger/10 text-danger transition-colors"
                                 title="删除"
                               >
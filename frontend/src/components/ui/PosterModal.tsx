@@ -38,12 +38,15 @@ export function PosterModal({ data, onClose }: PosterModalProps) {
 
   if (!data) return null
 
+  // 非默认服务器的图片 URL 已带有 server_id 参数
+  const withSize = (url: string, size: string) => `${url}${url.includes('?') ? '&' : '?'}${size}`
+
   const posterUrl = data.posterUrl
-    ? `${data.posterUrl}?maxHeight=900&maxWidth=600`
+    ? withSize(data.posterUrl, 'maxHeight=900&maxWidth=600')
     : undefined
 
   const backdropUrl = data.backdropUrl
-    ? `${data.backdropUrl}?maxHeight=720&maxWidth=1280`
+    ? withSize(data.backdropUrl, 'maxHeight=720&maxWidth=1280')
     : undefined
 
   const currentImageUrl = imageMode === 'backdrop' ? backdropUrl : posterUrl
@@ -1,6 +1,7 @@
-import { createContext, useContext, useState, useEffect, useCallback, type ReactNode } from 'react'
+import { createContext, useContext, useState, useEffect, useCallback, useRef, type ReactNode } from 'react'
 import { api } from '@/services/api'
 import { useAuth } from '@/contexts/AuthContext'
+import { useServer } from '@/contexts/ServerContext'
 
 export interface NameMappingItem {
   original: string
@@ -72,6 +73,8 @@ const FilterContext = createContext<FilterContextType | undefined>(undefined)
 
 export function FilterProvider({ children }: { children: ReactNode }) {
   const { isAuthenticated } = useAuth()
+  const { currentServer } = useServer()
+  const serverId = currentServer?.id
 
   const [filters, setFilters] = useState<FilterState>(() => {
     if (typeof window !== 'undefined') {
@@ -121,6 +124,18 @@ export function FilterProvider({ children }: { children: ReactNode }) {
     }
   }, [isAuthenticated, refreshOptions])
 
+  // 切换服务器后用户 ID 不再对应，清除用户筛选并重新加载筛选选项
+  const previousServerId = useRef(serverId)
+  useEffect(() => {
+    if (previousServerId.current && serverId !== previousServerId.current) {
+      setFilters(prev => ({ ...prev, selectedUsers: [] }))
+      if (isAuthenticated) {
+        refreshOptions()
+      }
+    }
+    previousServerId.current = serverId
+  }, [serverId, isAuthenticated, refreshOptions])
+
   // 计算活动筛选数量
   const activeFilterCount =
     (filters.useDateRange && (filters.startDate || filters.endDate) ? 1 : 0) +
@@ -176,6 +191,11 @@ export function FilterProvider({ children }: { children: ReactNode }) {
   const buildQueryParams = useCallback(() => {
     const params: Record<string, string> = {}
 
+    // 带上服务器ID，切换服务器时参数变化，各页面重新获取数据
+    if (serverId) {
+      params.server_id = serverId
+    }
+
     if (filters.useDateRange) {
       if (filters.startDate) params.start_date = filters.startDate
       if (filters.endDate) params.end_date = filters.endDate
@@ -200,7 +220,7 @@ export function FilterProvider({ children }: { children: ReactNode }) {
     }
 
     return params
-  }, [filters])
+  }, [filters, serverId])
 
   return (
     <FilterContext.Provider
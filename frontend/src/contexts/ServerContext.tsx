@@ -9,6 +9,17 @@ export interface Server {
   created_at: string
 }
 
+// 汇总全部服务器的虚拟选项，统计和排行接口以 server_id=all 合并各服务器数据
+export const ALL_SERVERS_ID = 'all'
+
+export const ALL_SERVERS: Server = {
+  id: ALL_SERVERS_ID,
+  name: '全部服务器',
+  emby_url: '',
+  is_default: false,
+  created_at: '',
+}
+
 interface ServerContextType {
   servers: Server[]
   currentServer: Server | null
@@ -30,9 +41,13 @@ export function ServerProvider({ children }: { children: ReactNode }) {
       const data = await api.getServers()
       setServers(data.servers || [])
       
-      // 如果没有当前服务器，设置默认服务器
+      // 如果没有当前服务器，恢复上次选择的服务器，否则设置默认服务器
       if (!currentServer && data.servers && data.servers.length > 0) {
-        const defaultServer = data.servers.find((s: Server) => s.is_default) || data.servers[0]
+        const savedId = localStorage.getItem('currentServerId')
+        const saved = savedId === ALL_SERVERS_ID && data.servers.length > 1
+          ? ALL_SERVERS
+          : data.servers.find((s: Server) => s.id === savedId)
+        const defaultServer = saved || data.servers.find((s: Server) => s.is_default) || data.servers[0]
         setCurrentServerState(defaultServer)
         localStorage.setItem('currentServerId', defaultServer.id)
       }
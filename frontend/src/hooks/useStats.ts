@@ -10,7 +10,9 @@ import type {
   ClientsData,
   PlaybackMethodsData,
   DevicesData,
+  DashboardData,
   RecentData,
+  RecentItem,
   NowPlayingData,
 } from '@/types'
 
@@ -19,35 +21,56 @@ function serializeParams(params: FilterParams): string {
   return JSON.stringify(params)
 }
 
-export function useOverview(params: FilterParams) {
-  const [data, setData] = useState<OverviewData | null>(null)
-  const [loading, setLoading] = useState(true)
-  const [error, setError] = useState<Error | null>(null)
-  const paramsKey = serializeParams(params)
+interface EnrichableRow {
+  item_id?: string
+  overview?: string
+  poster_url?: string
+  backdrop_url?: string
+}
 
-  const fetch = useCallback(async () => {
-    setLoading(true)
-    try {
-      const result = await api.getOverview(params)
-      setData(result)
-      setError(null)
-    } catch (e) {
-      setError(e as Error)
-    } finally {
-      setLoading(false)
+// 列表以 lazy 模式先展示，再批量补全简介；Emby 确认没有的图片去掉，避免显示空白图
+// preferSeries 为 true 时单集使用所属剧集的简介
+async function enrichRows<T extends EnrichableRow>(rows: T[], preferSeries: boolean): Promise<T[]> {
+  const ids = rows.map(row => row.item_id).filter((id): id is string => !!id)
+  if (ids.length === 0) return rows
+  const { items } = await api.enrichItems(ids)
+  return rows.map(row => {
+    const info = row.item_id ? items[row.item_id] : undefined
+    if (!info) return row
+    return {
+      ...row,
+      overview: (preferSeries && info.series_overview) || info.overview || row.overview,
+      poster_url: info.poster_url ? row.poster_url : undefined,
+      backdrop_url: info.backdrop_url ? row.backdrop_url : undefined,
     }
-  // eslint-disable-next-line react-hooks/exhaustive-deps
-  }, [paramsKey])
-
-  useEffect(() => {
-    fetch()
-  }, [fetch])
+  })
+}
 
-  return { data, loading, error, refetch: fetch }
+// 仪表盘各部分都来自同一个 /api/dashboard 请求：同一组参数的请求进行中或刚完成时
+// 直接复用，同一页面上的多个 hook 只发起一次请求
+const DASHBOARD_REUSE_MS = 2000
+
+let dashboardRequest: { key: string; promise: Promise<DashboardData>; settledAt: number | null } | null = null
+
+function fetchDashboard(params: FilterParams): Promise<DashboardData> {
+  const key = serializeParams(params)
+  const current = dashboardRequest
+  if (current && current.key === key &&
+      (current.settledAt === null || Date.now() - current.settledAt < DASHBOARD_REUSE_MS)) {
+    return current.promise
+  }
+  const request = { key, promise: api.getDashboard(params), settledAt: null as number | null }
+  // 失败的请求不复用
+  request.promise.then(
+    () => { request.settledAt = Date.now() },
+    () => { request.settledAt = 0 },
+  )
+  dashboardRequest = request
+  return request.promise
 }
 
-export function useTrend(params: FilterParams) {
-  const [data, setData] = useState<TrendData | null>(null)
+function useDashboardPart<T>(params: FilterParams, select: (dashboard: DashboardData) => T) {
+  const [data, setData] = useState<T | null>(null)
   const [loading, setLoading] = useState(true)
   const [error, setError] = useState<Error | null>(null)
   const paramsKey = serializeParams(params)
@@ -55,8 +78,8 @@ export function useTrend(params: FilterParams) {
   const fetch = useCallback(async () => {
     setLoading(true)
     try {
-      const result = await api.getTrend(params)
-      setData(result)
+      const result = await fetchDashboard(params)
+      setData(select(result))
       setError(null)
     } catch (e) {
       setError(e as Error)
@@ -73,31 +96,32 @@ export function useTrend(params: FilterParams) {
   return { data, loading, error, refetch: fetch }
 }
 
+export function useOverview(params: FilterParams) {
+  return useDashboardPart<OverviewData>(params, dashboard => dashboard.overview)
+}
+
+export function useTrend(params: FilterParams) {
+  return useDashboardPart<TrendData>(params, dashboard => ({ trend: dashboard.trend }))
+}
+
 export function useHourly(params: FilterParams) {
-  const [data, setData] = useState<HourlyData | null>(null)
-  const [loading, setLoading] = useState(true)
-  const [error, setError] = useState<Error | null>(null)
-  const paramsKey = serializeParams(params)
+  return useDashboardPart<HourlyData>(params, dashboard => ({ hourly: dashboard.hourly }))
+}
 
-  const fetch = useCallback(async () => {
-    setLoading(true)
-    try {
-      const result = await api.getHourly(params)
-      setData(result)
-      setError(null)
-    } catch (e) {
-      setError(e as Error)
-    } finally {
-      setLoading(false)
-    }
-  // eslint-disable-next-line react-hooks/exhaustive-deps
-  }, [paramsKey])
+export function useUsers(params: FilterParams) {
+  return useDashboardPart<UsersData>(params, dashboard => ({ users: dashboard.users }))
+}
 
-  useEffect(() => {
-    fetch()
-  }, [fetch])
+export function useClients(params: FilterParams) {
+  return useDashboardPart<ClientsData>(params, dashboard => ({ clients: dashboard.clients }))
+}
 
-  return { data, loading, error, refetch: fetch }
+export function usePlaybackMethods(params: FilterParams) {
+  return useDashboardPart<PlaybackMethodsData>(params, dashboard => ({ methods: dashboard.methods }))
+}
+
+export function useDevices(params: FilterParams) {
+  return useDashboardPart<DevicesData>(params, dashboard => ({ devices: dashboard.devices }))
 }
 
 export function useTopShows(params: FilterParams, limit = 16) {
@@ -112,6 +136,9 @@ export function useTopShows(params: FilterParams, limit = 16) {
       const result = await api.getTopShows(params, limit)
       setData(result)
       setError(null)
+      enrichRows(result.top_shows, true)
+        .then(rows => setData(prev => (prev === result ? { top_shows: rows } : prev)))
+        .catch(() => {})
     } catch (e) {
       setError(e as Error)
     } finally {
@@ -139,6 +166,9 @@ export function useTopContent(params: FilterParams, limit = 18) {
       const result = await api.getTopContent(params, limit)
       setData(result)
       setError(null)
+      enrichRows(result.top_content, true)
+        .then(rows => setData(prev => (prev === result ? { top_content: rows } : prev)))
+        .catch(() => {})
     } catch (e) {
       setError(e as Error)
     } finally {
@@ -154,139 +184,66 @@ export function useTopContent(params: FilterParams, limit = 18) {
   return { data, loading, error, refetch: fetch }
 }
 
-export function useUsers(params: FilterParams) {
-  const [data, setData] = useState<UsersData | null>(null)
-  const [loading, setLoading] = useState(true)
-  const [error, setError] = useState<Error | null>(null)
-  const paramsKey = serializeParams(params)
-
-  const fetch = useCallback(async () => {
-    setLoading(true)
-    try {
-      const result = await api.getUsers(params)
-      setData(result)
-      setError(null)
-    } catch (e) {
-      setError(e as Error)
-    } finally {
-      setLoading(false)
-    }
-  // eslint-disable-next-line react-hooks/exhaustive-deps
-  }, [paramsKey])
-
-  useEffect(() => {
-    fetch()
-  }, [fetch])
-
-  return { data, loading, error, refetch: fetch }
-}
-
-export function useClients(params: FilterParams) {
-  const [data, setData] = useState<ClientsData | null>(null)
+export function useRecent(params: FilterParams, limit = 48) {
+  const [data, setData] = useState<RecentData | null>(null)
   const [loading, setLoading] = useState(true)
+  const [loadingMore, setLoadingMore] = useState(false)
   const [error, setError] = useState<Error | null>(null)
   const paramsKey = serializeParams(params)
 
-  const fetch = useCallback(async () => {
-    setLoading(true)
-    try {
-      const result = await api.getClients(params)
-      setData(result)
-      setError(null)
-    } catch (e) {
-      setError(e as Error)
-    } finally {
-      setLoading(false)
-    }
-  // eslint-disable-next-line react-hooks/exhaustive-deps
-  }, [paramsKey])
-
-  useEffect(() => {
-    fetch()
-  }, [fetch])
-
-  return { data, loading, error, refetch: fetch }
-}
-
-export function usePlaybackMethods(params: FilterParams) {
-  const [data, setData] = useState<PlaybackMethodsData | null>(null)
-  const [loading, setLoading] = useState(true)
-  const [error, setError] = useState<Error | null>(null)
-  const paramsKey = serializeParams(params)
+  // 补全一页记录的简介，按对象引用替换到当前列表中（列表已被重新加载时不生效）
+  const enrichRecent = (page: RecentItem[]) => {
+    enrichRows(page, false)
+      .then(rows => {
+        const enriched = new Map(page.map((row, i) => [row, rows[i]]))
+        setData(prev => prev && {
+          ...prev,
+          recent: prev.recent.map(row => enriched.get(row) ?? row),
+        })
+      })
+      .catch(() => {})
+  }
 
   const fetch = useCallback(async () => {
     setLoading(true)
     try {
-      const result = await api.getPlaybackMethods(params)
-      setData(result)
-      setError(null)
-    } catch (e) {
-      setError(e as Error)
-    } finally {
-      setLoading(false)
-    }
-  // eslint-disable-next-line react-hooks/exhaustive-deps
-  }, [paramsKey])
-
-  useEffect(() => {
-    fetch()
-  }, [fetch])
-
-  return { data, loading, error, refetch: fetch }
-}
-
-export function useDevices(params: FilterParams) {
-  const [data, setData] = useState<DevicesData | null>(null)
-  const [loading, setLoading] = useState(true)
-  const [error, setError] = useState<Error | null>(null)
-  const paramsKey = serializeParams(params)
-
-  const fetch = useCallback(async () => {
-    setLoading(true)
-    try {
-      const result = await api.getDevices(params)
+      const result = await api.getRecent(params, limit)
       setData(result)
       setError(null)
+      enrichRecent(result.recent)
     } catch (e) {
       setError(e as Error)
     } finally {
       setLoading(false)
     }
   // eslint-disable-next-line react-hooks/exhaustive-deps
-  }, [paramsKey])
-
-  useEffect(() => {
-    fetch()
-  }, [fetch])
-
-  return { data, loading, error, refetch: fetch }
-}
-
-export function useRecent(params: FilterParams, limit = 48) {
-  const [data, setData] = useState<RecentData | null>(null)
-  const [loading, setLoading] = useState(true)
-  const [error, setError] = useState<Error | null>(null)
-  const paramsKey = serializeParams(params)
+  }, [paramsKey, limit])
 
-  const fetch = useCallback(async () => {
-    setLoading(true)
+  // 按 next_cursor 加载下一页并追加到已有记录之后
+  const loadMore = useCallback(async () => {
+    const cursor = data?.next_cursor
+    if (!cursor || loadingMore) return
+    setLoadingMore(true)
     try {
-      const result = await api.getRecent(params, limit)
-      setData(result)
+      const result = await api.getRecent(params, limit, cursor)
+      setData(prev => prev && prev.next_cursor === cursor
+        ? { recent: [...prev.recent, ...result.recent], next_cursor: result.next_cursor }
+        : prev)
       setError(null)
+      enrichRecent(result.recent)
     } catch (e) {
       setError(e as Error)
     } finally {
-      setLoading(false)
+      setLoadingMore(false)
     }
   // eslint-disable-next-line react-hooks/exhaustive-deps
-  }, [paramsKey, limit])
+  }, [paramsKey, limit, data, loadingMore])
 
   useEffect(() => {
     fetch()
   }, [fetch])
 
-  return { data, loading, error, refetch: fetch }
+  return { data, loading, loadingMore, hasMore: !!data?.next_cursor, loadMore, error, refetch: fetch }
 }
 
 export function useNowPlaying(refreshInterval = 10000) {
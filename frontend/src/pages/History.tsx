@@ -1,8 +1,8 @@
-import { useState, useMemo } from 'react'
+import { useState, useMemo, useEffect, useRef } from 'react'
 import { Card, PosterCard, PosterGridSkeleton } from '@/components/ui'
 import { useRecent } from '@/hooks/useStats'
 import type { FilterParams } from '@/services/api'
-import { Search, X, Film } from 'lucide-react'
+import { Search, X, Film, Loader2 } from 'lucide-react'
 import { formatDateTime } from '@/lib/utils'
 
 interface HistoryProps {
@@ -77,11 +77,23 @@ export function History({ filterParams }: HistoryProps) {
     return params
   }, [filterParams, searchQuery])
 
-  const { data: recentData, loading } = useRecent(historyParams, searchQuery ? 100 : 48)
+  const { data: recentData, loading, loadingMore, hasMore, loadMore } = useRecent(historyParams, 48)
 
   const items = recentData?.recent ?? []
   const isSearching = !!searchQuery.trim()
 
+  // 滚动到列表底部时自动加载下一页
+  const sentinelRef = useRef<HTMLDivElement>(null)
+  useEffect(() => {
+    const sentinel = sentinelRef.current
+    if (!sentinel || !hasMore) return
+    const observer = new IntersectionObserver(entries => {
+      if (entries[0].isIntersecting) loadMore()
+    }, { rootMargin: '400px' })
+    observer.observe(sentinel)
+    return () => observer.disconnect()
+  }, [hasMore, loadMore])
+
   const handleSearch = () => {
     setSearchQuery(searchInput)
   }
@@ -132,7 +144,7 @@ export function History({ filterParams }: HistoryProps) {
       </div>
       {searchQuery && (
         <div className="mb-4 text-sm text-[var(--color-text-muted)]">
-          搜索结果："{searchQuery}" {!loading && `(${items.length} 条记录)`}
+          搜索结果："{searchQuery}" {!loading && `(${items.length}${hasMore ? '+' : ''} 条记录)`}
         </div>
       )}
       {loading ? (
@@ -190,6 +202,20 @@ export function History({ filterParams }: HistoryProps) {
           ))}
         </div>
       )}
+      {!loading && hasMore && (
+        <div ref={sentinelRef} className="flex justify-center py-4">
+          {loadingMore ? (
+            <Loader2 className="w-5 h-5 animate-spin text-[var(--color-text-muted)]" />
+          ) : (
+            <button
+              onClick={loadMore}
+              className="px-4 py-2 text-sm text-[var(--color-text-muted)] hover:text-[var(--color-foreground)] transition-colors"
+            >
+              加载更多
+            </button>
+          )}
+        </div>
+      )}
     </Card>
   )
 }
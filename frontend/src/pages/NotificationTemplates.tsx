@@ -13,7 +13,7 @@ const DEFAULT_TEMPLATES = {
   },
   library: {
     title: "{% if media_type == '电影' %}🎬{% elif media_type == '剧集' %}📺{% else %}🆕{% endif %} 新入库 {{ media_type }}：{{ item_name }}",
-    text: "{% if media_type == '电影' %}🎬 类型：电影{% elif media_type == '剧集' %}📺 类型：剧集{% else %}🆕 类型：{{ media_type }}{% endif %}\n{% if rating %}⭐ 评分：{{ rating }}/10\n{% endif %}{% if item_year %}📅 年份：{{ item_year }}\n{% endif %}{% if size %}💾 大小：{{ size }}\n{% endif %}🕒 时间：{{ now_time }}\n{% if overview %}📝 简介：{{ overview }}{% endif %}"
+    text: "{% if media_type == '电影' %}🎬 类型：电影{% elif media_type == '剧集' %}📺 类型：剧集{% else %}🆕 类型：{{ media_type }}{% endif %}\n{% if rating %}⭐ 评分：{{ rating }}/10\n{% endif %}{% if item_year %}📅 年份：{{ item_year }}\n{% endif %}{% if episode_count %}🎞️ 集数：{{ episode_count }}\n{% endif %}{% if size %}💾 大小：{{ size }}\n{% endif %}🕒 时间：{{ now_time }}\n{% if overview %}📝 简介：{{ overview }}{% endif %}"
   },
   login: {
     title: "{% if action == '登录成功' %}🔑 登录成功 ✅{% elif action == '登录失败' %}🔓 登录失败 ❌{% else %}🚪 用户登录通知{% endif %}",
@@ -263,6 +263,12 @@ export function NotificationTemplates({ onBack }: NotificationTemplatesProps) {
               <div>
                 <code className="text-primary">{'{{ tmdb_id }}'}</code> - TMDB ID
               </div>
+              <div>
+                <code className="text-primary">{'{{ episode_count }}'}</code> - 合并入库的集数
+              </div>
+              <div>
+                <code className="text-primary">{'{{ episodes }}'}</code> - 合并入库的分集列表
+              </div>
             </div>
             <div className="mt-3 text-xs text-text-secondary">
               <p>💡 提示：使用 Jinja2 语法，如 <code className="text-primary">{'{% if condition %}'}</code> ... <code className="text-primary">{'{% endif %}'}</code></p>
@@ -1,14 +1,9 @@
 import type {
-  OverviewData,
-  TrendData,
-  HourlyData,
   TopShowsData,
   TopContentData,
-  UsersData,
-  ClientsData,
-  PlaybackMethodsData,
-  DevicesData,
   RecentData,
+  DashboardData,
+  EnrichItemsData,
   NowPlayingData,
   FilterOptionsData,
 } from '@/types'
@@ -50,8 +45,9 @@ function buildQueryString(params: FilterParams): string {
 
 async function fetchAPI<T>(endpoint: string, params?: FilterParams): Promise<T> {
   let url = `${API_BASE}${endpoint}`
-  if (params && Object.keys(params).length > 0) {
-    const queryString = buildQueryString(params)
+  // 没有筛选参数时也要带上 server_id
+  const queryString = buildQueryString(params || {})
+  if (queryString) {
     url += (endpoint.includes('?') ? '&' : '?') + queryString
   }
 
@@ -67,35 +63,22 @@ async function fetchAPI<T>(endpoint: string, params?: FilterParams): Promise<T>
 }
 
 export const api = {
-  getOverview: (params: FilterParams = {}): Promise<OverviewData> =>
-    fetchAPI('/overview', params),
-
-  getTrend: (params: FilterParams = {}): Promise<TrendData> =>
-    fetchAPI('/trend', params),
-
-  getHourly: (params: FilterParams = {}): Promise<HourlyData> =>
-    fetchAPI('/hourly', params),
+  // 总览、趋势、用户、客户端、设备、播放方式和热力图一次返回
+  getDashboard: (params: FilterParams = {}): Promise<DashboardData> =>
+    fetchAPI('/dashboard', params),
 
+  // lazy 模式：不等待 Emby 项目信息，简介由 enrichItems 补全
   getTopShows: (params: FilterParams = {}, limit = 16): Promise<TopShowsData> =>
-    fetchAPI('/top-shows', { ...params, limit: String(limit) }),
+    fetchAPI('/top-shows', { ...params, limit: String(limit), lazy: 'true' }),
 
   getTopContent: (params: FilterParams = {}, limit = 18): Promise<TopContentData> =>
-    fetchAPI('/top-content', { ...params, limit: String(limit) }),
-
-  getUsers: (params: FilterParams = {}): Promise<UsersData> =>
-    fetchAPI('/users', params),
-
-  getClients: (params: FilterParams = {}): Promise<ClientsData> =>
-    fetchAPI('/clients', params),
-
-  getPlaybackMethods: (params: FilterParams = {}): Promise<PlaybackMethodsData> =>
-    fetchAPI('/playback-methods', params),
+    fetchAPI('/top-content', { ...params, limit: String(limit), lazy: 'true' }),
 
-  getDevices: (params: FilterParams = {}): Promise<DevicesData> =>
-    fetchAPI('/devices', params),
+  getRecent: (params: FilterParams = {}, limit = 48, cursor?: string | null): Promise<RecentData> =>
+    fetchAPI('/recent', { ...params, limit: String(limit), lazy: 'true', ...(cursor ? { cursor } : {}) }),
 
-  getRecent: (params: FilterParams = {}, limit = 48): Promise<RecentData> =>
-    fetchAPI('/recent', { ...params, limit: String(limit) }),
+  enrichItems: (ids: string[]): Promise<EnrichItemsData> =>
+    fetchAPI('/items/enrich', { ids: ids.join(',') }),
 
   getNowPlaying: (): Promise<NowPlayingData> =>
     fetchAPI('/now-playing'),
@@ -28,6 +28,7 @@ export interface HourlyData {
 }
 
 export interface ShowItem {
+  item_id?: string
   show_name: string
   poster_url?: string
   backdrop_url?: string
@@ -41,6 +42,7 @@ export interface TopShowsData {
 }
 
 export interface ContentItem {
+  item_id?: string
   item_name: string
   name?: string
   show_name?: string
@@ -94,7 +96,19 @@ export interface DevicesData {
   devices: DeviceItem[]
 }
 
+// /dashboard 一次返回的全部统计，各部分与单独接口的内容一致
+export interface DashboardData {
+  overview: OverviewData
+  trend: TrendItem[]
+  users: UserItem[]
+  clients: ClientItem[]
+  devices: DeviceItem[]
+  methods: PlaybackMethodItem[]
+  hourly: HourlyItem[]
+}
+
 export interface RecentItem {
+  item_id?: string
   item_name: string
   name?: string
   show_name?: string
@@ -109,6 +123,22 @@ export interface RecentItem {
 
 export interface RecentData {
   recent: RecentItem[]
+  // 下一页游标，没有更多记录时为 null
+  next_cursor?: string | null
+}
+
+// /items/enrich 返回的单个项目信息
+export interface EnrichedItem {
+  overview: string
+  series_id?: string | null
+  series_name?: string | null
+  series_overview: string
+  poster_url?: string | null
+  backdrop_url?: string | null
+}
+
+export interface EnrichItemsData {
+  items: Record<string, EnrichedItem>
 }
 
 export interface NowPlayingItem {